@@ -0,0 +1,159 @@
+"""
+🎧 Dekódování vstupů
+
+Kontejnery (.m4a/.mp4/...) jdou přes ffmpeg rovnou do float32 PCM (dlouhé vstupy do
+memory-mapped bufferu), ostatní formáty dekóduje faster-whisper. Každé dekódování
+běží pod rozpočtem prostředků (`budget.RESOURCE_BUDGET`).
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+import numpy as np
+from faster_whisper import decode_audio
+
+from budget import RESOURCE_BUDGET
+
+
+PCM_SAMPLE_RATE = 16000
+PCM_READ_CHUNK = 1 << 20
+
+FFMPEG_DECODE_EXTS = {
+    ".m4a",
+    ".mp4",
+    ".mov",
+    ".mkv",
+    ".webm",
+    ".aac",
+    ".m4b",
+}
+
+
+def _get_ffmpeg_exe() -> str | None:
+    exe = shutil.which("ffmpeg")
+    if exe:
+        return exe
+
+    # Fallback: imageio-ffmpeg provides a bundled ffmpeg binary (downloads on first use).
+    try:
+        import imageio_ffmpeg  # type: ignore
+
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+
+def _maybe_decode_to_pcm(input_path: str, config) -> str | np.ndarray:
+    """Dekóduje kontejnery (.m4a/.mp4/...) přes ffmpeg rovnou do float32 PCM (16 kHz, mono).
+
+    Ostatní vstupy vrací beze změny jako cestu (faster-whisper je dekóduje sám).
+    ffmpeg zapisuje raw `s16le` na stdout, takže nevzniká žádný dočasný WAV.
+    Nad `pcm_mmap_threshold_mb` se vzorky přelévají do anonymního (smazaného)
+    dočasného souboru a vrací se `np.memmap`: samotné dekódování pak nedrží celý
+    vstup v paměti a memmap mezi dekódováním a přepisem (prefetch, čekání na model)
+    zabírá jen stránkovou cache. faster-whisper si ale při přepisu dělá vlastní kopie
+    (VAD úseky, padding a mel příznaky), takže špička RSS během inference dál roste
+    s délkou vstupu.
+    """
+    ext = os.path.splitext(input_path)[1].lower()
+    if ext == ".wav" or ext not in FFMPEG_DECODE_EXTS:
+        return input_path
+
+    ffmpeg_exe = _get_ffmpeg_exe()
+    if not ffmpeg_exe:
+        raise RuntimeError(
+            "Pro dekódování .m4a/.mp4 je potřeba ffmpeg. "
+            "Nainstalujte ffmpeg do systému, nebo doinstalujte závislost 'imageio-ffmpeg' a spusťte znovu."
+        )
+
+    cmd = [
+        ffmpeg_exe,
+        "-nostdin",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        *(["-threads", str(RESOURCE_BUDGET.ffmpeg_threads())] if RESOURCE_BUDGET.ffmpeg_threads() else []),
+        "-i",
+        input_path,
+        "-vn",
+        "-ac",
+        "1",
+        "-ar",
+        str(PCM_SAMPLE_RATE),
+        "-f",
+        "s16le",
+        "-c:a",
+        "pcm_s16le",
+        "-",
+    ]
+
+    mmap_threshold_mb = float(config.get("pcm_mmap_threshold_mb", 256))
+    if RESOURCE_BUDGET.max_rss_mb:
+        # Pod stropem paměti se dlouhé vstupy přelévají na disk dřív
+        mmap_threshold_mb = min(mmap_threshold_mb, RESOURCE_BUDGET.max_rss_mb / 8)
+    mmap_threshold = int(mmap_threshold_mb * 1024 * 1024)
+    chunks: list[np.ndarray] = []
+    spill = None
+    total = 0
+    leftover = b""
+
+    # stderr do souboru, aby plná roura nezablokovala ffmpeg při čtení stdout
+    with RESOURCE_BUDGET.decode(), tempfile.TemporaryFile() as stderr_file:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+        try:
+            while True:
+                raw = proc.stdout.read(PCM_READ_CHUNK)
+                if not raw:
+                    break
+                raw = leftover + raw
+                usable = len(raw) - (len(raw) % 2)
+                leftover = raw[usable:]
+                samples = np.frombuffer(raw[:usable], dtype=np.int16).astype(np.float32) / 32768.0
+                total += samples.shape[0]
+
+                if spill is None and total * 4 > mmap_threshold:
+                    spill = tempfile.TemporaryFile(prefix="local_whisper_", dir=config.get("pcm_mmap_dir"))
+                    for chunk in chunks:
+                        spill.write(chunk.tobytes())
+                    chunks.clear()
+
+                if spill is not None:
+                    spill.write(samples.tobytes())
+                else:
+                    chunks.append(samples)
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            if spill is not None:
+                spill.close()
+            raise
+        finally:
+            proc.stdout.close()
+
+        returncode = proc.wait()
+        if returncode != 0:
+            if spill is not None:
+                spill.close()
+            stderr_file.seek(0)
+            raise subprocess.CalledProcessError(
+                returncode, cmd, stderr=stderr_file.read().decode("utf-8", errors="replace")
+            )
+
+    if spill is None:
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+
+    spill.flush()
+    # mmap si drží vlastní handle, soubor je už odlinkovaný a po zavření zmizí
+    audio = np.memmap(spill, dtype=np.float32, mode="r", shape=(total,))
+    spill.close()
+    return audio
+
+
+def decode_pcm(audio) -> np.ndarray:
+    """Vstup (cesta nebo PCM) jako 16 kHz mono PCM; každé dekódování běží pod `RESOURCE_BUDGET`."""
+    if isinstance(audio, np.ndarray):
+        return audio
+    with RESOURCE_BUDGET.decode():
+        return decode_audio(audio, sampling_rate=PCM_SAMPLE_RATE)
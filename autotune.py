@@ -0,0 +1,338 @@
+"""
+🎛️ Auto-tuning
+
+Najde nejrychlejší konfiguraci, která na referenčních nahrávkách drží kvalitu
+(WER/CER) v zadaném limitu, a uloží ji jako config pro daný stroj.
+
+Použití:
+  uv run autotune.py --max-wer 0.12 ref/*.wav
+  uv run autotune.py --device cpu --models small,medium --compute-types int8 --batch seq,8,16 --beams 1,5 ref/
+  uv run autotune.py --cpu-threads 4,8 --output config.tuned.json --results autotune_results.json ref/
+
+Referenční přepis je vedle nahrávky se stejným názvem a příponou `--ref-suffix`
+(default `.ref.txt`, např. `porada.wav` + `porada.ref.txt`).
+
+Prohledávají se kombinace model_size × compute_type × (sekvenční | batched s batch_size)
+× beam_size × cpu_threads. Každá kombinace běží ve vlastním procesu (studené načtení
+modelu se měří zvlášť). Kvalita nezávisí na batch_size ani cpu_threads, takže když
+nastavení modelu/beam/režimu limit nesplní, jeho další varianty se přeskočí.
+Výsledný config = --base + vítězné hodnoty; metadata jsou v klíči `_autotune`.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import itertools
+import statistics
+import unicodedata
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from faster_whisper import decode_audio
+
+from audio import PCM_SAMPLE_RATE, _maybe_decode_to_pcm
+from metrics import peak_rss_mb
+from transcribe import (
+    DEFAULT_CONFIG_FILE,
+    build_transcribe_params,
+    expand_input,
+    get_runtime,
+    load_config,
+    resolve_device,
+)
+
+DEFAULT_OUTPUT_FILE = "config.tuned.json"
+DEFAULT_RESULTS_FILE = "autotune_results.json"
+DEFAULT_REF_SUFFIX = ".ref.txt"
+
+# Klíče configu, které autotune nastavuje
+TUNED_KEYS = ("model_size", "compute_type", "use_batched_inference", "batch_size", "beam_size", "cpu_threads")
+
+
+def normalize_text(text: str) -> str:
+    """Malá písmena, bez interpunkce a s jednoduchými mezerami (pro WER/CER)."""
+    text = unicodedata.normalize("NFC", text).lower()
+    text = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def edit_distance(reference: list, hypothesis: list) -> int:
+    """Levenshteinova vzdálenost dvou posloupností (slova nebo znaky)."""
+    if len(reference) < len(hypothesis):
+        reference, hypothesis = hypothesis, reference
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_item in enumerate(reference, start=1):
+        current = [i]
+        for j, hyp_item in enumerate(hypothesis, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_item != hyp_item),
+            ))
+        previous = current
+    return previous[-1]
+
+
+def error_counts(reference: str, hypothesis: str) -> dict:
+    """Počty chyb a délky referencí pro WER (slova) a CER (znaky)."""
+    reference, hypothesis = normalize_text(reference), normalize_text(hypothesis)
+    return {
+        "word_errors": edit_distance(reference.split(), hypothesis.split()),
+        "words": len(reference.split()),
+        "char_errors": edit_distance(list(reference), list(hypothesis)),
+        "chars": len(reference),
+    }
+
+
+def find_references(specs: list[str], suffix: str, config) -> list[tuple[str, str]]:
+    """Dvojice (nahrávka, referenční text); nahrávky bez reference se přeskočí."""
+    pairs = []
+    for spec in specs:
+        for path in expand_input(spec, config):
+            if path.endswith(suffix):
+                continue
+            ref_path = os.path.splitext(path)[0] + suffix
+            if not os.path.exists(ref_path):
+                print(f"⚠️  {os.path.basename(path)}: chybí reference {os.path.basename(ref_path)}, přeskakuji")
+                continue
+            with open(ref_path, "r", encoding="utf-8") as f:
+                pairs.append((os.path.abspath(path), f.read()))
+    return pairs
+
+
+def build_candidates(base: dict, args) -> list[dict]:
+    """Mřížka kandidátů v pořadí zadaných hodnot (lehčí modely dopředu = dřív známý výsledek).
+
+    `base["device"]` už musí být konkrétní zařízení (ne `auto`), jinak by resolve_device
+    na CPU přepsal compute_type kandidátů na int8.
+    """
+    device, default_compute_type = resolve_device(base)
+    if device == "cpu" and default_compute_type == "float16":
+        default_compute_type = "int8"  # jako benchmark.py --device cpu
+    models = _split(args.models) or [base["model_size"]]
+    compute_types = _split(args.compute_types) or [default_compute_type]
+    batch_modes = _split(args.batch) or ["seq"]
+    beams = [int(b) for b in _split(args.beams)] or [base.get("beam_size", 5)]
+    cpu_threads = [int(t) for t in _split(args.cpu_threads)] if device == "cpu" else []
+    cpu_threads = cpu_threads or [base.get("cpu_threads", 0)]
+
+    candidates = []
+    for model, compute_type, mode, beam, threads in itertools.product(models, compute_types, batch_modes, beams, cpu_threads):
+        batched = mode != "seq"
+        candidates.append({
+            "model_size": model,
+            "compute_type": compute_type,
+            "use_batched_inference": batched,
+            "batch_size": int(mode) if batched else base.get("batch_size", 16),
+            "beam_size": beam,
+            "cpu_threads": threads,
+        })
+    return candidates
+
+
+def _split(value: str | None) -> list[str]:
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+
+def _quality_key(candidate: dict) -> tuple:
+    # batch_size a cpu_threads mění rychlost, ne výsledek
+    return (candidate["model_size"], candidate["compute_type"], candidate["use_batched_inference"], candidate["beam_size"])
+
+
+def _label(candidate: dict) -> str:
+    mode = f"batched {candidate['batch_size']}" if candidate["use_batched_inference"] else "seq"
+    threads = f", {candidate['cpu_threads']} vláken" if candidate["cpu_threads"] else ""
+    return f"{candidate['model_size']} {candidate['compute_type']}, {mode}, beam {candidate['beam_size']}{threads}"
+
+
+def evaluate(config, references: list[tuple[str, str]], repeats: int) -> dict:
+    """Změří jednu kombinaci nad referenční sadou (běží ve vlastním procesu)."""
+    device, compute_type = resolve_device(config)
+    use_batched = config.get("use_batched_inference", False)
+
+    start = time.perf_counter()
+    runtime = get_runtime(config, device, compute_type, {})
+    load_time = time.perf_counter() - start
+    transcribe_func = runtime.batched.transcribe if use_batched else runtime.model.transcribe
+
+    totals = {"word_errors": 0, "words": 0, "char_errors": 0, "chars": 0}
+    audio_duration = 0.0
+    processing = 0.0
+    for path, reference in references:
+        audio = _maybe_decode_to_pcm(path, config)
+        if isinstance(audio, str):
+            audio = decode_audio(audio, sampling_rate=PCM_SAMPLE_RATE)
+        params = build_transcribe_params(config, audio, use_batched)
+        params["log_progress"] = False
+
+        # Studený průchod dává text; rychlost = medián teplých průchodů (nebo studený, když repeats=0)
+        times = []
+        for _ in range(repeats + 1):
+            run_start = time.perf_counter()
+            segments, info = transcribe_func(**params)
+            text = " ".join(segment.text.strip() for segment in segments)
+            times.append(time.perf_counter() - run_start)
+            if len(times) == 1:
+                hypothesis = text
+
+        for key, value in error_counts(reference, hypothesis).items():
+            totals[key] += value
+        audio_duration += info.duration
+        processing += statistics.median(times[1:] or times)
+
+    return {
+        "load_s": load_time,
+        "audio_duration": audio_duration,
+        "processing_s": processing,
+        # RTF jako v benchmark.py: sekundy audia za sekundu zpracování (vyšší = rychlejší)
+        "rtf": audio_duration / processing if processing > 0 else None,
+        "wer": totals["word_errors"] / totals["words"] if totals["words"] else 0.0,
+        "cer": totals["char_errors"] / totals["chars"] if totals["chars"] else 0.0,
+        **totals,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def read_base_file(path: str) -> dict:
+    """Obsah základního configu tak, jak je v souboru (bez předchozího `_autotune`)."""
+    path = os.path.normpath(os.path.expanduser(os.path.expandvars(path)))
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data.pop("_autotune", None)
+    return data
+
+
+def within_budget(result: dict, args) -> bool:
+    if result.get("wer") is None or result["wer"] > args.max_wer:
+        return False
+    return args.max_cer is None or result["cer"] <= args.max_cer
+
+
+def parse_args(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        prog="local-whisper-autotune",
+        description="Najde nejrychlejší konfiguraci v limitu WER/CER na referenčních nahrávkách.",
+    )
+    parser.add_argument("files", nargs="+", help="Referenční nahrávky nebo složky (reference: <název><--ref-suffix>)")
+    parser.add_argument("--base", default=DEFAULT_CONFIG_FILE, help=f"Základní config (default: {DEFAULT_CONFIG_FILE})")
+    parser.add_argument("--ref-suffix", default=DEFAULT_REF_SUFFIX, help=f"Přípona referenčních přepisů (default: {DEFAULT_REF_SUFFIX})")
+    parser.add_argument("--max-wer", type=float, default=0.15, help="Limit WER (default: 0.15)")
+    parser.add_argument("--max-cer", type=float, help="Volitelný limit CER")
+    parser.add_argument("--device", choices=["auto", "cuda", "cpu"], help="Zařízení (default: z configu)")
+    parser.add_argument("--lang", dest="language", help="Jazyk referenční sady (default: z configu)")
+    parser.add_argument("--models", help="Čárkou oddělené model_size (default: z configu), např. small,medium,large-v3")
+    parser.add_argument("--compute-types", help="Čárkou oddělené compute_type (default: podle zařízení)")
+    parser.add_argument("--batch", help="Režimy: 'seq' a/nebo batch_size, např. seq,8,16 (default: seq)")
+    parser.add_argument("--beams", help="Čárkou oddělené beam_size (default: z configu)")
+    parser.add_argument("--cpu-threads", help="Čárkou oddělené cpu_threads, jen CPU (default: z configu)")
+    parser.add_argument("--repeat", type=int, default=1, help="Teplé průchody pro měření rychlosti (default: 1)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_FILE, help=f"Výsledný config (default: {DEFAULT_OUTPUT_FILE})")
+    parser.add_argument("--results", default=DEFAULT_RESULTS_FILE, help=f"Všechna měření (default: {DEFAULT_RESULTS_FILE})")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    base = load_config(args.base)
+    if args.device:
+        base["device"] = args.device
+    if args.language:
+        base["language"] = args.language
+    base["log_progress"] = False
+    base["use_cache"] = False
+    # Zařízení jednou pro celé ladění; konkrétní hodnota v configu kandidátů zaručí, že se
+    # opravdu měří jejich compute_type (`auto` bez CUDA by vždy vrátil int8)
+    base["device"] = resolve_device(base)[0]
+
+    references = find_references(args.files, args.ref_suffix, base)
+    if not references:
+        print(f"❌ Žádné nahrávky s referenčním přepisem ({args.ref_suffix})")
+        sys.exit(1)
+
+    candidates = build_candidates(base, args)
+    print(f"""
+╔══════════════════════════════════════════════════════════════╗
+║  🎛️  AUTOTUNE: nejrychlejší config v limitu kvality          ║
+╚══════════════════════════════════════════════════════════════╝
+
+Reference: {len(references)} nahrávek
+Kandidátů: {len(candidates)}
+Limit: WER ≤ {args.max_wer:.1%}""" + (f", CER ≤ {args.max_cer:.1%}" if args.max_cer is not None else "") + "\n")
+
+    results = []
+    failed_quality = set()
+    for index, candidate in enumerate(candidates, start=1):
+        label = _label(candidate)
+        if _quality_key(candidate) in failed_quality:
+            print(f"⏭️  [{index}/{len(candidates)}] {label}: stejný model/beam/režim limit nesplnil, přeskakuji")
+            continue
+
+        print(f"🔬 [{index}/{len(candidates)}] {label}")
+        config = {**base, **candidate}
+        # Vlastní proces na kombinaci: studené načtení modelu a čisté cpu_threads
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            try:
+                result = pool.submit(evaluate, config, references, max(0, args.repeat)).result()
+            except Exception as e:
+                print(f"   ❌ Chyba: {e}")
+                results.append({"candidate": candidate, "error": str(e)})
+                continue
+
+        result = {"candidate": candidate, **result, "within_budget": within_budget(result, args)}
+        results.append(result)
+        print(
+            f"   WER {result['wer']:.1%}  CER {result['cer']:.1%}  RTF {result['rtf'] or 0:.1f}x  "
+            f"načtení {result['load_s']:.1f}s  {'✅' if result['within_budget'] else '❌ mimo limit'}"
+        )
+        if not result["within_budget"]:
+            failed_quality.add(_quality_key(candidate))
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpu_count": os.cpu_count()},
+        "max_wer": args.max_wer,
+        "max_cer": args.max_cer,
+        "references": [os.path.basename(path) for path, _ in references],
+        "results": results,
+    }
+    with open(args.results, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Všechna měření: {args.results}")
+
+    passing = [r for r in results if r.get("within_budget") and r.get("rtf")]
+    if not passing:
+        print("❌ Žádná kombinace nesplnila limit kvality – zkuste větší model nebo vyšší --max-wer")
+        sys.exit(1)
+
+    best = max(passing, key=lambda r: r["rtf"])
+    # Jen základní config ze souboru (bez doplněných výchozích hodnot) + vyladěné klíče
+    tuned = read_base_file(args.base)
+    tuned["device"] = base["device"]
+    if args.language:
+        tuned["language"] = args.language
+    tuned.update({key: best["candidate"][key] for key in TUNED_KEYS})
+    tuned["_autotune"] = {
+        "created": report["created"],
+        "machine": report["machine"],
+        "references": len(references),
+        "wer": round(best["wer"], 4),
+        "cer": round(best["cer"], 4),
+        "rtf": round(best["rtf"], 2),
+        "max_wer": args.max_wer,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(tuned, f, indent=4, ensure_ascii=False)
+
+    print(f"\n🏆 Nejrychlejší v limitu: {_label(best['candidate'])}")
+    print(f"   WER {best['wer']:.1%}, CER {best['cer']:.1%}, RTF {best['rtf']:.1f}x")
+    print(f"💾 Config uložen do: {args.output}  (uv run transcribe.py --config {args.output} ...)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,150 +1,449 @@
 """
 🚀 Performance Benchmark Script
 
-Porovnání rychlosti různých konfigurací faster-whisper.
-Použití: uv run benchmark.py <audio_file>
+Porovnání rychlosti konfigurací faster-whisper po jednotlivých fázích
+(načtení modelu, dekódování, VAD, detekce jazyka, inference, export).
+
+Použití:
+  uv run benchmark.py audio.mp3 [další soubory...]
+  uv run benchmark.py --config config.json --config config.hq.json audio.mp3
+  uv run benchmark.py --matrix config.examples.json --only rychlost,cpu_režim --device cpu audio.mp3
+  uv run benchmark.py --repeat 5 --baseline benchmark_baseline.json audio.mp3
+  uv run benchmark.py --exports 20000   # mikrobenchmark exportů (bez modelu a audia)
+
+Každá konfigurace běží ve vlastním procesu: první běh je „studený“ (včetně načtení
+modelu), dalších `--repeat` běhů je „teplých“ a z nich se počítá medián a p95.
+Výsledky se ukládají do JSON; s `--baseline` se porovnají s dřívějším během
+a regrese vrátí nenulový exit code.
 """
 
+import os
 import sys
-import time
 import json
-from faster_whisper import WhisperModel, BatchedInferencePipeline
-
-def benchmark_config(audio_path, config_name, model_size, use_batched, batch_size, beam_size):
-    """Benchmarkuje jednu konfiguraci"""
-    print(f"\n{'='*60}")
-    print(f"🔬 Test: {config_name}")
-    print(f"{'='*60}")
-    
-    try:
-        # Načtení modelu
-        print(f"⏳ Načítám model '{model_size}'...")
-        model = WhisperModel(model_size, device="cuda", compute_type="float16")
-        
-        # Přepis
-        start_time = time.time()
-        
-        if use_batched:
-            print(f"📦 Batched inference (batch_size={batch_size})")
-            batched_model = BatchedInferencePipeline(model=model)
-            segments, info = batched_model.transcribe(
-                audio_path,
-                batch_size=batch_size,
-                beam_size=beam_size,
-                vad_filter=True
-            )
-        else:
-            print(f"📝 Sequential inference")
-            segments, info = model.transcribe(
-                audio_path,
-                beam_size=beam_size,
-                vad_filter=True
-            )
-        
-        # Konzumace generátoru
-        segment_count = sum(1 for _ in segments)
-        
-        # Výpočet metrik
-        elapsed = time.time() - start_time
-        audio_duration = info.duration
-        rtf = audio_duration / elapsed  # Real-Time Factor
-        
-        print(f"\n✅ VÝSLEDKY:")
-        print(f"   Audio délka: {audio_duration:.2f}s")
-        print(f"   Čas zpracování: {elapsed:.2f}s")
-        print(f"   RTF: {rtf:.2f}x (vyšší = rychlejší)")
-        print(f"   Segmentů: {segment_count}")
-        print(f"   Jazyk: {info.language} ({info.language_probability:.1%})")
-        
-        return {
-            "config": config_name,
-            "audio_duration": audio_duration,
-            "processing_time": elapsed,
-            "rtf": rtf,
-            "segments": segment_count
-        }
-        
-    except Exception as e:
-        print(f"❌ Chyba: {e}")
-        return None
+import time
+import math
+import random
+import datetime
+import argparse
+import platform
+import tempfile
+import statistics
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from faster_whisper import decode_audio
+from faster_whisper.transcribe import Segment, Word
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+from audio import PCM_SAMPLE_RATE, _maybe_decode_to_pcm
+from exporters import ExportSink
+from metrics import peak_rss_mb
+from transcribe import (
+    DEFAULT_CONFIG_FILE,
+    build_transcribe_params,
+    get_runtime,
+    load_config,
+    resolve_device,
+)
+
+DEFAULT_RESULTS_FILE = "benchmark_results.json"
+RESULTS_FORMAT_VERSION = 1
+STAGES = ("load", "decode", "vad", "language", "inference", "export", "total")
+
+# Výchozí matice (původní tři testy), aplikuje se na --base config
+BUILTIN_MATRIX = {
+    "Medium + Batched (DOPORUČENO)": {"model_size": "medium", "use_batched_inference": True, "batch_size": 16, "beam_size": 5},
+    "Medium bez Batched": {"model_size": "medium", "use_batched_inference": False, "beam_size": 5},
+    "Small + Velký Batch (RYCHLOST)": {"model_size": "small", "use_batched_inference": True, "batch_size": 32, "beam_size": 3},
+}
+
+# Pod tento rozdíl (s) se změna nepovažuje za regresi (šum u krátkých fází)
+REGRESSION_MIN_DELTA_S = 0.05
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Percentil metodou nejbližšího pořadí (stabilní i pro pár opakování)."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _vad_options(params: dict, use_batched: bool):
+    """VAD nastavení tak, jak si je sestaví faster-whisper uvnitř `transcribe()`."""
+    vad_parameters = params.get("vad_parameters")
+    if isinstance(vad_parameters, VadOptions):
+        return vad_parameters
+    vad_parameters = dict(vad_parameters or {})
+    if use_batched:
+        vad_parameters["max_speech_duration_s"] = params.get("chunk_length") or 30
+        vad_parameters.setdefault("min_silence_duration_ms", 160)
+    return VadOptions(**vad_parameters)
+
+
+def run_once(path: str, config, runtime, use_batched: bool, output_dir: str) -> dict:
+    """Jeden průchod souborem; vrací časy fází v sekundách a počty."""
+    timings = {}
+
+    start = time.perf_counter()
+    audio = _maybe_decode_to_pcm(path, config)
+    if isinstance(audio, str):
+        audio = decode_audio(audio, sampling_rate=PCM_SAMPLE_RATE)
+    timings["decode"] = time.perf_counter() - start
+
+    params = build_transcribe_params(config, audio, use_batched)
+    params["log_progress"] = False
+
+    # VAD se měří samostatným (stejným) průchodem; transcribe() ho provede znovu,
+    # proto se od času inference odečítá.
+    timings["vad"] = 0.0
+    if params.get("vad_filter"):
+        start = time.perf_counter()
+        get_speech_timestamps(audio, _vad_options(params, use_batched))
+        timings["vad"] = time.perf_counter() - start
+
+    timings["language"] = 0.0
+    if params.get("language") is None:
+        start = time.perf_counter()
+        params["language"], _, _ = runtime.model.detect_language(
+            audio,
+            language_detection_segments=params.get("language_detection_segments", 1),
+            language_detection_threshold=params.get("language_detection_threshold", 0.5),
+        )
+        timings["language"] = time.perf_counter() - start
+
+    transcribe_func = runtime.batched.transcribe if use_batched else runtime.model.transcribe
+    start = time.perf_counter()
+    segments, info = transcribe_func(**params)
+    segments = list(segments)
+    timings["inference"] = max(0.0, time.perf_counter() - start - timings["vad"])
+
+    start = time.perf_counter()
+    sink = ExportSink(path, {**config, "output_dir": output_dir})
+    sink.begin(info)
+    for segment in segments:
+        sink.write(segment)
+    sink.close()
+    timings["export"] = time.perf_counter() - start
+
+    timings["total"] = sum(timings.values())
+    return {
+        "timings": timings,
+        "audio_duration": info.duration,
+        "segments": len(segments),
+        "language": info.language,
+    }
+
+
+def run_config(name: str, config, files: list[str], repeats: int) -> list[dict]:
+    """Proměří jednu konfiguraci nad všemi soubory (běží ve vlastním procesu)."""
+    device, compute_type = resolve_device(config)
+    use_batched = config.get("use_batched_inference", False)
+
+    start = time.perf_counter()
+    runtime = get_runtime(config, device, compute_type, {})
+    load_time = time.perf_counter() - start
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as output_dir:
+        for path in files:
+            print(f"⏳ {name}: {os.path.basename(path)} (1 studený + {repeats} teplých běhů)")
+            runs = [run_once(path, config, runtime, use_batched, output_dir) for _ in range(repeats + 1)]
+            cold, warm = runs[0], runs[1:] or runs[:1]
+
+            stages = {"load": {"cold": load_time}}
+            for stage in STAGES[1:]:
+                values = [r["timings"][stage] for r in warm]
+                stages[stage] = {
+                    "cold": cold["timings"][stage],
+                    "median": statistics.median(values),
+                    "p95": percentile(values, 95),
+                }
+
+            results.append({
+                "config": name,
+                "file": os.path.basename(path),
+                "audio_duration": cold["audio_duration"],
+                "model_size": config.get("model_size"),
+                "device": device,
+                "compute_type": compute_type,
+                "use_batched_inference": use_batched,
+                "batch_size": config.get("batch_size") if use_batched else None,
+                "beam_size": config.get("beam_size"),
+                "repeats": len(warm),
+                "segments": cold["segments"],
+                "language": cold["language"],
+                "stages": stages,
+                # RTF z mediánu a p95 celkového času (vyšší = rychlejší)
+                "rtf": {
+                    metric: cold["audio_duration"] / stages["total"][metric] if stages["total"][metric] > 0 else None
+                    for metric in ("median", "p95")
+                },
+            })
+
+    for result in results:
+        result["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def build_matrix(args) -> dict:
+    """Sestaví {název: config} z --config / --matrix (nebo výchozí matice)."""
+    matrix = {}
+    for config_file in args.configs:
+        matrix[os.path.basename(config_file)] = load_config(config_file)
+
+    if args.matrix or not matrix:
+        entries = BUILTIN_MATRIX
+        if args.matrix:
+            with open(args.matrix, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        for name, overrides in entries.items():
+            if name.startswith("_") or not isinstance(overrides, dict):
+                continue
+            config = load_config(args.base)
+            config.update({k: v for k, v in overrides.items() if not k.startswith("_")})
+            matrix[name] = config
+
+    if args.only:
+        wanted = {n.strip() for n in args.only.split(",")}
+        matrix = {n: c for n, c in matrix.items() if n in wanted}
+
+    for config in matrix.values():
+        if args.device:
+            config["device"] = args.device
+            if args.device == "cpu" and config.get("compute_type") == "float16":
+                config["compute_type"] = "int8"
+        config["log_progress"] = False
+    return matrix
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """Najde zpomalení proti baseline (teplé mediány, u načtení modelu studený čas)."""
+    previous = {(r["config"], r["file"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get((result["config"], result["file"]))
+        if old is None:
+            continue
+        for stage in STAGES:
+            metric = "cold" if stage == "load" else "median"
+            new_value = result["stages"][stage].get(metric)
+            old_value = old.get("stages", {}).get(stage, {}).get(metric)
+            if new_value is None or old_value is None:
+                continue
+            if new_value > old_value * (1 + tolerance) and new_value - old_value > REGRESSION_MIN_DELTA_S:
+                regressions.append(
+                    f"{result['config']} / {result['file']} / {stage}: "
+                    f"{old_value:.2f}s → {new_value:.2f}s ({(new_value / old_value - 1) if old_value else math.inf:+.0%})"
+                )
+    return regressions
+
+
+def print_summary(results: list[dict]):
+    print(f"\n\n{'='*110}")
+    print("📊 SOUHRNNÉ VÝSLEDKY (teplé běhy: medián, načtení modelu: studené)")
+    print(f"{'='*110}\n")
+    header = f"{'Konfigurace':<32} {'Soubor':<16}" + "".join(f"{s:>10}" for s in STAGES) + f"{'RTF':>8}{'RSS MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in sorted(results, key=lambda r: r["rtf"]["median"] or 0, reverse=True):
+        stages = r["stages"]
+        row = f"{r['config'][:31]:<32} {r['file'][:15]:<16}"
+        row += f"{stages['load']['cold']:>9.2f}s"
+        row += "".join(f"{stages[s]['median']:>9.2f}s" for s in STAGES[1:])
+        row += f"{r['rtf']['median'] or 0:>7.1f}x"
+        row += f"{r['peak_rss_mb']:>9.0f}" if r["peak_rss_mb"] is not None else f"{'-':>9}"
+        print(row)
+
+
+# --- MIKROBENCHMARK EXPORTŮ ---
+def _legacy_timestamp(seconds, sep=","):
+    # Původní převod přes datetime.timedelta (reference pro bajtovou shodu)
+    td = datetime.timedelta(seconds=seconds)
+    total_seconds = int(td.total_seconds())
+    return f"{total_seconds // 3600:02}:{(total_seconds % 3600) // 60:02}:{total_seconds % 60:02}{sep}{int(td.microseconds / 1000):03}"
+
+
+def _legacy_export(segments, source: str, info, output_dir: str):
+    """Původní exporty: timedelta pro každý čas a json.dumps(indent=2) pro každý segment."""
+    with open(os.path.join(output_dir, "bench.txt"), "w", encoding="utf-8") as f:
+        for s in segments:
+            f.write(f"[{_legacy_timestamp(s.start)}] {s.text.strip()}\n")
+    with open(os.path.join(output_dir, "bench.srt"), "w", encoding="utf-8") as f:
+        for i, s in enumerate(segments, start=1):
+            f.write(f"{i}\n")
+            f.write(f"{_legacy_timestamp(s.start)} --> {_legacy_timestamp(s.end)}\n")
+            f.write(f"{s.text.strip()}\n\n")
+    with open(os.path.join(output_dir, "bench.vtt"), "w", encoding="utf-8") as f:
+        f.write("WEBVTT\n\n")
+        for s in segments:
+            f.write(f"{_legacy_timestamp(s.start).replace(',', '.')} --> {_legacy_timestamp(s.end).replace(',', '.')}\n")
+            f.write(f"{s.text.strip()}\n\n")
+    data = {
+        "source": source,
+        "language": info.language,
+        "language_source": info.language_source,
+        "duration": info.duration,
+        "segments": [
+            {
+                "id": s.id, "start": s.start, "end": s.end, "text": s.text.strip(),
+                "words": [{"word": w.word, "start": w.start, "end": w.end, "probability": w.probability} for w in s.words],
+            }
+            for s in segments
+        ],
+    }
+    with open(os.path.join(output_dir, "bench.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def _synthetic_segments(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    vocabulary = ["ahoj", "světe", "přepis", "\"citace\"", "čas", "zkouška", "tab\tulka", "řeč", "Ω", "end"]
+    segments, t = [], 0.0
+    for i in range(1, count + 1):
+        words, w_start = [], t
+        for _ in range(rng.randint(3, 15)):
+            w_end = round(w_start + rng.uniform(0.05, 0.9), 3)
+            words.append(Word(start=w_start, end=w_end, word=" " + rng.choice(vocabulary), probability=rng.random()))
+            w_start = w_end
+        text = "".join(w.word for w in words)
+        segments.append(Segment(
+            id=i, seek=0, start=t, end=w_start, text=text, tokens=[], avg_logprob=-0.2,
+            compression_ratio=1.2, no_speech_prob=0.01, words=words, temperature=0.0,
+        ))
+        t = w_start + rng.choice([0.0, 0.3333333, 1.0005, 2.5])
+    return segments
+
+
+def export_microbenchmark(count: int, repeats: int) -> bool:
+    """Porovná původní a tabulkové exporty na syntetických segmentech s word timestamps."""
+    from types import SimpleNamespace
+
+    segments = _synthetic_segments(count)
+    info = SimpleNamespace(language="cs", language_probability=1.0, language_source="config", duration=segments[-1].end)
+    config = {"output_formats": ["txt", "srt", "vtt", "json"], "word_timestamps": True}
+    print(f"📝 Mikrobenchmark exportů: {count} segmentů, {sum(len(s.words) for s in segments)} slov, {repeats} opakování")
+
+    with tempfile.TemporaryDirectory() as legacy_dir, tempfile.TemporaryDirectory() as table_dir:
+        legacy_times, table_times = [], []
+        for _ in range(max(1, repeats)):
+            start = time.perf_counter()
+            _legacy_export(segments, "bench.wav", info, legacy_dir)
+            legacy_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            sink = ExportSink("bench.wav", dict(config, output_dir=table_dir))
+            sink.begin(info)
+            for segment in segments:
+                sink.write(segment)
+            sink.close()
+            table_times.append(time.perf_counter() - start)
+
+        identical = True
+        for ext in config["output_formats"]:
+            with open(os.path.join(legacy_dir, f"bench.{ext}"), "rb") as a, open(os.path.join(table_dir, f"bench.{ext}"), "rb") as b:
+                if a.read() != b.read():
+                    print(f"❌ {ext}: výstup se liší od původní implementace")
+                    identical = False
+
+    legacy, table = min(legacy_times), min(table_times)
+    print(f"   původní exporty:   {legacy:.3f}s")
+    print(f"   tabulkové exporty: {table:.3f}s  ({legacy / table:.1f}× rychleji)")
+    if identical:
+        print("✅ Výstupy bajtově shodné (txt, srt, vtt, json)")
+    return identical
+
+
+def parse_args(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        prog="local-whisper-benchmark",
+        description="Benchmark konfigurací faster-whisper po fázích.",
+    )
+    parser.add_argument("files", nargs="*", help="Testovací audio soubory")
+    parser.add_argument("--config", dest="configs", action="append", default=[], help="Konfigurační soubor do matice (lze opakovat)")
+    parser.add_argument("--matrix", help="JSON {název: přepisy configu}, např. config.examples.json")
+    parser.add_argument("--base", default=DEFAULT_CONFIG_FILE, help=f"Základní config pro --matrix (default: {DEFAULT_CONFIG_FILE})")
+    parser.add_argument("--only", help="Čárkou oddělené názvy konfigurací, které se mají spustit")
+    parser.add_argument("--device", choices=["auto", "cuda", "cpu"], help="Přepsat zařízení pro všechny konfigurace")
+    parser.add_argument("--repeat", type=int, default=3, help="Počet teplých opakování (default: 3)")
+    parser.add_argument("--output", default=DEFAULT_RESULTS_FILE, help=f"Soubor s výsledky (default: {DEFAULT_RESULTS_FILE})")
+    parser.add_argument("--baseline", help="Dřívější výsledky pro porovnání (regrese → exit code 1)")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Povolené zpomalení proti baseline (default: 0.10 = 10 %%)")
+    parser.add_argument("--exports", type=int, metavar="N", help="Jen mikrobenchmark exportů na N syntetických segmentech")
+    args = parser.parse_args(argv)
+    if not args.files and not args.exports:
+        parser.error("zadejte testovací soubory nebo --exports N")
+    return args
+
 
 def main():
-    if len(sys.argv) < 2:
-        print("Použití: uv run benchmark.py <audio_file>")
+    args = parse_args(sys.argv[1:])
+    if args.exports:
+        sys.exit(0 if export_microbenchmark(args.exports, args.repeat) else 1)
+
+    files = [os.path.abspath(f) for f in args.files]
+    missing = [f for f in files if not os.path.exists(f)]
+    if missing:
+        print(f"❌ Soubor nenalezen: {', '.join(missing)}")
+        sys.exit(1)
+
+    matrix = build_matrix(args)
+    if not matrix:
+        print("❌ Žádná konfigurace k testování")
         sys.exit(1)
-    
-    audio_path = sys.argv[1]
-    
+
     print(f"""
 ╔══════════════════════════════════════════════════════════════╗
 ║  🎯 FASTER-WHISPER PERFORMANCE BENCHMARK                    ║
 ╚══════════════════════════════════════════════════════════════╝
 
-Audio soubor: {audio_path}
-
-Tento test porovná různé konfigurace a ukáže, která je
-nejrychlejší pro váš hardware.
+Soubory: {', '.join(os.path.basename(f) for f in files)}
+Konfigurace: {', '.join(matrix)}
+Opakování: 1 studený + {args.repeat} teplých běhů
 """)
-    
+
     results = []
-    
-    # Test 1: Medium + Batched (doporučená konfigurace)
-    results.append(benchmark_config(
-        audio_path,
-        "Medium + Batched (DOPORUČENO)",
-        "medium",
-        use_batched=True,
-        batch_size=16,
-        beam_size=5
-    ))
-    
-    # Test 2: Medium bez Batched
-    results.append(benchmark_config(
-        audio_path,
-        "Medium bez Batched",
-        "medium",
-        use_batched=False,
-        batch_size=None,
-        beam_size=5
-    ))
-    
-    # Test 3: Small + Agresivní batching
-    results.append(benchmark_config(
-        audio_path,
-        "Small + Velký Batch (RYCHLOST)",
-        "small",
-        use_batched=True,
-        batch_size=32,
-        beam_size=3
-    ))
-    
-    # Vyhodnocení
-    print(f"\n\n{'='*60}")
-    print("📊 SOUHRNNÉ VÝSLEDKY")
-    print(f"{'='*60}\n")
-    
-    valid_results = [r for r in results if r is not None]
-    if not valid_results:
+    for name, config in matrix.items():
+        print(f"\n{'='*60}")
+        print(f"🔬 Test: {name}")
+        print(f"{'='*60}")
+        # Vlastní proces na konfiguraci: studené načtení modelu a čisté měření špičky RSS
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            try:
+                results.extend(pool.submit(run_config, name, config, files, max(0, args.repeat)).result())
+            except Exception as e:
+                print(f"❌ Chyba: {e}")
+
+    if not results:
         print("❌ Žádné úspěšné testy")
-        return
-    
-    # Seřazení podle RTF (nejvyšší = nejrychlejší)
-    valid_results.sort(key=lambda x: x["rtf"], reverse=True)
-    
-    print(f"{'Konfigurace':<35} {'RTF':>8} {'Čas':>10}")
-    print("-" * 60)
-    for r in valid_results:
-        print(f"{r['config']:<35} {r['rtf']:>7.2f}x {r['processing_time']:>9.2f}s")
-    
-    print("\n🏆 VÍTĚZ:")
-    winner = valid_results[0]
-    print(f"   {winner['config']}")
-    print(f"   Rychlost: {winner['rtf']:.2f}x real-time")
-    
-    # Uložení výsledků
-    with open("benchmark_results.json", "w", encoding="utf-8") as f:
-        json.dump(valid_results, f, indent=2, ensure_ascii=False)
-    print(f"\n💾 Detailní výsledky uloženy do: benchmark_results.json")
+        sys.exit(1)
+
+    print_summary(results)
+
+    report = {
+        "version": RESULTS_FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Detailní výsledky uloženy do: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline.get("results", []), args.tolerance)
+        if regressions:
+            print(f"\n⚠️  REGRESE proti {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"\n✅ Bez regresí proti {args.baseline} (tolerance {args.tolerance:.0%})")
+
 
 if __name__ == "__main__":
     main()
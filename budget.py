@@ -0,0 +1,204 @@
+"""
+⚖️ Rozpočet prostředků
+
+Jeden `RESOURCE_BUDGET` na proces: vlákna modelu, souběžná dekódování vstupů
+a strop paměti (`max_threads`, `max_concurrent_decodes`, `max_rss_mb`).
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+from colorama import Fore, Style
+
+from console import echo
+from metrics import peak_rss_mb
+
+
+# --- ROZPOČET PROSTŘEDKŮ ---
+# Výchozí počet vláken CTranslate2 při cpu_threads=0
+_CT2_DEFAULT_THREADS = 4
+
+
+def current_rss_mb() -> float | None:
+    """Aktuální rezidentní paměť procesu v MB (None, kde to OS neumí)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+class ResourceBudget:
+    """Rozpočet procesu pro sdílené stroje: vlákna modelu, souběžná dekódování a strop paměti.
+
+    Vlákna se omezují při vytváření modelu (a poolu pro úseky), dekódování vstupů
+    (ffmpeg v `_maybe_decode_to_pcm`, ostatní formáty v `decode_pcm`) čekají na volné místo a nad `max_rss_mb` nová dekódování počkají, dokud rozpracované
+    soubory nedoběhnou, a další soubory dostanou poloviční `batch_size`.
+    """
+
+    def __init__(self):
+        self.configure({})
+
+    def configure(self, config):
+        self.max_threads = int(config.get("max_threads", 0) or 0)
+        self.max_decodes = int(config.get("max_concurrent_decodes", 0) or 0)
+        self.max_rss_mb = float(config.get("max_rss_mb", 0) or 0)
+        self.max_wait_s = float(config.get("budget_max_wait_s", 300))
+        self._decodes = threading.BoundedSemaphore(self.max_decodes) if self.max_decodes else None
+        self._changed = threading.Condition()
+        self._local = threading.local()
+        self.model_threads = {}  # klíč modelu / poolu → vlákna
+        self.peak_model_threads = 0
+        self.active_decodes = self.peak_decodes = self.total_decodes = 0
+        self.decode_wait_s = 0.0
+        self.active_files = self.waiting_files = 0
+        self.memory_waits = 0
+        self.memory_wait_s = 0.0
+        self.batch_reductions = 0
+        self.slots = {}  # název slotu → usage() z procesu slotu
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_threads or self.max_decodes or self.max_rss_mb)
+
+    def threads(self, cpu_threads: int, num_workers: int) -> tuple[int, int]:
+        """(cpu_threads, num_workers) pro model tak, aby cpu_threads × num_workers ≤ max_threads."""
+        cpu_threads, num_workers = int(cpu_threads or 0), max(1, int(num_workers or 1))
+        if not self.max_threads:
+            return cpu_threads, num_workers
+        num_workers = min(num_workers, self.max_threads)
+        return max(1, min(cpu_threads or _CT2_DEFAULT_THREADS, self.max_threads // num_workers)), num_workers
+
+    def note_model(self, key, threads: int):
+        with self._changed:
+            self.model_threads[key] = threads
+            self.peak_model_threads = max(self.peak_model_threads, sum(self.model_threads.values()))
+
+    def ffmpeg_threads(self) -> int | None:
+        # Dekódování zvuku z víc vláken nezrychlí, pod rozpočtem stačí jedno
+        return 1 if self.max_threads else None
+
+    def over_memory(self) -> bool:
+        if not self.max_rss_mb:
+            return False
+        rss = current_rss_mb()
+        return rss is not None and rss > self.max_rss_mb
+
+    def begin_file(self):
+        """Označí rozpracovaný soubor (pro backpressure při nedostatku paměti)."""
+        with self._changed:
+            self.active_files += 1
+        self._local.in_file = True
+
+    def end_file(self):
+        self._local.in_file = False
+        with self._changed:
+            self.active_files -= 1
+            self._changed.notify_all()
+
+    def reduce_batch(self, batch_size: int) -> int:
+        """Poloviční batch_size, když je proces nad stropem paměti (jinak beze změny)."""
+        if batch_size <= 1 or not self.over_memory():
+            return batch_size
+        with self._changed:
+            self.batch_reductions += 1
+        return batch_size // 2
+
+    @contextmanager
+    def waiting(self):
+        """Soubor čeká na vlastní dekódování z pozadí, pro backpressure se nepočítá jako rozpracovaný."""
+        with self._changed:
+            self.waiting_files += 1
+            self._changed.notify_all()
+        try:
+            yield
+        finally:
+            with self._changed:
+                self.waiting_files -= 1
+
+    def _wait_for_memory(self):
+        # Čeká se jen, dokud na jiném souboru někdo opravdu pracuje (jinak by čekali všichni navzájem)
+        if not self.over_memory():
+            return
+        in_file = getattr(self._local, "in_file", False)
+        start = time.perf_counter()
+        with self._changed:
+            self.memory_waits += 1
+            self.waiting_files += in_file
+            try:
+                while self.over_memory() and self.active_files - self.waiting_files > 0:
+                    if time.perf_counter() - start > self.max_wait_s:
+                        break
+                    self._changed.wait(0.5)
+            finally:
+                self.waiting_files -= in_file
+                self.memory_wait_s += time.perf_counter() - start
+
+    @contextmanager
+    def decode(self):
+        """Místo pro jedno dekódování vstupu (backpressure: počet a paměť)."""
+        start = time.perf_counter()
+        self._wait_for_memory()
+        if self._decodes is not None:
+            self._decodes.acquire()
+        with self._changed:
+            self.decode_wait_s += time.perf_counter() - start
+            self.active_decodes += 1
+            self.total_decodes += 1
+            self.peak_decodes = max(self.peak_decodes, self.active_decodes)
+        try:
+            yield
+        finally:
+            with self._changed:
+                self.active_decodes -= 1
+                self._changed.notify_all()
+            if self._decodes is not None:
+                self._decodes.release()
+
+    def usage(self) -> dict:
+        return {
+            "model_threads": self.peak_model_threads,
+            "decodes": self.peak_decodes,
+            "total_decodes": self.total_decodes,
+            "decode_wait_s": round(self.decode_wait_s, 3),
+            "peak_rss_mb": peak_rss_mb(),
+            "memory_waits": self.memory_waits,
+            "memory_wait_s": round(self.memory_wait_s, 3),
+            "batch_reductions": self.batch_reductions,
+        }
+
+    def report(self):
+        """Souhrn využití rozpočtu na konci běhu (jen když je nějaký limit nastavený)."""
+        if not self.enabled:
+            return
+        usage = self.usage()
+        if self.slots:
+            # Sloty běží ve vlastních procesech; špička RSS je součet špiček (horní odhad)
+            for key in ("model_threads", "decodes", "total_decodes", "decode_wait_s", "memory_waits", "memory_wait_s", "batch_reductions"):
+                usage[key] = sum(slot[key] for slot in self.slots.values())
+            usage["peak_rss_mb"] = sum(slot["peak_rss_mb"] or 0 for slot in self.slots.values()) + (peak_rss_mb() or 0)
+
+        def share(used, limit, unit=""):
+            if not limit:
+                return f"{used:.0f}{unit} (bez limitu)"
+            return f"{used:.0f}/{limit:.0f}{unit} ({used / limit:.0%})"
+
+        echo(f"{Fore.CYAN}[BUDGET]{Style.RESET_ALL} Vlákna modelu: {share(usage['model_threads'], self.max_threads)}"
+             + (", ffmpeg 1 vlákno na dekódování" if self.max_threads else ""), level="result")
+        echo(f"{Fore.CYAN}[BUDGET]{Style.RESET_ALL} Souběžná dekódování: {share(usage['decodes'], self.max_decodes)} "
+             f"ze {usage['total_decodes']} dekódování vstupů (ffmpeg i faster-whisper), čekání {usage['decode_wait_s']:.1f}s",
+             level="result")
+        if usage["peak_rss_mb"] is None:
+            echo(f"{Fore.CYAN}[BUDGET]{Style.RESET_ALL} Paměť: špičku RSS tento systém neumí změřit", level="result")
+        else:
+            echo(
+                f"{Fore.CYAN}[BUDGET]{Style.RESET_ALL} Paměť: špička RSS {share(usage['peak_rss_mb'], self.max_rss_mb, ' MB')}, "
+                f"čekání {usage['memory_waits']}× ({usage['memory_wait_s']:.1f}s), batch_size sníženo {usage['batch_reductions']}×",
+                level="result",
+            )
+
+
+RESOURCE_BUDGET = ResourceBudget()
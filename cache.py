@@ -0,0 +1,158 @@
+"""
+🗃️ Cache přepisů
+
+Stejný obsah vstupu + stejné efektivní parametry => stejné segmenty. Záznam je
+JSONL (info + segmenty) pod `cache_dir`, zapisuje se průběžně jako další příjemce
+`ExportSink` a velikost cache drží `cache_max_mb`.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from types import SimpleNamespace
+
+from colorama import Fore, Style
+
+from console import echo
+from exporters import _info_to_dict, _segment_from_dict, _segment_to_dict
+
+
+# --- CACHE PŘEPISŮ ---
+# Zvýšit při změně formátu uložených záznamů
+CACHE_FORMAT_VERSION = 3
+
+
+def transcription_cache_key(audio_path: str, model_key: tuple, transcribe_params: dict) -> str:
+    """Klíč cache: hash obsahu vstupu + efektivní parametry přepisu (bez `audio` a `log_progress`)."""
+    with open(audio_path, "rb") as f:
+        audio_hash = hashlib.file_digest(f, "sha256").hexdigest()
+
+    params = {k: v for k, v in transcribe_params.items() if k not in ("audio", "log_progress")}
+    payload = json.dumps(
+        {"version": CACHE_FORMAT_VERSION, "audio": audio_hash, "model": list(model_key), "params": params},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cache_root(config) -> str:
+    """Složka cache; relativní `cache_dir` se bere vůči skriptu (jako registr modelů), ne vůči cwd."""
+    root = os.path.expanduser(os.path.expandvars(config.get("cache_dir") or "cache"))
+    return os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), root))
+
+
+def _cache_path(config, key: str) -> str:
+    return os.path.join(cache_root(config), key[:2], f"{key}.jsonl")
+
+
+def cache_lookup(config, key: str):
+    """Vrátí (info, generátor segmentů) z cache, nebo None."""
+    path = _cache_path(config, key)
+    try:
+        f = open(path, "r", encoding="utf-8")
+        info = SimpleNamespace(**json.loads(f.readline()))
+    except (OSError, ValueError, TypeError):
+        return None
+
+    # LRU: čas posledního použití = mtime záznamu
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    def segments():
+        with f:
+            for line in f:
+                yield _segment_from_dict(json.loads(line))
+
+    return info, segments()
+
+
+class CacheWriter:
+    """Příjemce pro `ExportSink`: streamuje segmenty do dočasného souboru, při `end()` ho atomicky publikuje."""
+
+    def __init__(self, config, key: str):
+        self.config = config
+        self.path = _cache_path(config, key)
+        self.tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self.f = None
+        self.discarded = False
+
+    def begin(self, info):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.f = open(self.tmp_path, "w", encoding="utf-8")
+        self.f.write(json.dumps(_info_to_dict(info)) + "\n")
+
+    def write(self, s):
+        self.f.write(json.dumps(_segment_to_dict(s), ensure_ascii=False) + "\n")
+
+    def flush(self):
+        pass
+
+    def discard(self):
+        """Výsledek se na konci nepublikuje (např. po změně compute_type uprostřed přepisu)."""
+        self.discarded = True
+
+    def end(self):
+        if self.discarded:
+            self.abort()
+            return
+        try:
+            self.f.close()
+            os.replace(self.tmp_path, self.path)
+            _cache_added(cache_root(self.config), os.path.getsize(self.path), int(float(self.config.get("cache_max_mb", 1024)) * 1024 * 1024))
+        except OSError as e:
+            echo(f"{Fore.YELLOW}[CACHE]{Style.RESET_ALL} Nepodařilo se uložit do cache: {e}", level="error")
+
+    def abort(self):
+        if self.f is not None:
+            self.f.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+# Odhad velikosti cache po složkách (jeden průchod na proces, pak se jen přičítá)
+_CACHE_SIZE_LOCK = threading.Lock()
+_CACHE_SIZE: dict[str, int] = {}
+# Eviction uvolní místo s rezervou, aby další zápisy složku hned znovu neprocházely
+_CACHE_EVICT_TARGET = 0.9
+
+
+def _cache_added(cache_dir: str, size: int, max_bytes: int):
+    """Započte nový záznam; složku prochází jen při prvním zápisu a po překročení limitu."""
+    with _CACHE_SIZE_LOCK:
+        total = _CACHE_SIZE.get(cache_dir)
+        total = _cache_evict(cache_dir, max_bytes) if total is None else total + size
+        if total > max_bytes:
+            total = _cache_evict(cache_dir, int(max_bytes * _CACHE_EVICT_TARGET))
+        _CACHE_SIZE[cache_dir] = total
+
+
+def _cache_evict(cache_dir: str, max_bytes: int) -> int:
+    """Smaže nejdéle nepoužité záznamy nad `max_bytes`; vrací skutečnou velikost cache po úklidu."""
+    entries = []
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            if not name.endswith(".jsonl"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+    return total
@@ -0,0 +1,98 @@
+"""
+🖥️ Konzole a průběh
+
+Výpisy podle režimu konzole (`console`: full, summary, quiet) a strukturované
+události průběhu do `progress_file`. Režim platí pro celý proces.
+"""
+
+import sys
+import json
+import time
+import threading
+
+
+# --- KONZOLE A PRŮBĚH ---
+# Co se v jakém režimu vypisuje: full = vše včetně segmentů, summary = jen řádek
+# na soubor a souhrny na konci, quiet = jen chyby (pro systemd/journald)
+CONSOLE_LEVELS = {
+    "full": {"segment", "info", "result", "error"},
+    "summary": {"summary", "result", "error"},
+    "quiet": {"error"},
+}
+_CONSOLE_MODE = "full"
+_PROGRESS_LOCK = threading.Lock()
+
+
+def set_console_mode(config):
+    """Nastaví režim konzole procesu podle `console` v configu."""
+    global _CONSOLE_MODE
+    mode = config.get("console", "full")
+    if mode not in CONSOLE_LEVELS:
+        raise ValueError(f"Neznámý režim konzole '{mode}' (full, summary, quiet)")
+    _CONSOLE_MODE = mode
+
+
+def console_enabled(level: str) -> bool:
+    return level in CONSOLE_LEVELS[_CONSOLE_MODE]
+
+
+def echo(*args, level: str = "info", **kwargs):
+    """`print` podle režimu konzole (`level`: segment, info, summary, result, error)."""
+    if level in CONSOLE_LEVELS[_CONSOLE_MODE]:
+        print(*args, **kwargs)
+
+
+class ProgressReporter:
+    """Strukturované události průběhu (JSON řádky) do `progress_file`; `-` = stderr.
+
+    `progress` události se posílají nejvýš jednou za `progress_interval_s`,
+    `start` a konečný stav vždy.
+    """
+
+    def __init__(self, audio_path: str, config):
+        self.path = config.get("progress_file")
+        self.interval = float(config.get("progress_interval_s", 2.0))
+        self.audio_path = audio_path
+        self.started = time.time()
+        self.last_emit = 0.0
+        self.duration = None
+        self.base = 0.0
+        self.inference_started = None
+
+    def _emit(self, event: str, **data):
+        if not self.path:
+            return
+        line = json.dumps({"event": event, "file": self.audio_path, "time": round(time.time(), 3), **data}, ensure_ascii=False)
+        with _PROGRESS_LOCK:
+            if self.path == "-":
+                print(line, file=sys.stderr, flush=True)
+            else:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    def start(self, duration: float, position: float = 0.0):
+        self.duration = duration
+        self.base = position
+        self.inference_started = time.time()
+        self._emit("start", duration_s=round(duration, 3), position_s=round(position, 3))
+
+    def update(self, position: float, segments: int):
+        now = time.time()
+        if not self.path or now - self.last_emit < self.interval or not self.duration:
+            return
+        self.last_emit = now
+        elapsed = now - self.inference_started
+        done = position - self.base
+        eta = elapsed / done * (self.duration - position) if done > 0 else None
+        self._emit(
+            "progress",
+            position_s=round(position, 3),
+            duration_s=round(self.duration, 3),
+            percent=round(min(100.0, 100.0 * position / self.duration), 1),
+            elapsed_s=round(elapsed, 3),
+            eta_s=round(max(0.0, eta), 1) if eta is not None else None,
+            segments=segments,
+        )
+
+    def finish(self, status: str, segments: int):
+        self._emit(status, elapsed_s=round(time.time() - self.started, 3), segments=segments)
@@ -0,0 +1,642 @@
+"""
+💾 Exporty přepisu
+
+Streamované exporty (txt, srt, vtt, json, jsonl, columns) přes `ExportSink`,
+sloupcové úložiště segmentů `SegmentStore` a serializace segmentů, kterou
+sdílí cache i checkpointy.
+"""
+
+import os
+import json
+import math
+import queue
+import dataclasses
+from array import array
+
+import numpy as np
+from faster_whisper.transcribe import Segment, Word
+
+from console import echo
+
+
+# --- POMOCNÉ FUNKCE PRO FORMÁTOVÁNÍ ČASU ---
+# Zaokrouhlení odpovídá původnímu převodu přes datetime.timedelta:
+# sekundy -> mikrosekundy (round half even), milisekundy se pak uříznou.
+def timestamps_ms(seconds) -> np.ndarray:
+    """Pole časů v sekundách -> celé milisekundy (int64) jednou vektorovou operací."""
+    return np.rint(np.asarray(seconds, dtype=np.float64) * 1e6).astype(np.int64) // 1000
+
+
+def format_ms(ms: int, sep: str = ",") -> str:
+    """Celé milisekundy na HH:MM:SS,mmm (SRT) nebo s `sep="."` na VTT."""
+    hours, rest = divmod(ms, 3_600_000)
+    minutes, rest = divmod(rest, 60_000)
+    secs, millis = divmod(rest, 1000)
+    return f"{hours:02}:{minutes:02}:{secs:02}{sep}{millis:03}"
+
+
+def format_timestamp_srt(seconds):
+    """Převede sekundy na formát SRT (HH:MM:SS,mmm)"""
+    return format_ms(round(seconds * 1e6) // 1000)
+
+
+def format_timestamp_vtt(seconds):
+    """Převede sekundy na formát VTT (HH:MM:SS.mmm)"""
+    return format_ms(round(seconds * 1e6) // 1000, ".")
+
+
+# --- SLOUPCOVÉ ÚLOŽIŠTĚ SEGMENTŮ ---
+COLUMNS_MAGIC = b"LWCOLS1\n"
+_COLUMNS_ALIGN = 64
+
+
+class SegmentStore:
+    """Segmenty a slova po sloupcích: kompaktní pole čísel a jeden UTF-8 buffer textu s offsety.
+
+    Místo milionů objektů `Segment`/`Word` drží jen pole (`array.array`);
+    objekty se vytváří až při čtení, po jednom (`iter`, `store[i]`).
+    Pickluje se jako pár bajtových bloků, takže je levné i mezi procesy.
+
+    Ve výchozím stavu jen to, co potřebují exporty (id, časy, text, slova); ostatní
+    pole `Segment` (seek, tokeny, `avg_logprob`, ...) jsou pak None. `detail=True`
+    drží i je – pro segmenty, které jdou dál do cache a metrik (úseky `chunk_workers`,
+    checkpoint), aby výsledek odpovídal přepisu bez nich.
+    """
+
+    SEGMENT_COLUMNS = {"id": "i", "start": "d", "end": "d"}
+    DETAIL_COLUMNS = {"seek": "i", "avg_logprob": "d", "compression_ratio": "d", "no_speech_prob": "d", "temperature": "d"}
+    WORD_COLUMNS = {"start": "d", "end": "d", "probability": "d"}
+
+    def __init__(self, detail: bool = False):
+        self.detail = detail
+        columns = {**self.SEGMENT_COLUMNS, **self.DETAIL_COLUMNS} if detail else self.SEGMENT_COLUMNS
+        self.segment = {name: array(code) for name, code in columns.items()}
+        self.word = {name: array(code) for name, code in self.WORD_COLUMNS.items()}
+        self.text = bytearray()
+        self.text_offsets = array("q", [0])
+        self.tokens = array("i") if detail else None
+        self.token_offsets = array("q", [0]) if detail else None
+        self.word_offsets = array("q", [0])
+        self.word_text = bytearray()
+        self.word_text_offsets = array("q", [0])
+
+    def __len__(self):
+        return len(self.segment["id"])
+
+    def append(self, s):
+        columns = self.segment
+        for name in ("id", "start", "end"):
+            columns[name].append(getattr(s, name))
+        if self.detail:
+            for name in ("seek", "avg_logprob", "compression_ratio", "no_speech_prob"):
+                columns[name].append(getattr(s, name))
+            columns["temperature"].append(math.nan if s.temperature is None else s.temperature)
+            self.tokens.extend(s.tokens or ())
+            self.token_offsets.append(len(self.tokens))
+        self.text += s.text.encode("utf-8")
+        self.text_offsets.append(len(self.text))
+        for w in s.words or ():
+            self.word["start"].append(w.start)
+            self.word["end"].append(w.end)
+            self.word["probability"].append(w.probability)
+            self.word_text += w.word.encode("utf-8")
+            self.word_text_offsets.append(len(self.word_text))
+        self.word_offsets.append(len(self.word["start"]))
+
+    def extend(self, segments):
+        for s in segments:
+            self.append(s)
+
+    def __getitem__(self, i: int) -> Segment:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        columns = self.segment
+        word_start, word_end = self.word_offsets[i], self.word_offsets[i + 1]
+        words = [
+            Word(
+                start=self.word["start"][j],
+                end=self.word["end"][j],
+                word=self.word_text[self.word_text_offsets[j]:self.word_text_offsets[j + 1]].decode("utf-8"),
+                probability=self.word["probability"][j],
+            )
+            for j in range(word_start, word_end)
+        ]
+        segment = Segment(
+            id=columns["id"][i],
+            seek=None,
+            start=columns["start"][i],
+            end=columns["end"][i],
+            text=self.text[self.text_offsets[i]:self.text_offsets[i + 1]].decode("utf-8"),
+            tokens=None,
+            avg_logprob=None,
+            compression_ratio=None,
+            no_speech_prob=None,
+            words=words or None,
+            temperature=None,
+        )
+        if self.detail:
+            temperature = columns["temperature"][i]
+            segment = dataclasses.replace(
+                segment,
+                seek=columns["seek"][i],
+                tokens=self.tokens[self.token_offsets[i]:self.token_offsets[i + 1]].tolist(),
+                avg_logprob=columns["avg_logprob"][i],
+                compression_ratio=columns["compression_ratio"][i],
+                no_speech_prob=columns["no_speech_prob"][i],
+                temperature=None if math.isnan(temperature) else temperature,
+            )
+        return segment
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def columns(self) -> dict[str, np.ndarray]:
+        """Všechny sloupce jako NumPy pole (bez kopie)."""
+        result = {f"segment.{name}": np.frombuffer(column, dtype=column.typecode) for name, column in self.segment.items()}
+        result.update({f"word.{name}": np.frombuffer(column, dtype=column.typecode) for name, column in self.word.items()})
+        result.update({
+            "segment.text": np.frombuffer(self.text, dtype=np.uint8),
+            "segment.text_offsets": np.frombuffer(self.text_offsets, dtype=np.int64),
+            "segment.word_offsets": np.frombuffer(self.word_offsets, dtype=np.int64),
+            "word.text": np.frombuffer(self.word_text, dtype=np.uint8),
+            "word.text_offsets": np.frombuffer(self.word_text_offsets, dtype=np.int64),
+        })
+        if self.detail:
+            result.update({
+                "segment.tokens": np.frombuffer(self.tokens, dtype=self.tokens.typecode),
+                "segment.token_offsets": np.frombuffer(self.token_offsets, dtype=np.int64),
+            })
+        return result
+
+    def save(self, path: str, header: dict):
+        """Binární sidecar: magic, délka a JSON hlavička, pak sloupce zarovnané na 64 B (viz `load_columns`)."""
+        columns = self.columns()
+        layout, offset = {}, 0
+        for name, values in columns.items():
+            layout[name] = {"dtype": values.dtype.str, "offset": offset, "length": int(values.shape[0])}
+            offset += -(-values.nbytes // _COLUMNS_ALIGN) * _COLUMNS_ALIGN
+        meta = json.dumps({**header, "segments": len(self), "words": len(self.word["start"]), "columns": layout}, ensure_ascii=False).encode("utf-8")
+        data_start = -(-(len(COLUMNS_MAGIC) + 8 + len(meta)) // _COLUMNS_ALIGN) * _COLUMNS_ALIGN
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(COLUMNS_MAGIC + len(meta).to_bytes(8, "little") + meta)
+            for name, values in columns.items():
+                f.seek(data_start + layout[name]["offset"])
+                f.write(values.tobytes())
+            f.truncate(data_start + offset)
+        os.replace(tmp_path, path)
+
+
+def load_columns(path: str, mmap: bool = True) -> tuple[dict, dict[str, np.ndarray]]:
+    """Načte sidecar `.columns`: (hlavička, {název sloupce: pole}); s `mmap` bez čtení dat do paměti."""
+    with open(path, "rb") as f:
+        if f.read(len(COLUMNS_MAGIC)) != COLUMNS_MAGIC:
+            raise ValueError(f"'{path}' není soubor se sloupci segmentů")
+        size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(size))
+    data_start = -(-(len(COLUMNS_MAGIC) + 8 + size) // _COLUMNS_ALIGN) * _COLUMNS_ALIGN
+
+    columns = {}
+    for name, spec in header.pop("columns").items():
+        dtype = np.dtype(spec["dtype"])
+        if spec["length"] == 0:
+            columns[name] = np.zeros(0, dtype=dtype)
+        elif mmap:
+            columns[name] = np.memmap(path, dtype=dtype, mode="r", offset=data_start + spec["offset"], shape=(spec["length"],))
+        else:
+            with open(path, "rb") as f:
+                f.seek(data_start + spec["offset"])
+                columns[name] = np.frombuffer(f.read(dtype.itemsize * spec["length"]), dtype=dtype)
+    return header, columns
+
+
+# --- EXPORTY ---
+# Kolik segmentů ExportSink nasbírá, než je předá exportérům jako jednu tabulku
+EXPORT_BATCH_SEGMENTS = 64
+
+
+class SegmentTable:
+    """Dávka segmentů s časy spočtenými jednou (NumPy, celé ms) pro všechny formáty.
+
+    Řetězce časů se tvoří líně a cachují, takže TXT, SRT i VTT sdílí stejný převod.
+    """
+
+    def __init__(self, segments: list):
+        self.segments = segments
+        ms = timestamps_ms([(s.start, s.end) for s in segments]).reshape(-1, 2)
+        self.start_ms = ms[:, 0]
+        self.end_ms = ms[:, 1]
+        self._formatted = {}
+
+    def __len__(self):
+        return len(self.segments)
+
+    def formatted(self, sep: str = ",") -> tuple[list[str], list[str]]:
+        """(začátky, konce) jako řetězce HH:MM:SS{sep}mmm."""
+        result = self._formatted.get(sep)
+        if result is None:
+            result = self._formatted[sep] = (
+                [format_ms(v, sep) for v in self.start_ms.tolist()],
+                [format_ms(v, sep) for v in self.end_ms.tolist()],
+            )
+        return result
+
+    def texts(self) -> list[str]:
+        texts = self._formatted.get("text")
+        if texts is None:
+            texts = self._formatted["text"] = [s.text.strip() for s in self.segments]
+        return texts
+
+
+class _FileExporter:
+    """Streamovaný export do jednoho souboru: `begin(info)`, `write_table(table)` pro každou dávku segmentů, `end()`.
+
+    Během přepisu se píše do `<název>.partial.<přípona>` a až `end()` ho přejmenuje
+    na výsledný soubor, takže neúspěšný běh nepřepíše dřívější hotový výstup.
+    """
+
+    ext = ""
+
+    def __init__(self, path: str, source: str, config):
+        self.path = path
+        root, ext = os.path.splitext(path)
+        self.partial_path = f"{root}.partial{ext}"
+        self.source = source
+        self.config = config
+        self.f = None
+
+    def begin(self, info):
+        self.f = open(self.partial_path, "w", encoding="utf-8")
+
+    def write(self, s):
+        self.write_table(SegmentTable([s]))
+
+    def write_table(self, table: SegmentTable):
+        for s in table.segments:
+            self.write(s)
+
+    def flush(self):
+        self.f.flush()
+
+    def end(self):
+        self.f.close()
+        os.replace(self.partial_path, self.path)
+
+    def abort(self, keep_partial: bool = False):
+        """Zavře rozpracovaný soubor; bez `keep_partial` ho smaže (hotový výstup zůstává beze změny)."""
+        if self.f is None or self.f.closed:
+            return
+        self.f.close()
+        if not keep_partial:
+            try:
+                os.remove(self.partial_path)
+            except OSError:
+                pass
+
+
+class TxtExporter(_FileExporter):
+    ext = "txt"
+
+    def write_table(self, table):
+        starts, _ = table.formatted()
+        self.f.write("".join(f"[{start}] {text}\n" for start, text in zip(starts, table.texts())))
+
+
+class SrtExporter(_FileExporter):
+    ext = "srt"
+
+    def begin(self, info):
+        super().begin(info)
+        self.index = 0
+
+    def write_table(self, table):
+        starts, ends = table.formatted()
+        first = self.index + 1
+        self.index += len(table)
+        self.f.write("".join(
+            f"{i}\n{start} --> {end}\n{text}\n\n"
+            for i, start, end, text in zip(range(first, self.index + 1), starts, ends, table.texts())
+        ))
+
+
+class VttExporter(_FileExporter):
+    ext = "vtt"
+
+    def begin(self, info):
+        super().begin(info)
+        self.f.write("WEBVTT\n\n")
+
+    def write_table(self, table):
+        starts, ends = table.formatted(".")
+        self.f.write("".join(f"{start} --> {end}\n{text}\n\n" for start, end, text in zip(starts, ends, table.texts())))
+
+
+def _json_segment(s, config) -> dict:
+    segment_data = {
+        "id": s.id,
+        "start": s.start,
+        "end": s.end,
+        "text": s.text.strip()
+    }
+
+    # Přidat word timestamps pokud jsou dostupné
+    if config.get("word_timestamps", False) and hasattr(s, 'words') and s.words:
+        segment_data["words"] = [
+            {
+                "word": w.word,
+                "start": w.start,
+                "end": w.end,
+                "probability": w.probability
+            } for w in s.words
+        ]
+    return segment_data
+
+
+def _json_header(source: str, info) -> dict:
+    header = {
+        "source": source,
+        "language": info.language,
+        "language_source": getattr(info, "language_source", None),
+        "duration": info.duration,
+    }
+    # Dvouprůchodový režim: které úseky přepsal velký model
+    if getattr(info, "refined_spans", None) is not None:
+        header["refined_spans"] = info.refined_spans
+    return header
+
+
+_json_string = json.encoder.encode_basestring  # = json.dumps(str, ensure_ascii=False)
+
+
+_INF = float("inf")
+
+
+def _json_number(value) -> str:
+    # float.__repr__ stejně jako json.dumps; NaN/Infinity a int přes json
+    if type(value) is float and -_INF < value < _INF:
+        return float.__repr__(value)
+    return json.dumps(value)
+
+
+def _json_segment_indented(s, config) -> str:
+    """Segment jako JSON s odsazením 4 (uvnitř "segments"), bez obecného Python encoderu pro indent."""
+    text = _json_string(s.text.strip())
+    out = (
+        f'    {{\n      "id": {_json_number(s.id)},\n      "start": {_json_number(s.start)},\n'
+        f'      "end": {_json_number(s.end)},\n      "text": {text}'
+    )
+    if config.get("word_timestamps", False) and getattr(s, "words", None):
+        words = ",\n".join(
+            f'        {{\n          "word": {_json_string(w.word)},\n          "start": {_json_number(w.start)},\n'
+            f'          "end": {_json_number(w.end)},\n          "probability": {_json_number(w.probability)}\n        }}'
+            for w in s.words
+        )
+        out += f',\n      "words": [\n{words}\n      ]'
+    return out + "\n    }"
+
+
+class JsonExporter(_FileExporter):
+    """JSON zapisovaný po segmentech; bajtově shodný s `json.dump(data, indent=2, ensure_ascii=False)`."""
+
+    ext = "json"
+
+    def begin(self, info):
+        super().begin(info)
+        self.f.write("{")
+        for key, value in _json_header(self.source, info).items():
+            value = json.dumps(value, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+            self.f.write(f"\n  {json.dumps(key)}: {value},")
+        self.f.write('\n  "segments": [')
+        self.first = True
+
+    def write_table(self, table):
+        items = ",\n".join(_json_segment_indented(s, self.config) for s in table.segments)
+        self.f.write(("\n" if self.first else ",\n") + items)
+        self.first = False
+
+    def end(self):
+        self.f.write("]\n}" if self.first else "\n  ]\n}")
+        super().end()
+
+
+class JsonlExporter(_FileExporter):
+    """JSON Lines: první řádek metadata, pak jeden segment na řádek."""
+
+    ext = "jsonl"
+
+    def begin(self, info):
+        super().begin(info)
+        self.f.write(json.dumps(_json_header(self.source, info), ensure_ascii=False) + "\n")
+
+    def write_table(self, table):
+        self.f.write("".join(json.dumps(_json_segment(s, self.config), ensure_ascii=False) + "\n" for s in table.segments))
+
+
+class ColumnsExporter(_FileExporter):
+    """Binární sloupcový sidecar (`SegmentStore`) pro analýzy; čte se přes `load_columns` nebo np.memmap."""
+
+    ext = "columns"
+
+    def begin(self, info):
+        self.header = {"source": self.source, **_info_to_dict(info)}
+        self.store = SegmentStore()
+
+    def write_table(self, table):
+        self.store.extend(table.segments)
+
+    def flush(self):
+        pass
+
+    def end(self):
+        self.store.save(self.path, self.header)
+        self.store = None
+
+    def abort(self, keep_partial: bool = False):
+        self.store = None
+
+
+EXPORTERS = {cls.ext: cls for cls in (TxtExporter, SrtExporter, VttExporter, JsonExporter, JsonlExporter, ColumnsExporter)}
+
+
+class ExportSink:
+    """Rozesílá segmenty všem exportérům (a dalším příjemcům, např. cache) průběžně.
+
+    Exportéři dostávají segmenty po dávkách `EXPORT_BATCH_SEGMENTS` jako jednu
+    `SegmentTable` (časy se převádí jednou pro všechny formáty); `flush()` a
+    `close()` předají i neúplnou dávku. V paměti se tak nedrží celý přepis;
+    `close()` vrací seznam uložených souborů.
+    """
+
+    def __init__(self, audio_path: str, config, extra=(), on_close=()):
+        output_dir = config.get("output_dir", "transcriptions")
+        base_name = os.path.splitext(os.path.basename(audio_path))[0]
+        formats = config.get("output_formats", ["txt"])
+        # Pořadí exportů podle EXPORTERS (txt, srt, vtt, json, jsonl)
+        self.exporters = [
+            cls(os.path.join(output_dir, f"{base_name}.{ext}"), audio_path, config)
+            for ext, cls in EXPORTERS.items() if ext in formats
+        ]
+        self.extra = list(extra)
+        self.on_close = list(on_close)
+        self.pending = []
+
+    def begin(self, info):
+        for target in self.exporters + self.extra:
+            target.begin(info)
+
+    def write(self, segment):
+        for target in self.extra:
+            target.write(segment)
+        self.pending.append(segment)
+        if len(self.pending) >= EXPORT_BATCH_SEGMENTS:
+            self._write_pending()
+
+    def _write_pending(self):
+        if self.pending:
+            table = SegmentTable(self.pending)
+            self.pending = []
+            for exporter in self.exporters:
+                exporter.write_table(table)
+
+    def flush(self):
+        self._write_pending()
+        for target in self.exporters + self.extra:
+            target.flush()
+
+    def close(self) -> list[str]:
+        self._write_pending()
+        for target in self.exporters + self.extra:
+            target.end()
+        for callback in self.on_close:
+            callback()
+        return [e.path for e in self.exporters]
+
+    def abort(self, keep_outputs: bool = False):
+        """Zavře rozpracované soubory; s `keep_outputs` zůstanou neúplné `.partial.*` (checkpoint), jinak se smažou.
+
+        Dřívější hotové výstupy se nemění v žádném případě.
+        """
+        if keep_outputs:
+            self._write_pending()
+        self.pending = []
+        for exporter in self.exporters:
+            exporter.abort(keep_outputs)
+        for target in self.extra:
+            if hasattr(target, "abort"):
+                target.abort()
+
+
+class ThreadedExportSink:
+    """`ExportSink` obsluhovaný writer vláknem přes omezenou frontu (backpressure na inferenci)."""
+
+    _STOP = object()
+
+    def __init__(self, sink: ExportSink, writer, maxsize: int = 256):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.future = writer.submit(self._drain)
+
+    def _drain(self) -> list[str]:
+        error = None
+        while True:
+            item = self.queue.get()
+            if item is self._STOP:
+                if error is not None:
+                    raise error
+                return self.sink.close()
+            method, arg = item
+            if method == "abort":
+                if error is None:
+                    self.sink.abort(arg)
+                return []
+            if error is not None:
+                continue  # frontu dál vyprazdňovat, ať se inference nezablokuje
+            try:
+                getattr(self.sink, method)(*([] if arg is None else [arg]))
+            except Exception as e:
+                error = e
+                self.sink.abort()
+
+    def begin(self, info):
+        self.queue.put(("begin", info))
+
+    def write(self, segment):
+        self.queue.put(("write", segment))
+
+    def flush(self):
+        self.queue.put(("flush", None))
+
+    def close(self):
+        self.queue.put(self._STOP)
+        return self.future
+
+    def abort(self, keep_outputs: bool = False):
+        self.queue.put(("abort", keep_outputs))
+
+
+def export_transcript(segments, info, audio_path: str, config) -> list[str]:
+    """Zapíše výstupy (TXT/SRT/VTT/JSON) z iterovatelných segmentů a vrátí seznam uložených cest."""
+    sink = ExportSink(audio_path, config)
+    sink.begin(info)
+    for s in segments:
+        sink.write(s)
+    return sink.close()
+
+
+def _open_sink(audio_path: str, config, writer, extra=(), on_close=()):
+    sink = ExportSink(audio_path, config, extra=extra, on_close=on_close)
+    return ThreadedExportSink(sink, writer) if writer is not None else sink
+
+
+def _close_sink(sink, writer):
+    """Dokončí exporty; s writerem vrací `Future`, jinak rovnou vypíše a vrátí cesty."""
+    result = sink.close()
+    if writer is None:
+        _print_saved(result)
+    return result
+
+
+def _print_saved(paths: list[str]):
+    for path in paths:
+        echo(f" - Uloženo: {path}")
+
+
+# --- SERIALIZACE SEGMENTŮ (cache, checkpointy) ---
+def _segment_to_dict(s) -> dict:
+    return {
+        "id": s.id,
+        "seek": s.seek,
+        "start": s.start,
+        "end": s.end,
+        "text": s.text,
+        "tokens": s.tokens,
+        "avg_logprob": s.avg_logprob,
+        "compression_ratio": s.compression_ratio,
+        "no_speech_prob": s.no_speech_prob,
+        "words": [
+            {"start": w.start, "end": w.end, "word": w.word, "probability": w.probability}
+            for w in s.words
+        ] if s.words else None,
+        "temperature": s.temperature,
+    }
+
+
+def _segment_from_dict(data: dict) -> Segment:
+    words = data.get("words")
+    return Segment(**{**data, "words": [Word(**w) for w in words] if words else None})
+
+
+def _info_to_dict(info) -> dict:
+    data = {
+        "language": info.language,
+        "language_probability": info.language_probability,
+        "language_source": getattr(info, "language_source", None),
+        "duration": info.duration,
+        "duration_after_vad": getattr(info, "duration_after_vad", info.duration),
+    }
+    if getattr(info, "refined_spans", None) is not None:
+        data["refined_spans"] = info.refined_spans
+    return data
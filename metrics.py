@@ -0,0 +1,189 @@
+"""
+📈 Metriky přepisu
+
+`FileMetrics` měří jeden soubor po fázích, zapisuje JSON řádek do `metrics_file`
+a obnovuje souhrny za celý proces v `metrics_prom_file` (Prometheus textfile).
+"""
+
+import os
+import sys
+import json
+import time
+import datetime
+import threading
+
+from colorama import Fore, Style
+
+from console import echo
+
+
+# --- METRIKY ---
+# Souhrny pro Prometheus textfile za celý běh procesu (server i dávka), klíč = cesta souboru
+_METRICS_LOCK = threading.Lock()
+_METRICS_TOTALS: dict[str, dict] = {}
+
+
+def peak_rss_mb() -> float | None:
+    """Špičková rezidentní paměť procesu v MB (None, kde to OS neumí, např. Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux vrací KB, macOS bajty
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class FileMetrics:
+    """Měření jednoho přepisu po fázích.
+
+    Na konci zapíše jeden JSON řádek do `metrics_file` a obnoví souhrny
+    v `metrics_prom_file` (formát Prometheus textfile collectoru).
+    """
+
+    def __init__(self, audio_path: str, config):
+        self.config = config
+        self.started = time.perf_counter()
+        self.inference_started = None
+        self.data = {
+            "file": audio_path,
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "status": "failed",
+            "model_size": config.get("model_size"),
+            "device": None,
+            "compute_type": None,
+            "batched": bool(config.get("use_batched_inference", False)),
+            "cache_hit": False,
+            "language_source": None,
+            "decode_s": 0.0,
+            "model_load_s": 0.0,
+            "model_cache_hit": None,
+            "ttfs_s": None,
+            "inference_s": None,
+            "total_s": None,
+            "audio_duration": None,
+            "duration_after_vad": None,
+            "vad_ratio": None,
+            "segments": 0,
+            "tokens": 0,
+            "segments_per_s": None,
+            "tokens_per_s": None,
+            "rtf": None,
+            "oom_retries": 0,
+            "speech_ratio": None,
+            "refined_s": None,
+            "dropped_segments": None,
+            "redecoded_s": None,
+            "peak_rss_mb": None,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.config.get("metrics_file") or self.config.get("metrics_prom_file"))
+
+    def add_time(self, stage: str, seconds: float):
+        self.data[f"{stage}_s"] += seconds
+
+    def start_inference(self):
+        self.inference_started = time.perf_counter()
+
+    def segment(self, segment):
+        if self.data["segments"] == 0 and self.inference_started is not None:
+            self.data["ttfs_s"] = time.perf_counter() - self.inference_started
+        self.data["segments"] += 1
+        self.data["tokens"] += len(segment.tokens or ())
+
+    def finish(self, status: str, info=None):
+        data = self.data
+        data["status"] = status
+        data["total_s"] = time.perf_counter() - self.started
+        if self.inference_started is not None:
+            data["inference_s"] = time.perf_counter() - self.inference_started
+            if data["inference_s"] > 0:
+                data["segments_per_s"] = data["segments"] / data["inference_s"]
+                data["tokens_per_s"] = data["tokens"] / data["inference_s"]
+        if info is not None:
+            data["audio_duration"] = info.duration
+            data["duration_after_vad"] = getattr(info, "duration_after_vad", info.duration)
+            if info.duration:
+                data["vad_ratio"] = data["duration_after_vad"] / info.duration
+            if data["total_s"] > 0:
+                # Stejně jako benchmark.py: vyšší = rychlejší
+                data["rtf"] = info.duration / data["total_s"]
+        data["peak_rss_mb"] = peak_rss_mb()
+
+        if not self.enabled:
+            return
+        try:
+            if self.config.get("metrics_file"):
+                _append_metrics_line(self.config["metrics_file"], data)
+            if self.config.get("metrics_prom_file"):
+                _update_prometheus(self.config["metrics_prom_file"], data)
+        except OSError as e:
+            echo(f"{Fore.YELLOW}[METRIKY]{Style.RESET_ALL} Nelze zapsat metriky: {e}", level="error")
+
+
+def _append_metrics_line(path: str, data: dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    line = json.dumps(data, ensure_ascii=False) + "\n"
+    with _METRICS_LOCK, open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def _update_prometheus(path: str, data: dict):
+    """Přičte soubor do souhrnů a atomicky přepíše textfile pro Prometheus."""
+    with _METRICS_LOCK:
+        totals = _METRICS_TOTALS.setdefault(os.path.abspath(path), {
+            "files": {},
+            "audio_seconds": 0.0,
+            "stage_seconds": {"decode": 0.0, "model_load": 0.0, "inference": 0.0},
+            "segments": 0,
+            "tokens": 0,
+            "model_loads": 0,
+        })
+        totals["files"][data["status"]] = totals["files"].get(data["status"], 0) + 1
+        totals["audio_seconds"] += data["audio_duration"] or 0.0
+        for stage in totals["stage_seconds"]:
+            totals["stage_seconds"][stage] += data[f"{stage}_s"] or 0.0
+        totals["segments"] += data["segments"]
+        totals["tokens"] += data["tokens"]
+        totals["model_loads"] += data["model_cache_hit"] is False
+
+        lines = [
+            "# HELP local_whisper_files_total Zpracované soubory podle výsledku.",
+            "# TYPE local_whisper_files_total counter",
+            *(f'local_whisper_files_total{{status="{s}"}} {n}' for s, n in sorted(totals["files"].items())),
+            "# HELP local_whisper_audio_seconds_total Délka zpracovaného audia.",
+            "# TYPE local_whisper_audio_seconds_total counter",
+            f"local_whisper_audio_seconds_total {totals['audio_seconds']:.3f}",
+            "# HELP local_whisper_stage_seconds_total Čas strávený ve fázích přepisu.",
+            "# TYPE local_whisper_stage_seconds_total counter",
+            *(f'local_whisper_stage_seconds_total{{stage="{s}"}} {v:.3f}' for s, v in totals["stage_seconds"].items()),
+            "# HELP local_whisper_segments_total Vygenerované segmenty.",
+            "# TYPE local_whisper_segments_total counter",
+            f"local_whisper_segments_total {totals['segments']}",
+            "# HELP local_whisper_tokens_total Vygenerované tokeny.",
+            "# TYPE local_whisper_tokens_total counter",
+            f"local_whisper_tokens_total {totals['tokens']}",
+            "# HELP local_whisper_model_loads_total Načtení modelu (mimo cache).",
+            "# TYPE local_whisper_model_loads_total counter",
+            f"local_whisper_model_loads_total {totals['model_loads']}",
+        ]
+        for name, key, help_text in (
+            ("last_rtf", "rtf", "RTF posledního souboru (vyšší = rychlejší)."),
+            ("last_ttfs_seconds", "ttfs_s", "Čas do prvního segmentu u posledního souboru."),
+            ("last_vad_ratio", "vad_ratio", "Podíl audia po VAD u posledního souboru."),
+            ("peak_rss_megabytes", "peak_rss_mb", "Špičková rezidentní paměť procesu."),
+        ):
+            if data[key] is not None:
+                lines += [
+                    f"# HELP local_whisper_{name} {help_text}",
+                    f"# TYPE local_whisper_{name} gauge",
+                    f"local_whisper_{name} {data[key]:.6g}",
+                ]
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
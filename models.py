@@ -0,0 +1,240 @@
+"""
+📦 Model Registry
+
+Správa modelů ve sdíleném registru (`model_dir` v configu, výchozí `models/` vedle
+transcribe.py), aby start nezávisel na pracovní složce a nečekal na Hugging Face.
+
+Použití:
+  uv run models.py list
+  uv run models.py fetch large-v3 medium
+  uv run models.py convert large-v3 --compute-type int8
+  uv run models.py load large-v3 --device cpu --compute-type int8 --repeat 3
+
+Registr:
+  <model_dir>/<název>/                 stažený CTranslate2 model (fetch)
+  <model_dir>/<název>-<compute_type>/  váhy předkonvertované na compute_type (convert)
+  <model_dir>/registry.json            seznam variant (zdroj, velikost, čas)
+
+transcribe.py, server.py i stream.py berou nejdřív předkonvertovanou variantu pro
+svůj compute_type, pak staženou; obě načítají bez dotazu na hub.
+Konverze potřebuje `transformers` (a `torch`): uv pip install transformers
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import datetime
+import argparse
+import statistics
+
+from colorama import Fore, Style
+
+from faster_whisper import WhisperModel
+from faster_whisper.utils import _MODELS, download_model
+
+from transcribe import (
+    DEFAULT_CONFIG_FILE,
+    MODEL_REGISTRY_FILE,
+    load_config,
+    model_root,
+    resolve_device,
+    resolve_model,
+)
+
+# Původní (netransformované) modely pro konverzi s jinou kvantizací
+SOURCE_MODELS = {
+    "tiny": "openai/whisper-tiny",
+    "tiny.en": "openai/whisper-tiny.en",
+    "base": "openai/whisper-base",
+    "base.en": "openai/whisper-base.en",
+    "small": "openai/whisper-small",
+    "small.en": "openai/whisper-small.en",
+    "medium": "openai/whisper-medium",
+    "medium.en": "openai/whisper-medium.en",
+    "large-v1": "openai/whisper-large",
+    "large-v2": "openai/whisper-large-v2",
+    "large-v3": "openai/whisper-large-v3",
+    "large": "openai/whisper-large-v3",
+    "large-v3-turbo": "openai/whisper-large-v3-turbo",
+    "turbo": "openai/whisper-large-v3-turbo",
+    "distil-large-v3": "distil-whisper/distil-large-v3",
+}
+
+# Soubory, které faster-whisper potřebuje vedle model.bin
+CONVERT_COPY_FILES = ["tokenizer.json", "preprocessor_config.json"]
+
+
+def dir_size_mb(path: str) -> float:
+    total = 0
+    for folder, _, names in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(folder, name)) for name in names)
+    return total / (1024 * 1024)
+
+
+class Registry:
+    """Index variant modelů v `registry.json` složky registru."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.path = os.path.join(root, MODEL_REGISTRY_FILE)
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def add(self, variant: str, **data):
+        self.entries[variant] = {
+            **data,
+            "path": os.path.join(self.root, variant),
+            "size_mb": round(dir_size_mb(os.path.join(self.root, variant)), 1),
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def cmd_list(config, registry: Registry, args) -> bool:
+    print(f"{Fore.CYAN}[REGISTR]{Style.RESET_ALL} {registry.root}")
+    variants = sorted(
+        name for name in (os.listdir(registry.root) if os.path.isdir(registry.root) else [])
+        if os.path.isfile(os.path.join(registry.root, name, "model.bin"))
+    )
+    if not variants:
+        print("  (prázdný – uv run models.py fetch <model>)")
+    for variant in variants:
+        entry = registry.entries.get(variant, {})
+        size = entry.get("size_mb") or round(dir_size_mb(os.path.join(registry.root, variant)), 1)
+        if not entry:
+            kind = "bez záznamu"
+        else:
+            kind = f"konverze {entry['compute_type']}" if entry.get("compute_type") else "stažený"
+        print(f"  {variant:<28} {size:>8.1f} MB  {kind}  {entry.get('source', '')}")
+    return True
+
+
+def cmd_fetch(config, registry: Registry, args) -> bool:
+    ok = True
+    for name in args.models:
+        target = os.path.join(registry.root, name)
+        print(f"{Fore.CYAN}[FETCH]{Style.RESET_ALL} {name} → {target}")
+        start = time.perf_counter()
+        try:
+            download_model(name, output_dir=target, revision=args.revision)
+        except Exception as e:
+            print(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} Stažení '{name}' selhalo: {e}")
+            ok = False
+            continue
+        registry.add(name, source=_MODELS.get(name, name), revision=args.revision)
+        print(f"{Fore.GREEN}[HOTOVO]{Style.RESET_ALL} {name} za {time.perf_counter() - start:.1f}s")
+    return ok
+
+
+def cmd_convert(config, registry: Registry, args) -> bool:
+    try:
+        from ctranslate2.converters import TransformersConverter
+        import transformers  # noqa: F401 – konvertor ho importuje až při convert()
+    except ImportError as e:
+        print(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} Konverze potřebuje ctranslate2 s transformers: {e}")
+        print(f"{Fore.YELLOW}[TIP]{Style.RESET_ALL} uv pip install transformers torch")
+        return False
+
+    compute_type = args.compute_type or resolve_device(config)[1]
+    ok = True
+    for name in args.models:
+        source = args.source or SOURCE_MODELS.get(name)
+        if not source:
+            print(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} Neznám původní model pro '{name}', zadejte --source <HF repo>")
+            ok = False
+            continue
+
+        variant = f"{name}-{compute_type}"
+        target = os.path.join(registry.root, variant)
+        print(f"{Fore.CYAN}[CONVERT]{Style.RESET_ALL} {source} → {target} (quantization={compute_type})")
+        start = time.perf_counter()
+        tmp_target = target + ".tmp"
+        shutil.rmtree(tmp_target, ignore_errors=True)
+        try:
+            TransformersConverter(source, copy_files=CONVERT_COPY_FILES, load_as_float16=True).convert(
+                tmp_target, quantization=compute_type, force=True
+            )
+        except Exception as e:
+            shutil.rmtree(tmp_target, ignore_errors=True)
+            print(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} Konverze '{name}' selhala: {e}")
+            ok = False
+            continue
+        # Rozpracovaná konverze se nesmí tvářit jako hotová varianta
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(tmp_target, target)
+        registry.add(variant, source=source, compute_type=compute_type)
+        print(f"{Fore.GREEN}[HOTOVO]{Style.RESET_ALL} {variant} za {time.perf_counter() - start:.1f}s")
+    return ok
+
+
+def cmd_load(config, registry: Registry, args) -> bool:
+    """Změří studené načtení modelu tak, jak ho provede transcribe.py."""
+    device, compute_type = resolve_device(config)
+    compute_type = args.compute_type or compute_type
+    ok = True
+    for name in args.models:
+        model_args = resolve_model({**config, "model_size": name}, compute_type)
+        source = model_args.pop("source")
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            try:
+                model = WhisperModel(device=device, compute_type=compute_type, **model_args)
+            except Exception as e:
+                print(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} Načtení '{name}' selhalo: {e}")
+                ok = False
+                break
+            times.append(time.perf_counter() - start)
+            del model
+        if times:
+            print(
+                f"{Fore.GREEN}[LOAD]{Style.RESET_ALL} {name} ({device}, {compute_type}, zdroj: {source}): "
+                f"první {times[0]:.2f}s, medián {statistics.median(times):.2f}s, min {min(times):.2f}s"
+            )
+    return ok
+
+
+COMMANDS = {"list": cmd_list, "fetch": cmd_fetch, "convert": cmd_convert, "load": cmd_load}
+
+
+def parse_args(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        prog="local-whisper-models",
+        description="Registr modelů: stažení, předkonverze na compute_type a měření doby načtení.",
+    )
+    parser.add_argument("command", choices=list(COMMANDS), help="list | fetch | convert | load")
+    parser.add_argument("models", nargs="*", help="Názvy modelů (default: model_size z configu)")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_FILE, help=f"Konfigurace (default: {DEFAULT_CONFIG_FILE})")
+    parser.add_argument("--model-dir", dest="model_dir", help="Složka registru (přebije model_dir z configu)")
+    parser.add_argument("--compute-type", dest="compute_type", help="Cílový compute_type (int8, int8_float16, float16, ...)")
+    parser.add_argument("--device", choices=["auto", "cuda", "cpu"], help="Zařízení pro load (default: z configu)")
+    parser.add_argument("--source", help="Hugging Face repo původního modelu pro convert (např. openai/whisper-large-v3)")
+    parser.add_argument("--revision", help="Revize modelu pro fetch")
+    parser.add_argument("--repeat", type=int, default=1, help="Kolikrát načíst model při load (default: 1)")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    config = load_config(args.config)
+    if args.model_dir:
+        config["model_dir"] = args.model_dir
+    if args.device:
+        config["device"] = args.device
+    if not args.models and args.command != "list":
+        args.models = [config["model_size"]]
+
+    registry = Registry(model_root(config))
+    sys.exit(0 if COMMANDS[args.command](config, registry, args) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+🛰️ Transcription Server
+
+Dlouhoběžící režim: modely zůstávají načtené (klíč model_size, device, compute_type)
+a úlohy přicházejí přes lokální HTTP nebo Unix socket.
+
+Použití:
+  uv run server.py [--config config.json] [--port 8765 | --socket /tmp/local-whisper.sock] [--workers 2]
+
+Klient (stejné přepínače jako transcribe.py):
+  uv run transcribe.py --remote http://127.0.0.1:8765 audio.mp3
+  uv run transcribe.py --remote unix:/tmp/local-whisper.sock --model medium audio.mp3
+
+API:
+  POST /jobs       {"files": [...], "config": "...", "overrides": {...}, "cwd": "...", "wait": false}
+  GET  /jobs/<id>  stav jedné úlohy
+  GET  /health     stav serveru (načtené modely, fronta)
+"""
+
+import os
+import sys
+import time
+import json
+import queue
+import socket
+import argparse
+import threading
+import socketserver
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from uuid import uuid4
+
+from colorama import Fore, Style
+
+from budget import RESOURCE_BUDGET
+from transcribe import (
+    DEFAULT_CONFIG_FILE,
+    DEFAULT_SERVER_PORT,
+    get_model,
+    load_config,
+    resolve_device,
+    transcribe_file,
+)
+
+# Kolik dokončených úloh si server pamatuje pro GET /jobs/<id>
+MAX_FINISHED_JOBS = 1000
+
+
+class JobQueue:
+    """Fronta úloh obsluhovaná pevným počtem worker vláken se sdílenou cache modelů."""
+
+    def __init__(self, config_file: str, workers: int):
+        self.config_file = os.path.abspath(config_file)
+        self.workers = workers
+        self.model_cache = {}
+        self.jobs: OrderedDict[str, dict] = OrderedDict()
+        self.queue: queue.Queue[str] = queue.Queue()
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        # Rozpočet prostředků platí pro celý server (overrides úloh ho nemění)
+        RESOURCE_BUDGET.configure(load_config(self.config_file))
+
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"worker-{i}", daemon=True).start()
+
+    def job_config(self, config_file: str | None, overrides: dict, cwd: str) -> dict:
+        config = load_config(config_file or self.config_file)
+        config.update(overrides or {})
+        # Souběžná volání transcribe() nad sdíleným modelem potřebují víc CTranslate2 workerů
+        config.setdefault("num_workers", self.workers)
+        output_dir = config.get("output_dir", "transcriptions")
+        if not os.path.isabs(output_dir):
+            config["output_dir"] = os.path.join(cwd, output_dir)
+        return config
+
+    def preload(self):
+        """Načte výchozí model hned při startu, aby první úloha nečekala."""
+        config = self.job_config(None, {}, os.getcwd())
+        device, compute_type = resolve_device(config)
+        get_model(config, device, compute_type, self.model_cache)
+
+    def submit(self, files: list[str], config_file: str | None, overrides: dict, cwd: str) -> list[str]:
+        config = self.job_config(config_file, overrides, cwd)
+        ids = []
+        with self.lock:
+            for path in files:
+                job_id = uuid4().hex[:12]
+                self.jobs[job_id] = {
+                    "id": job_id,
+                    "file": path if os.path.isabs(path) else os.path.join(cwd, path),
+                    "status": "queued",
+                    "submitted": time.time(),
+                    "config": config,
+                }
+                ids.append(job_id)
+            self._trim()
+        for job_id in ids:
+            self.queue.put(job_id)
+        return ids
+
+    def get(self, job_id: str) -> dict | None:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return _public(job) if job else None
+
+    def wait(self, ids: list[str], timeout: float | None = None) -> list[dict]:
+        deadline = None if timeout is None else time.time() + timeout
+        with self.changed:
+            while any(self.jobs[i]["status"] in ("queued", "running") for i in ids if i in self.jobs):
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.changed.wait(remaining)
+            return [_public(self.jobs[i]) for i in ids if i in self.jobs]
+
+    def stats(self) -> dict:
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {
+            "status": "ok",
+            "workers": self.workers,
+            "queue": self.queue.qsize(),
+            "jobs": counts,
+            "models": [list(key) for key in self.model_cache],
+            "budget": RESOURCE_BUDGET.usage() if RESOURCE_BUDGET.enabled else None,
+        }
+
+    def _trim(self):
+        finished = [i for i, j in self.jobs.items() if j["status"] in ("done", "failed")]
+        for job_id in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def _update(self, job_id: str, **fields):
+        with self.changed:
+            self.jobs[job_id].update(fields)
+            self.changed.notify_all()
+
+    def _worker(self):
+        while True:
+            job_id = self.queue.get()
+            with self.lock:
+                job = self.jobs.get(job_id)
+            if job is None:
+                continue
+
+            self._update(job_id, status="running", started=time.time())
+            start = time.time()
+            stats = {}
+            try:
+                outputs = transcribe_file(job["file"], config=job["config"], model_cache=self.model_cache, stats=stats)
+            except Exception as e:  # transcribe_file chyby loguje sám, tohle je pojistka
+                outputs, error = None, str(e)
+            else:
+                error = None if outputs is not None else "Přepis selhal (viz log serveru)"
+
+            self._update(
+                job_id,
+                status="done" if outputs is not None else "failed",
+                outputs=outputs or [],
+                error=error,
+                elapsed=time.time() - start,
+                speech_ratio=stats.get("speech_ratio") if stats.get("status") == "silent" else None,
+            )
+            print()  # Prázdný řádek mezi soubory
+
+
+def _public(job: dict) -> dict:
+    return {k: v for k, v in job.items() if k != "config"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "local-whisper"
+    jobs: JobQueue
+
+    def address_string(self):
+        # Unix socket nemá (host, port)
+        return self.client_address[0] if isinstance(self.client_address, tuple) and self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        print(f"{Fore.CYAN}[HTTP]{Style.RESET_ALL} {self.address_string()} {format % args}")
+
+    def _send(self, status: int, data: dict):
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, self.jobs.stats())
+        elif self.path.startswith("/jobs/"):
+            job = self.jobs.get(self.path[len("/jobs/"):])
+            if job:
+                self._send(200, job)
+            else:
+                self._send(404, {"error": "Neznámá úloha"})
+        else:
+            self._send(404, {"error": "Neznámá cesta"})
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self._send(404, {"error": "Neznámá cesta"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            files = body["files"]
+            if not isinstance(files, list) or not files:
+                raise ValueError("'files' musí být neprázdný seznam")
+        except (KeyError, ValueError) as e:
+            self._send(400, {"error": f"Neplatný požadavek: {e}"})
+            return
+
+        try:
+            ids = self.jobs.submit(files, body.get("config"), body.get("overrides") or {}, body.get("cwd") or os.getcwd())
+        except Exception as e:
+            self._send(400, {"error": str(e)})
+            return
+
+        if body.get("wait"):
+            self._send(200, {"jobs": self.jobs.wait(ids, body.get("timeout"))})
+        else:
+            self._send(202, {"jobs": [self.jobs.get(i) for i in ids]})
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # Uklidit socket po předchozím (spadlém) běhu
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+
+
+def parse_args(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        prog="local-whisper-server",
+        description="Dlouhoběžící přepisový server s načtenými modely.",
+    )
+    parser.add_argument("--config", default=DEFAULT_CONFIG_FILE, help=f"Výchozí konfigurace (default: {DEFAULT_CONFIG_FILE}).")
+    parser.add_argument("--host", default="127.0.0.1", help="Adresa HTTP serveru (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_SERVER_PORT, help=f"Port HTTP serveru (default: {DEFAULT_SERVER_PORT})")
+    parser.add_argument("--socket", dest="socket_path", help="Naslouchat na Unix socketu místo TCP")
+    parser.add_argument("--workers", type=int, default=1, help="Počet souběžných přepisů (default: 1)")
+    parser.add_argument("--no-preload", dest="preload", action="store_false", help="Nenačítat model při startu")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    jobs = JobQueue(args.config, max(1, args.workers))
+    handler = type("Handler", (_Handler,), {"jobs": jobs})
+
+    if args.preload:
+        jobs.preload()
+
+    if args.socket_path:
+        if not hasattr(socket, "AF_UNIX"):
+            print(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} Unix sockety nejsou na tomto systému podporované, použijte --port.")
+            sys.exit(1)
+        server = UnixHTTPServer(args.socket_path, handler)
+        address = f"unix:{args.socket_path}"
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), handler)
+        address = f"http://{args.host}:{args.port}"
+
+    print(f"{Fore.GREEN}[SERVER]{Style.RESET_ALL} Naslouchám na {address} ({jobs.workers} worker(ů))")
+    print(f"Klient: uv run transcribe.py --remote {address} <soubor>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{Fore.YELLOW}[SERVER]{Style.RESET_ALL} Ukončuji...")
+    finally:
+        server.server_close()
+        if args.socket_path and os.path.exists(args.socket_path):
+            os.remove(args.socket_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+🧩 Více zařízení (sloty)
+
+`devices` rozdělí dávku mezi sloty (GPU nebo skupiny CPU jader); každý slot je
+proces s vlastním teplým modelem a soubory dostává od nejdelšího.
+"""
+
+import os
+import re
+import time
+import wave
+import subprocess
+import multiprocessing
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from colorama import Fore, Style
+
+from audio import _get_ffmpeg_exe
+from budget import RESOURCE_BUDGET
+from console import echo, set_console_mode
+from metrics import _update_prometheus
+
+
+# --- VÍCE ZAŘÍZENÍ (SLOTY) ---
+# Ve slot procesu: efektivní config a cache s teplým modelem
+_SLOT_CONFIG = None
+_SLOT_MODEL_CACHE: dict = {}
+
+
+def _parse_ranges(text: str) -> list[int]:
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    values = []
+    for part in filter(None, text.split(",")):
+        first, _, last = part.partition("-")
+        values.extend(range(int(first), int(last or first) + 1))
+    return values
+
+
+def parse_device_slots(spec) -> list[dict]:
+    """Rozloží `devices` na sloty.
+
+    - `"cuda"` = všechny viditelné GPU, `"cuda:0,1"` = vybrané indexy (slot na GPU),
+    - `"cpu:4"` = dostupná jádra rozdělená na 4 souvislé skupiny,
+    - `"cpu:0-7"` = jeden slot na zadaných jádrech (víc skupin: seznam nebo `"cpu:0-7;cpu:8-15"`).
+    """
+    entries = spec if isinstance(spec, list) else str(spec).split(";")
+    slots = []
+    for entry in entries:
+        kind, _, arg = str(entry).strip().partition(":")
+        if kind == "cuda":
+            if arg:
+                indices = _parse_ranges(arg)
+            else:
+                import ctranslate2
+                indices = range(ctranslate2.get_cuda_device_count())
+            slots.extend({"name": f"cuda:{i}", "device": "cuda", "device_index": i, "cores": None} for i in indices)
+        elif kind == "cpu":
+            available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+            if arg.isdigit():
+                count = max(1, min(int(arg), len(available)))
+                groups = [[int(c) for c in g] for g in np.array_split(available, count)]
+            else:
+                groups = [_parse_ranges(arg) if arg else available]
+            slots.extend({"name": f"cpu:{g[0]}-{g[-1]}", "device": "cpu", "device_index": 0, "cores": g} for g in groups)
+        else:
+            raise ValueError(f"Neznámé zařízení v 'devices': {entry!r} (čekám cuda[:indexy] nebo cpu:N / cpu:jádra)")
+    return slots
+
+
+def _slot_config(config, slot: dict) -> dict:
+    slot_config = dict(config, devices=None, device=slot["device"], device_index=slot["device_index"])
+    # Uvnitř slotu se dál nedělí (žádné vnořené procesy pro úseky)
+    slot_config["chunk_workers"] = 0
+    if slot["cores"] is not None:
+        slot_config["cpu_threads"] = len(slot["cores"])
+        if config.get("device", "auto") != "cpu":
+            slot_config["compute_type"] = "int8"
+    # Prometheus souhrny za celou dávku počítá hlavní proces z metrik, které sloty vrací
+    slot_config["metrics_prom_file"] = None
+    # Rozpočty platí pro celý běh, každý slot (proces) dostane svůj díl
+    for key in ("max_threads", "max_concurrent_decodes", "max_rss_mb"):
+        if config.get(key):
+            slot_config[key] = max(1, config[key] // slot["count"])
+    return slot_config
+
+
+def _slot_worker_init(slot_config: dict, cores):
+    global _SLOT_CONFIG
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    _SLOT_CONFIG = slot_config
+    set_console_mode(slot_config)
+    RESOURCE_BUDGET.configure(slot_config)
+    # Teplý model hned při startu slotu, první soubor už na načtení nečeká
+    # (transcribe se importuje až v procesu slotu, hlavní proces ho importuje sám)
+    import transcribe
+    device, compute_type = transcribe.resolve_device(slot_config)
+    transcribe.get_runtime(slot_config, device, compute_type, _SLOT_MODEL_CACHE)
+
+
+def _slot_worker_transcribe(audio_path: str):
+    import transcribe
+    stats = {}
+    outputs = transcribe.transcribe_file(audio_path, config=_SLOT_CONFIG, model_cache=_SLOT_MODEL_CACHE, stats=stats)
+    # Metriky souboru (stav silent pro manifest) a využití rozpočtu jdou do hlavního procesu
+    return outputs, stats, RESOURCE_BUDGET.usage()
+
+
+def estimate_duration(audio_path: str) -> float:
+    """Odhad délky vstupu v sekundách bez dekódování (WAV hlavička, jinak ffmpeg, jinak velikost)."""
+    try:
+        if audio_path.lower().endswith(".wav"):
+            with wave.open(audio_path, "rb") as f:
+                return f.getnframes() / float(f.getframerate())
+        ffmpeg_exe = _get_ffmpeg_exe()
+        if ffmpeg_exe:
+            probe = subprocess.run([ffmpeg_exe, "-hide_banner", "-i", audio_path], capture_output=True, text=True, errors="replace")
+            match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", probe.stderr)
+            if match:
+                h, m, s = match.groups()
+                return int(h) * 3600 + int(m) * 60 + float(s)
+    except Exception:
+        pass
+    try:
+        return os.path.getsize(audio_path) / 16000  # ~128 kbit/s
+    except OSError:
+        return 0.0
+
+
+def transcribe_on_slots(files: list[str], config, on_result=None, on_start=None):
+    """Rozdělí soubory mezi sloty zařízení (`devices`), každý slot je proces s vlastním teplým modelem.
+
+    Soubory se řadí od nejdelšího; uvolněný slot (nejméně vytížený) dostane
+    vždy nejdelší zbývající soubor, takže dlouhé nahrávky neskončí na konci
+    dávky na jednom zařízení.
+    """
+    slots = parse_device_slots(config["devices"])
+    on_result = on_result or (lambda audio_file, outputs, stats: None)
+    on_start = on_start or (lambda audio_file: None)
+    start = time.time()
+
+    with ThreadPoolExecutor(max_workers=8) as probe:
+        durations = dict(zip(files, probe.map(estimate_duration, files)))
+    pending = deque(sorted(files, key=lambda f: durations[f], reverse=True))
+
+    echo(
+        f"{Fore.CYAN}[SLOTY]{Style.RESET_ALL} {len(files)} souborů ({sum(durations.values()) / 60:.1f} min) "
+        f"na {len(slots)} slotech: {', '.join(s['name'] for s in slots)}"
+    )
+    context = multiprocessing.get_context("spawn")
+    pools = [
+        ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=context,
+            initializer=_slot_worker_init,
+            initargs=(_slot_config(config, dict(slot, count=len(slots))), slot["cores"]),
+        )
+        for slot in slots
+    ]
+    busy = {}  # future -> (slot, soubor)
+    done_s = [0.0] * len(slots)
+    done_files = [0] * len(slots)
+
+    def dispatch(slot: int):
+        if pending:
+            audio_file = pending.popleft()
+            on_start(audio_file)
+            busy[pools[slot].submit(_slot_worker_transcribe, audio_file)] = (slot, audio_file)
+
+    try:
+        for slot in range(len(slots)):
+            dispatch(slot)
+        while busy:
+            finished, _ = wait(list(busy), return_when=FIRST_COMPLETED)
+            for future in finished:
+                slot, audio_file = busy.pop(future)
+                try:
+                    outputs, stats, usage = future.result()
+                    RESOURCE_BUDGET.slots[slots[slot]["name"]] = usage
+                    if config.get("metrics_prom_file"):
+                        try:
+                            _update_prometheus(config["metrics_prom_file"], stats)
+                        except OSError as e:
+                            echo(f"{Fore.YELLOW}[METRIKY]{Style.RESET_ALL} Nelze zapsat metriky: {e}", level="error")
+                except BrokenProcessPool as e:
+                    echo(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} Slot {slots[slot]['name']} spadl ({e}), další soubory dostanou ostatní sloty.", level="error")
+                    outputs, stats = None, None
+                    pools[slot] = None
+                except Exception as e:
+                    echo(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} '{os.path.basename(audio_file)}' ve slotu {slots[slot]['name']}: {e}", level="error")
+                    outputs, stats = None, None
+                on_result(audio_file, outputs, stats)
+                done_s[slot] += durations[audio_file]
+                done_files[slot] += 1
+                if pools[slot] is not None:
+                    dispatch(slot)
+                elif not any(pools):
+                    # Žádný živý slot: zbytek označit jako neúspěšný
+                    if pending:
+                        echo(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} Žádný slot neběží, {len(pending)} souborů zůstává nepřepsaných.", level="error")
+                    while pending:
+                        on_result(pending.popleft(), None, None)
+    finally:
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    echo(f"{Fore.GREEN}[HOTOVO]{Style.RESET_ALL} Sloty za {time.time() - start:.1f}s:", level="result")
+    for slot, name in enumerate(s["name"] for s in slots):
+        echo(f" - {name}: {done_files[slot]} souborů, {done_s[slot] / 60:.1f} min audia", level="result")
@@ -0,0 +1,326 @@
+"""
+🎙️ Streaming Transcription
+
+Živý přepis z proudu raw PCM (16 kHz, mono, s16le) ze stdin, pojmenované roury nebo socketu.
+Na stdout jde JSON řádek na událost:
+  {"type": "partial", "start": 12.0, "end": 14.2, "text": "...", "delay_s": 0.41}
+  {"type": "final", "start": 12.0, "end": 15.1, "text": "...", "delay_s": 0.63}
+Logy jdou na stderr.
+
+Použití:
+  ffmpeg -loglevel error -re -i schuzka.wav -f s16le -ac 1 -ar 16000 - | uv run stream.py
+  ffmpeg -f dshow -i audio="Mikrofon" -f s16le -ac 1 -ar 16000 - | uv run stream.py --latency 0.5
+  uv run stream.py --input /tmp/audio.fifo --output titulky.jsonl
+  uv run stream.py --input tcp:127.0.0.1:9000      (čeká na jedno připojení)
+  uv run stream.py --input unix:/tmp/audio.sock
+
+Úsek, který VAD ukončí dostatečně dlouhým tichem (nebo který přeroste okno), se přepíše
+naposledy jako "final" a z bufferu se zahodí – potvrzené audio se znovu nedekóduje.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+
+import numpy as np
+from colorama import Fore, Style
+
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+from audio import PCM_SAMPLE_RATE
+from transcribe import (
+    DEFAULT_CONFIG_FILE,
+    build_transcribe_params,
+    get_runtime,
+    load_config,
+    resolve_device,
+)
+
+# Kolik bajtů číst najednou (0,1 s audia)
+READ_CHUNK_BYTES = PCM_SAMPLE_RATE // 10 * 2
+
+STREAM_DEFAULTS = {
+    "stream_latency_s": 1.0,
+    "stream_endpoint_silence_ms": 600,
+    "stream_max_window_s": 20.0,
+    "stream_min_window_s": 0.5,
+}
+
+
+class PCMReader:
+    """Čte s16le PCM z binárního proudu ve vlákně a skládá float32 vzorky do fronty."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.chunks: list[np.ndarray] = []
+        self.received = 0
+        self.last_arrival = time.monotonic()
+        self.eof = False
+        self.error = None
+        self.changed = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="pcm-reader", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        # Nebufferovaný proud: read() vrací, co je k dispozici, a vlákno neblokuje zámek
+        # BufferedReaderu při ukončení interpreteru
+        read = getattr(self.stream, "raw", self.stream).read
+        leftover = b""
+        try:
+            while True:
+                data = read(READ_CHUNK_BYTES)
+                if not data:
+                    break
+                data = leftover + data
+                usable = len(data) - len(data) % 2
+                leftover = data[usable:]
+                if not usable:
+                    continue
+                samples = np.frombuffer(data[:usable], dtype=np.int16).astype(np.float32) / 32768.0
+                with self.changed:
+                    self.chunks.append(samples)
+                    self.received += samples.shape[0]
+                    self.last_arrival = time.monotonic()
+                    self.changed.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.changed:
+                self.eof = True
+                self.changed.notify_all()
+
+    def take(self, min_samples: int, timeout: float) -> tuple[np.ndarray, float, bool]:
+        """Počká na aspoň `min_samples` nových vzorků (nebo konec proudu) a vrátí je."""
+        deadline = time.monotonic() + timeout
+        with self.changed:
+            while sum(c.shape[0] for c in self.chunks) < min_samples and not self.eof:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.changed.wait(remaining)
+            chunks, self.chunks = self.chunks, []
+            samples = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+            return samples, self.last_arrival, self.eof
+
+
+class StreamTranscriber:
+    """Klouzavé okno nad nepotvrzeným audiem s VAD endpointingem."""
+
+    def __init__(self, runtime, config, emit):
+        self.model = runtime.model
+        self.emit = emit
+        self.latency = float(config["stream_latency_s"])
+        self.endpoint_silence = int(config["stream_endpoint_silence_ms"] * PCM_SAMPLE_RATE / 1000)
+        self.max_window = int(config["stream_max_window_s"] * PCM_SAMPLE_RATE)
+        self.min_window = int(config["stream_min_window_s"] * PCM_SAMPLE_RATE)
+        self.word_timestamps = config.get("word_timestamps", False)
+
+        vad_parameters = config.get("vad_parameters") or {"min_silence_duration_ms": config.get("min_silence_duration_ms", 500)}
+        self.vad_options = vad_parameters if isinstance(vad_parameters, VadOptions) else VadOptions(**vad_parameters)
+
+        # VAD děláme sami nad oknem; kontext předchozího textu předáváme přes initial_prompt
+        params = build_transcribe_params(config, None, use_batched=False)
+        params.update(vad_filter=False, log_progress=False, condition_on_previous_text=False)
+        params.pop("audio", None)
+        params.pop("vad_parameters", None)
+        params.pop("clip_timestamps", None)
+        self.params = params
+        self.base_prompt = params.pop("initial_prompt", None)
+        self.language = params.pop("language", None)
+
+        self.audio = np.zeros(0, dtype=np.float32)
+        self.offset = 0  # absolutní pozice audio[0] ve vzorcích
+        self.prompt = ""
+        self.last_partial = None
+        self.finals = 0
+
+    def _transcribe(self, audio: np.ndarray) -> list:
+        prompt = " ".join(p for p in (self.base_prompt, self.prompt) if p) or None
+        segments, info = self.model.transcribe(audio=audio, language=self.language, initial_prompt=prompt, **self.params)
+        segments = list(segments)
+        if self.language is None and segments:
+            # Jazyk se zamkne podle prvního úseku s řečí
+            self.language = info.language
+            print(f"{Fore.MAGENTA}[INFO]{Style.RESET_ALL} Jazyk: {info.language.upper()} ({info.language_probability:.0%})")
+        return segments
+
+    def _event(self, kind: str, start: int, end: int, text: str, arrival: float, words=None):
+        event = {
+            "type": kind,
+            "start": round((self.offset + start) / PCM_SAMPLE_RATE, 3),
+            "end": round((self.offset + end) / PCM_SAMPLE_RATE, 3),
+            "text": text,
+            "delay_s": round(time.monotonic() - arrival, 3),
+        }
+        if words is not None:
+            event["words"] = words
+        self.emit(event)
+
+    def _commit(self, cut: int, segments: list, arrival: float):
+        """Vydá finální segmenty pro audio[:cut] a zahodí ho z bufferu."""
+        base = self.offset / PCM_SAMPLE_RATE
+        for segment in segments:
+            text = segment.text.strip()
+            if not text:
+                continue
+            words = None
+            if self.word_timestamps and segment.words:
+                words = [
+                    {"start": round(base + w.start, 3), "end": round(base + w.end, 3), "word": w.word, "probability": w.probability}
+                    for w in segment.words
+                ]
+            self._event(
+                "final",
+                int(segment.start * PCM_SAMPLE_RATE),
+                min(cut, int(segment.end * PCM_SAMPLE_RATE)),
+                text,
+                arrival,
+                words,
+            )
+            self.finals += 1
+            self.prompt = (self.prompt + " " + text)[-200:]
+        self.audio = self.audio[cut:]
+        self.offset += cut
+        self.last_partial = None
+
+    def feed(self, samples: np.ndarray):
+        if samples.shape[0]:
+            self.audio = np.concatenate([self.audio, samples])
+
+    def step(self, arrival: float, eof: bool = False):
+        """Zpracuje buffer: potvrdí úseky ukončené tichem, zbytek vydá jako partial."""
+        while self.audio.shape[0] >= self.min_window or (eof and self.audio.shape[0]):
+            behind = self.audio.shape[0] > self.max_window
+            window = self.audio[: self.max_window]
+            speech = get_speech_timestamps(window, self.vad_options)
+
+            if not speech:
+                # Jen ticho: ponechat krátký okraj pro začátek další řeči
+                keep = 0 if eof else min(window.shape[0], self.endpoint_silence)
+                self.audio = self.audio[window.shape[0] - keep:]
+                self.offset += window.shape[0] - keep
+                self.last_partial = None
+                if eof or not behind:
+                    return
+                continue
+
+            # Endpoint = střed poslední dost dlouhé pauzy (i na konci okna)
+            cut = None
+            boundaries = [s["start"] for s in speech[1:]] + [window.shape[0]]
+            for chunk, following in zip(speech, boundaries):
+                if following - chunk["end"] >= self.endpoint_silence:
+                    cut = (chunk["end"] + following) // 2
+            if eof and not behind:
+                cut = window.shape[0]
+
+            if cut is not None:
+                self._commit(cut, self._transcribe(window[:cut]), arrival)
+                continue
+
+            if behind or window.shape[0] >= self.max_window:
+                # Okno je plné a ticho nepřišlo: potvrdit vše kromě posledního segmentu
+                segments = self._transcribe(window)
+                cut = int(segments[-2].end * PCM_SAMPLE_RATE) if len(segments) > 1 else 0
+                if 0 < cut < window.shape[0]:
+                    self._commit(cut, segments[:-1], arrival)
+                else:
+                    self._commit(window.shape[0], segments, arrival)
+                continue
+
+            # Dohnáno: hypotéza pro rozpracovaný úsek
+            segments = self._transcribe(window)
+            text = " ".join(s.text.strip() for s in segments if s.text.strip())
+            if text and text != self.last_partial:
+                self._event("partial", speech[0]["start"], window.shape[0], text, arrival)
+                self.last_partial = text
+            return
+
+
+def open_input(spec: str):
+    """Otevře vstup: "-" = stdin, tcp:HOST:PORT / unix:CESTA = naslouchat, jinak soubor/roura."""
+    if spec == "-":
+        return sys.stdin.buffer
+    if spec.startswith(("tcp:", "unix:")):
+        if spec.startswith("tcp:"):
+            host, _, port = spec[len("tcp:"):].rpartition(":")
+            server = socket.create_server((host or "127.0.0.1", int(port)))
+        else:
+            path = spec[len("unix:"):]
+            if os.path.exists(path):
+                os.remove(path)
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(path)
+            server.listen(1)
+        print(f"{Fore.CYAN}[STREAM]{Style.RESET_ALL} Čekám na připojení na {spec}...")
+        conn, _ = server.accept()
+        server.close()
+        return conn.makefile("rb")
+    return open(spec, "rb")
+
+
+def parse_args(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        prog="local-whisper-stream",
+        description="Živý přepis z proudu 16 kHz mono s16le PCM.",
+    )
+    parser.add_argument("--config", default=DEFAULT_CONFIG_FILE, help=f"Cesta ke konfiguraci (default: {DEFAULT_CONFIG_FILE}).")
+    parser.add_argument("--input", default="-", help='Zdroj PCM: "-" (stdin), cesta k rouře/souboru, tcp:HOST:PORT nebo unix:CESTA')
+    parser.add_argument("--output", help="JSON řádky do souboru místo stdout")
+    parser.add_argument("--model", dest="model_size", help="Přepsat model_size")
+    parser.add_argument("--lang", dest="language", help="Jazyk (např. cs); bez něj se určí z první řeči")
+    parser.add_argument("--latency", dest="stream_latency_s", type=float, help="Cílové zpoždění partial výsledků v sekundách (default: 1.0)")
+    parser.add_argument("--endpoint-ms", dest="stream_endpoint_silence_ms", type=int, help="Ticho ukončující úsek v ms (default: 600)")
+    parser.add_argument("--max-window", dest="stream_max_window_s", type=float, help="Maximální délka nepotvrzeného okna v s (default: 20)")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    config = dict(STREAM_DEFAULTS)
+    config.update(load_config(args.config))
+    for key in ("model_size", "language", "stream_latency_s", "stream_endpoint_silence_ms", "stream_max_window_s"):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+
+    # stdout patří JSON řádkům, všechny hlášky jdou na stderr
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    sys.stdout = sys.stderr
+
+    def emit(event: dict):
+        out.write(json.dumps(event, ensure_ascii=False) + "\n")
+        out.flush()
+
+    device, compute_type = resolve_device(config)
+    runtime = get_runtime(config, device, compute_type, {})
+    transcriber = StreamTranscriber(runtime, config, emit)
+
+    reader = PCMReader(open_input(args.input))
+    print(f"{Fore.CYAN}[STREAM]{Style.RESET_ALL} Přepisuji proud (latence {transcriber.latency:.1f}s, endpoint {config['stream_endpoint_silence_ms']} ms)")
+    step_samples = max(1, int(transcriber.latency * PCM_SAMPLE_RATE))
+    try:
+        while True:
+            samples, arrival, eof = reader.take(step_samples, timeout=transcriber.latency)
+            transcriber.feed(samples)
+            transcriber.step(arrival, eof=eof)
+            if eof:
+                break
+    except KeyboardInterrupt:
+        transcriber.step(time.monotonic(), eof=True)
+    finally:
+        duration = (transcriber.offset + transcriber.audio.shape[0]) / PCM_SAMPLE_RATE
+        emit({"type": "end", "duration": round(duration, 3), "finals": transcriber.finals})
+        if out is not sys.__stdout__:
+            out.close()
+
+    if reader.error is not None:
+        print(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} Čtení vstupu selhalo: {reader.error}")
+        sys.exit(1)
+    print(f"{Fore.GREEN}[HOTOVO]{Style.RESET_ALL} {duration:.1f}s audia, {transcriber.finals} finálních segmentů")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+🧪 Společné fixtures testů
+
+Falešný `WhisperModel` (bez stahování modelů a bez GPU), krátké vstupy se šumem
+a základní konfigurace s výstupy v dočasné složce.
+"""
+
+import os
+import subprocess
+import wave
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from faster_whisper.transcribe import Segment, Word
+
+import budget
+import cache
+import console
+import metrics
+import transcribe
+from audio import _get_ffmpeg_exe
+
+SAMPLE_RATE = 16000
+# Délka segmentu falešného modelu; s délkou vstupu v násobcích 0,5 s jsou posunuté časy přesné
+SEGMENT_S = 4.0
+
+
+class FakeWhisper:
+    """Řízení falešného modelu z testu: načtení, volání `transcribe` a simulované chyby.
+
+    `fail(batch_size, compute_type, index)` se volá při startu přepisu (`index` None)
+    a před každým segmentem; vrácená výjimka se vyhodí.
+    """
+
+    def __init__(self):
+        self.loads = []  # compute_type každého načteného modelu
+        self.calls = []  # parametry každého volání transcribe
+        self.fail = None
+
+    def check(self, batch_size, compute_type, index):
+        if self.fail is not None:
+            error = self.fail(batch_size, compute_type, index)
+            if error is not None:
+                raise error
+
+
+class FakeModel:
+    """Náhrada `WhisperModel`: segment každé 4 s, text odvozený z obsahu audia.
+
+    Text závisí jen na vzorcích okna, takže navázání na oříznutém vstupu
+    (checkpoint, OOM) dává stejné segmenty jako nepřerušený přepis.
+    """
+
+    whisper = None
+
+    def __init__(self, *args, compute_type="default", **kwargs):
+        self.compute_type = compute_type
+        self.whisper.loads.append(compute_type)
+
+    def transcribe(self, audio, clip_timestamps="0", word_timestamps=False, batch_size=None, **kwargs):
+        whisper = self.whisper
+        duration = len(audio) / SAMPLE_RATE
+        whisper.calls.append(
+            {"duration": duration, "batch_size": batch_size, "compute_type": self.compute_type, "clip_timestamps": clip_timestamps, **kwargs}
+        )
+        whisper.check(batch_size, self.compute_type, None)
+
+        if isinstance(clip_timestamps, str):
+            start, end = float(clip_timestamps.split(",")[0]), duration
+        else:
+            start, end = clip_timestamps[0], min(clip_timestamps[1], duration)
+
+        def segments():
+            t, index = start, 0
+            while t < end:
+                whisper.check(batch_size, self.compute_type, index)
+                index += 1
+                seg_end = min(end, t + SEGMENT_S)
+                level = int(np.abs(audio[int(t * SAMPLE_RATE):int(seg_end * SAMPLE_RATE)]).mean() * 1e6)
+                words = [
+                    Word(start=t, end=t + 1.0, word=" Úsek", probability=0.9),
+                    Word(start=t + 1.0, end=seg_end, word=f" {level}.", probability=0.8),
+                ] if word_timestamps else None
+                yield Segment(
+                    id=index, seek=int(t * 100), start=t, end=seg_end, text=f" Úsek {level}.", tokens=[1, 2, 3],
+                    avg_logprob=-0.2, compression_ratio=1.2, no_speech_prob=0.01, words=words, temperature=0.0,
+                )
+                t = seg_end
+
+        info = SimpleNamespace(
+            language=kwargs.get("language") or "cs",
+            language_probability=0.97,
+            duration=duration,
+            duration_after_vad=duration,
+            all_language_probs=None,
+        )
+        return segments(), info
+
+
+class FakeBatched:
+    """Náhrada `BatchedInferencePipeline`: předá `batch_size` modelu (pro simulaci OOM)."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def transcribe(self, audio, batch_size=16, **kwargs):
+        return self.model.transcribe(audio, batch_size=batch_size, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    """Procesní stav (paměť OOM, jazyková a velikostní cache, rozpočet, metriky) pro každý test zvlášť."""
+    monkeypatch.setattr(transcribe, "_STABLE_BATCH_SIZE", {})
+    monkeypatch.setattr(transcribe, "_OOM_COMPUTE_TYPE", {})
+    monkeypatch.setattr(transcribe, "_LANGUAGE_CACHE", {})
+    monkeypatch.setattr(transcribe, "_DEVICE_CACHE", {})
+    monkeypatch.setattr(cache, "_CACHE_SIZE", {})
+    monkeypatch.setattr(metrics, "_METRICS_TOTALS", {})
+    monkeypatch.setattr(console, "_CONSOLE_MODE", "quiet")
+    budget.RESOURCE_BUDGET.configure({})
+
+
+@pytest.fixture
+def whisper(monkeypatch):
+    """Falešný faster-whisper místo skutečného modelu; vrací `FakeWhisper` pro kontrolu z testu."""
+    fake = FakeWhisper()
+    monkeypatch.setattr(FakeModel, "whisper", fake)
+    monkeypatch.setattr(transcribe, "WhisperModel", FakeModel)
+    monkeypatch.setattr(transcribe, "BatchedInferencePipeline", FakeBatched)
+    return fake
+
+
+def write_audio(path, seconds: float, seed: int = 0) -> str:
+    """16 kHz mono šum (deterministický podle `seed`) jako bezeztrátové PCM v .mkv.
+
+    Kontejner jde stejnou cestou jako .m4a (ffmpeg → PCM), takže se dekóduje
+    do stejných vzorků, jaké se zapsaly.
+    """
+    path = str(path)
+    samples = np.random.default_rng(seed).normal(0, 3000, int(seconds * SAMPLE_RATE))
+    wav_path = f"{path}.wav"
+    with wave.open(wav_path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(np.clip(samples, -32768, 32767).astype("<i2").tobytes())
+    subprocess.run(
+        [_get_ffmpeg_exe(), "-nostdin", "-loglevel", "error", "-y", "-i", wav_path, "-c:a", "copy", path],
+        check=True,
+    )
+    os.remove(wav_path)
+    return path
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    return write_audio(tmp_path / "nahravka.mkv", 18.5)
+
+
+@pytest.fixture
+def config(tmp_path):
+    """Konfigurace pro falešný model: CPU, pevný jazyk, bez VAD, výstupy a cache v `tmp_path`."""
+    return {
+        **transcribe.DEFAULT_CONFIG,
+        "model_size": "fake",
+        "device": "cpu",
+        "compute_type": "float32",
+        "language": "cs",
+        "vad_filter": False,
+        "log_progress": False,
+        "console": "quiet",
+        "output_formats": ["txt", "srt", "vtt", "json"],
+        "output_dir": str(tmp_path / "out"),
+        "cache_dir": str(tmp_path / "cache"),
+        "model_dir": str(tmp_path / "models"),
+    }
+
+
+def read_outputs(paths) -> dict[str, bytes]:
+    """Obsah výstupů podle přípony (pro porovnání běhů do různých složek)."""
+    result = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            result[os.path.splitext(path)[1]] = f.read()
+    return result
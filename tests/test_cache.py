@@ -0,0 +1,80 @@
+"""Cache hotových přepisů: zásah bez modelu, změna vstupu či parametrů, LRU eviction."""
+
+import glob
+import os
+
+from conftest import read_outputs, write_audio
+from transcribe import transcribe_file
+
+
+def _cache_entries(config) -> set[str]:
+    return set(glob.glob(os.path.join(config["cache_dir"], "*", "*.jsonl")))
+
+
+def test_hit_skips_model_and_matches_outputs(whisper, config, audio_file):
+    config["use_cache"] = True
+    first = read_outputs(transcribe_file(audio_file, config, {}))
+    assert whisper.loads == ["float32"]
+    assert len(_cache_entries(config)) == 1
+
+    stats = {}
+    second = read_outputs(transcribe_file(audio_file, config, {}, stats=stats))
+    assert stats["status"] == "cached"
+    assert whisper.loads == ["float32"]  # model se podruhé nenačítá
+    assert len(whisper.calls) == 1
+    assert second == first
+
+
+def test_changed_parameters_miss(whisper, config, audio_file):
+    config["use_cache"] = True
+    transcribe_file(audio_file, config, {})
+
+    stats = {}
+    transcribe_file(audio_file, {**config, "beam_size": 1}, {}, stats=stats)
+    assert stats["status"] == "done"
+    assert len(whisper.calls) == 2
+    assert len(_cache_entries(config)) == 2
+
+
+def test_changed_audio_misses(whisper, config, tmp_path):
+    config["use_cache"] = True
+    path = write_audio(tmp_path / "nahravka.mkv", 18.5, seed=1)
+    transcribe_file(path, config, {})
+    write_audio(path, 18.5, seed=2)
+
+    stats = {}
+    transcribe_file(path, config, {}, stats=stats)
+    assert stats["status"] == "done"
+    assert len(whisper.calls) == 2
+
+
+def test_failed_run_is_not_cached(whisper, config, audio_file):
+    config["use_cache"] = True
+    whisper.fail = lambda batch_size, compute_type, index: RuntimeError("simulovaný pád") if index == 2 else None
+    assert transcribe_file(audio_file, config, {}) is None
+    assert not _cache_entries(config)
+    assert not glob.glob(os.path.join(config["cache_dir"], "*", "*.tmp"))
+
+
+def test_eviction_drops_least_recently_used(whisper, config, tmp_path):
+    config["use_cache"] = True
+    paths = [write_audio(tmp_path / f"{name}.mkv", 18.5, seed=seed) for seed, name in enumerate("abc")]
+
+    transcribe_file(paths[0], config, {})
+    (entry_a,) = _cache_entries(config)
+    transcribe_file(paths[1], config, {})
+    (entry_b,) = _cache_entries(config) - {entry_a}
+    os.utime(entry_a, (100, 100))
+    os.utime(entry_b, (200, 200))
+
+    # Zásah posune `a` na nejnověji použitý záznam
+    stats = {}
+    transcribe_file(paths[0], config, {}, stats=stats)
+    assert stats["status"] == "cached"
+
+    # Místo pro dva a půl záznamu: třetí zápis vyřadí nejdéle nepoužitý `b`
+    config["cache_max_mb"] = 2.5 * os.path.getsize(entry_a) / (1024 * 1024)
+    transcribe_file(paths[2], config, {})
+    entries = _cache_entries(config)
+    assert entry_a in entries and entry_b not in entries
+    assert len(entries) == 2
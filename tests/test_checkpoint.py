@@ -0,0 +1,94 @@
+"""Checkpointy: po pádu zůstanou hotové segmenty a další běh na ně naváže."""
+
+import os
+
+from conftest import read_outputs
+from transcribe import transcribe_file
+
+
+def _crash_after(count: int):
+    """Pád (ne OOM) před segmentem `count` prvního přepisu; další běhy projdou."""
+    state = {"calls": 0}
+
+    def fail(batch_size, compute_type, index):
+        if index is None:
+            state["calls"] += 1
+        elif state["calls"] == 1 and index == count:
+            return RuntimeError("simulovaný pád")
+
+    return fail
+
+
+def _checkpoint_path(config) -> str:
+    return os.path.join(config["output_dir"], "nahravka.checkpoint.jsonl")
+
+
+def _reference(config, audio_file, tmp_path) -> dict[str, bytes]:
+    return read_outputs(transcribe_file(audio_file, {**config, "output_dir": str(tmp_path / "ref")}, {}))
+
+
+def test_crash_keeps_checkpoint_and_partial_outputs(whisper, config, audio_file):
+    config["checkpoint_interval_s"] = 1e-6
+    whisper.fail = _crash_after(3)
+    stats = {}
+    assert transcribe_file(audio_file, config, {}, stats=stats) is None
+    assert stats["status"] == "failed"
+
+    assert os.path.exists(_checkpoint_path(config))
+    assert not os.path.exists(os.path.join(config["output_dir"], "nahravka.txt"))
+    with open(os.path.join(config["output_dir"], "nahravka.partial.txt"), encoding="utf-8") as f:
+        assert len(f.readlines()) == 3
+
+
+def test_resume_matches_uninterrupted_run(whisper, config, audio_file, tmp_path):
+    reference = _reference(config, audio_file, tmp_path)
+    whisper.calls.clear()
+
+    config["checkpoint_interval_s"] = 1e-6
+    whisper.fail = _crash_after(3)
+    transcribe_file(audio_file, config, {})
+    outputs = read_outputs(transcribe_file(audio_file, config, {}))
+
+    assert outputs == reference
+    # Sekvenční režim bez VAD navazuje přes clip_timestamps s globálními časy
+    resumed = whisper.calls[-1]
+    assert resumed["clip_timestamps"] == "12.000"
+    assert resumed["initial_prompt"]
+    assert not os.path.exists(_checkpoint_path(config))
+    assert not [name for name in os.listdir(config["output_dir"]) if ".partial." in name]
+
+
+def test_resume_batched_trims_audio(whisper, config, audio_file, tmp_path):
+    config["use_batched_inference"] = True
+    reference = _reference(config, audio_file, tmp_path)
+    whisper.calls.clear()
+
+    config["checkpoint_interval_s"] = 1e-6
+    whisper.fail = _crash_after(2)
+    transcribe_file(audio_file, config, {})
+    outputs = read_outputs(transcribe_file(audio_file, config, {}))
+
+    assert outputs == reference
+    assert whisper.calls[-1]["duration"] == 18.5 - 8.0
+
+
+def test_torn_last_line_is_ignored(whisper, config, audio_file, tmp_path):
+    reference = _reference(config, audio_file, tmp_path)
+
+    config["checkpoint_interval_s"] = 1e-6
+    whisper.fail = _crash_after(3)
+    transcribe_file(audio_file, config, {})
+    with open(_checkpoint_path(config), "a", encoding="utf-8") as f:
+        f.write('{"offset": 16.0, "segm')
+
+    assert read_outputs(transcribe_file(audio_file, config, {})) == reference
+
+
+def test_checkpoint_from_other_parameters_is_not_used(whisper, config, audio_file):
+    config["checkpoint_interval_s"] = 1e-6
+    whisper.fail = _crash_after(3)
+    transcribe_file(audio_file, config, {})
+
+    transcribe_file(audio_file, {**config, "beam_size": 1}, {})
+    assert whisper.calls[-1]["clip_timestamps"] == "0"
+    assert not os.path.exists(_checkpoint_path(config))
@@ -0,0 +1,134 @@
+"""Exporty: bajtová shoda s prostým převodem (timedelta, json.dump) pro každou velikost dávky i writer vlákno."""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from faster_whisper.transcribe import Segment, Word
+
+import exporters
+from exporters import ExportSink, ThreadedExportSink
+
+FORMATS = ["txt", "srt", "vtt", "json", "jsonl"]
+INFO = SimpleNamespace(language="cs", language_probability=0.91, language_source="config", duration=7400.5, duration_after_vad=7000.25)
+
+# Hraniční časy pro zaokrouhlení na milisekundy a texty, které musí JSON escapovat
+SEGMENT_DATA = [
+    (0.0, 0.0005, " Začátek."),
+    (0.0015, 1.0015, "  Mezery na okrajích  "),
+    (0.1 + 0.2, 59.9999, ' "Uvozovky" a \\ zpětné lomítko'),
+    (59.9995, 61.0, "Tab\tnový\nřádek"),
+    (3599.9996, 3600.0, ""),
+    (3600.0, 3661.001, "Emoji 🎙️ a ∑"),
+    (7322.123456, 7399.9994, " Konec"),
+]
+
+
+def _segments() -> list[Segment]:
+    segments = []
+    for i, (start, end, text) in enumerate(SEGMENT_DATA, 1):
+        middle = (start + end) / 2
+        words = [
+            Word(start=start, end=middle, word=" první", probability=0.123456789),
+            Word(start=middle, end=end, word=' "druhé"', probability=1.0),
+        ]
+        segments.append(Segment(
+            id=i, seek=0, start=start, end=end, text=text, tokens=[1], avg_logprob=-0.1,
+            compression_ratio=1.0, no_speech_prob=0.0, words=words if i % 2 else None, temperature=0.0,
+        ))
+    return segments
+
+
+def _ref_time(seconds: float, sep: str = ",") -> str:
+    td = timedelta(seconds=seconds)
+    hours, rest = divmod(td.days * 86400 + td.seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours:02}:{minutes:02}:{secs:02}{sep}{td.microseconds // 1000:03}"
+
+
+def _ref_json_segment(s) -> dict:
+    data = {"id": s.id, "start": s.start, "end": s.end, "text": s.text.strip()}
+    if s.words:
+        data["words"] = [{"word": w.word, "start": w.start, "end": w.end, "probability": w.probability} for w in s.words]
+    return data
+
+
+def _reference(source: str, segments: list) -> dict[str, str]:
+    header = {"source": source, "language": INFO.language, "language_source": INFO.language_source, "duration": INFO.duration}
+    return {
+        "txt": "".join(f"[{_ref_time(s.start)}] {s.text.strip()}\n" for s in segments),
+        "srt": "".join(f"{i}\n{_ref_time(s.start)} --> {_ref_time(s.end)}\n{s.text.strip()}\n\n" for i, s in enumerate(segments, 1)),
+        "vtt": "WEBVTT\n\n" + "".join(f"{_ref_time(s.start, '.')} --> {_ref_time(s.end, '.')}\n{s.text.strip()}\n\n" for s in segments),
+        "json": json.dumps({**header, "segments": [_ref_json_segment(s) for s in segments]}, indent=2, ensure_ascii=False),
+        "jsonl": "".join(json.dumps(d, ensure_ascii=False) + "\n" for d in [header] + [_ref_json_segment(s) for s in segments]),
+    }
+
+
+@pytest.fixture
+def export_config(tmp_path):
+    return {"output_dir": str(tmp_path), "output_formats": FORMATS + ["columns"], "word_timestamps": True}
+
+
+def _export(sink, segments) -> list[str]:
+    sink.begin(INFO)
+    for s in segments:
+        sink.write(s)
+    return sink.close()
+
+
+def _read(paths) -> dict[str, str]:
+    result = {}
+    for path in paths:
+        ext = os.path.splitext(path)[1][1:]
+        if ext in FORMATS:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                result[ext] = f.read()
+    return result
+
+
+@pytest.mark.parametrize("batch", [1, 3, 64])
+@pytest.mark.parametrize("count", [0, 1, len(SEGMENT_DATA)])
+def test_matches_reference_rendering(monkeypatch, export_config, tmp_path, batch, count):
+    monkeypatch.setattr(exporters, "EXPORT_BATCH_SEGMENTS", batch)
+    segments = _segments()[:count]
+    source = str(tmp_path / "nahravka.m4a")
+    assert _read(_export(ExportSink(source, export_config), segments)) == _reference(source, segments)
+
+
+def test_writer_thread_matches_direct_export(export_config, tmp_path):
+    source = str(tmp_path / "nahravka.m4a")
+    direct = _read(_export(ExportSink(source, export_config), _segments()))
+
+    threaded_config = {**export_config, "output_dir": str(tmp_path / "vlakno")}
+    os.makedirs(threaded_config["output_dir"])
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        paths = _export(ThreadedExportSink(ExportSink(source, threaded_config), writer), _segments()).result()
+    assert _read(paths) == direct
+
+
+def test_columns_sidecar_round_trip(export_config, tmp_path):
+    segments = _segments()
+    _export(ExportSink(str(tmp_path / "nahravka.m4a"), export_config), segments)
+    header, columns = exporters.load_columns(str(tmp_path / "nahravka.columns"))
+    assert header["language"] == "cs"
+    assert columns["segment.start"].tolist() == [s.start for s in segments]
+    assert columns["segment.end"].tolist() == [s.end for s in segments]
+    assert bytes(columns["segment.text"]).decode("utf-8") == "".join(s.text for s in segments)
+    assert columns["segment.word_offsets"][-1] == sum(len(s.words or ()) for s in segments)
+
+
+def test_abort_keeps_previous_outputs(export_config, tmp_path):
+    source = str(tmp_path / "nahravka.m4a")
+    previous = _read(_export(ExportSink(source, export_config), _segments()[:2]))
+
+    sink = ExportSink(source, export_config)
+    sink.begin(INFO)
+    for s in _segments():
+        sink.write(s)
+    sink.abort()
+
+    assert _read(os.path.join(tmp_path, f"nahravka.{ext}") for ext in FORMATS) == previous
+    assert not [name for name in os.listdir(tmp_path) if ".partial." in name]
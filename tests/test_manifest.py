@@ -0,0 +1,114 @@
+"""Manifest dávky: výběr souborů k přepisu a záznam výsledků mezi běhy."""
+
+import os
+
+import pytest
+
+from conftest import write_audio
+from transcribe import JobManifest, expected_outputs, transcribe_batch
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """Složka se dvěma nahrávkami (různé délky) a jedním souborem, který nahrávkou není."""
+    root = tmp_path / "archiv"
+    root.mkdir()
+    write_audio(root / "a.mkv", 10.0, seed=1)
+    write_audio(root / "b.mkv", 6.0, seed=2)
+    (root / "poznamky.txt").write_text("nepřepisovat", encoding="utf-8")
+    return str(root)
+
+
+def _run(config, specs, **select) -> list[str]:
+    """Jeden běh CLI s manifestem (nový proces = nové otevření databáze); vrací vybrané soubory."""
+    manifest = JobManifest(config["manifest_file"], config)
+    try:
+        files = manifest.select(manifest.collect(specs, config), config, **select)
+        transcribe_batch(files, config, {}, on_result=manifest.record, on_start=manifest.start)
+        return files
+    finally:
+        manifest.close()
+
+
+def _status(config, path) -> tuple:
+    manifest = JobManifest(config["manifest_file"], config)
+    try:
+        return manifest.db.execute("SELECT status, attempts FROM files WHERE path = ?", (path,)).fetchone()
+    finally:
+        manifest.close()
+
+
+@pytest.fixture
+def manifest_config(config, tmp_path):
+    return {**config, "manifest_file": str(tmp_path / "batch.sqlite")}
+
+
+def test_done_files_are_skipped(whisper, manifest_config, archive):
+    paths = [os.path.join(archive, "a.mkv"), os.path.join(archive, "b.mkv")]
+    assert _run(manifest_config, [archive]) == paths
+    assert [_status(manifest_config, p) for p in paths] == [("done", 0), ("done", 0)]
+
+    assert _run(manifest_config, [archive]) == []
+    assert len(whisper.calls) == 2
+
+
+def test_changed_or_missing_outputs_are_selected_again(whisper, manifest_config, archive):
+    a, b = os.path.join(archive, "a.mkv"), os.path.join(archive, "b.mkv")
+    _run(manifest_config, [archive])
+
+    write_audio(a, 12.0, seed=5)
+    os.remove(expected_outputs(b, manifest_config)[0])
+    assert _run(manifest_config, [archive]) == [a, b]
+
+
+def test_failed_file_waits_for_backoff(whisper, manifest_config, archive):
+    manifest_config.update(retry_max_attempts=2, retry_backoff_s=3600)
+    a, b = os.path.join(archive, "a.mkv"), os.path.join(archive, "b.mkv")
+    # b (6 s) selže vždy
+    whisper.fail = lambda batch_size, compute_type, index: RuntimeError("simulovaný pád") if whisper.calls[-1]["duration"] == 6.0 else None
+
+    assert _run(manifest_config, [archive]) == [a, b]
+    assert _status(manifest_config, b) == ("failed", 1)
+
+    # Backoff ještě neuplynul; --retry-failed ho obejde
+    assert _run(manifest_config, [archive]) == []
+    assert _run(manifest_config, [archive], retry_failed=True) == [b]
+    assert _status(manifest_config, b) == ("failed", 2)
+
+    # Po vyčerpání pokusů se soubor nezkouší ani bez backoffu
+    manifest_config["retry_backoff_s"] = 0
+    assert _run(manifest_config, [archive]) == []
+
+
+def test_interrupted_file_is_not_taken_as_done(whisper, manifest_config, archive):
+    a = os.path.join(archive, "a.mkv")
+    manifest = JobManifest(manifest_config["manifest_file"], manifest_config)
+    manifest.collect([archive], manifest_config)
+    manifest.start(a)
+    manifest.close()  # pád procesu uprostřed přepisu
+
+    # Čerstvé (ale neúplné) výstupy z přerušeného běhu
+    for path in expected_outputs(a, manifest_config):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("neúplné")
+
+    assert a in _run(manifest_config, [archive])
+    assert _status(manifest_config, a) == ("done", 0)
+
+
+def test_outputs_from_before_manifest_are_recorded_as_done(whisper, config, manifest_config, archive):
+    transcribe_batch([os.path.join(archive, "a.mkv")], config, {})
+    assert _run(manifest_config, [archive]) == [os.path.join(archive, "b.mkv")]
+    assert _status(manifest_config, os.path.join(archive, "a.mkv")) == ("done", 0)
+
+
+def test_finished_scan_is_reused_until_rescan(whisper, manifest_config, archive):
+    manifest = JobManifest(manifest_config["manifest_file"], manifest_config)
+    try:
+        first = manifest.collect([archive], manifest_config)
+        write_audio(os.path.join(archive, "c.mkv"), 4.0, seed=3)
+        assert manifest.collect([archive], manifest_config) == first
+        assert manifest.collect([archive], manifest_config, rescan=True) == first + [os.path.join(archive, "c.mkv")]
+    finally:
+        manifest.close()
@@ -0,0 +1,102 @@
+"""Zotavení z nedostatku paměti: poloviční batch_size, úspornější compute_type, navázání a nový start."""
+
+import glob
+import os
+
+import transcribe
+from conftest import read_outputs, write_audio
+from transcribe import transcribe_file
+
+MODEL_KEY = ("fake", "cpu", "float32")
+
+
+def _oom():
+    return RuntimeError("CUDA failed with error out of memory")
+
+
+def _reference(config, audio_file, tmp_path) -> dict[str, bytes]:
+    return read_outputs(transcribe_file(audio_file, {**config, "output_dir": str(tmp_path / "ref")}, {}))
+
+
+def test_resume_after_oom_mid_file(whisper, config, audio_file, tmp_path):
+    config.update(use_batched_inference=True, batch_size=8)
+    reference = _reference(config, audio_file, tmp_path)
+    whisper.calls.clear()
+
+    whisper.fail = lambda batch_size, compute_type, index: _oom() if batch_size > 4 and index == 2 else None
+    stats = {}
+    outputs = read_outputs(transcribe_file(audio_file, config, {}, stats=stats))
+
+    assert outputs == reference
+    assert stats["oom_retries"] == 1
+    # Navázání za druhým segmentem (8 s): oříznuté audio, známý jazyk a kontext posledního segmentu
+    resumed = whisper.calls[-1]
+    assert resumed["duration"] == 18.5 - 8.0
+    assert resumed["batch_size"] == 4
+    assert resumed["language"] == "cs"
+    assert resumed["initial_prompt"]
+    assert transcribe._STABLE_BATCH_SIZE == {MODEL_KEY: 4}
+
+    # Další soubor začne rovnou s ověřeným batch_size
+    transcribe_file(write_audio(tmp_path / "dalsi.mkv", 6.0, seed=3), config, {})
+    assert whisper.calls[-1]["batch_size"] == 4
+
+
+def test_restart_after_oom_at_start(whisper, config, audio_file, tmp_path):
+    config.update(use_batched_inference=True, batch_size=8)
+    reference = _reference(config, audio_file, tmp_path)
+    whisper.calls.clear()
+
+    whisper.fail = lambda batch_size, compute_type, index: _oom() if batch_size > 2 and index is None else None
+    stats = {}
+    outputs = read_outputs(transcribe_file(audio_file, config, {}, stats=stats))
+
+    assert outputs == reference
+    assert stats["oom_retries"] == 2
+    assert [call["batch_size"] for call in whisper.calls] == [8, 4, 2]
+    assert transcribe._STABLE_BATCH_SIZE == {MODEL_KEY: 2}
+
+
+def test_batch_size_not_recorded_when_file_fails(whisper, config, audio_file):
+    config.update(use_batched_inference=True, batch_size=8)
+
+    def fail(batch_size, compute_type, index):
+        if batch_size > 4 and index == 2:
+            return _oom()
+        if batch_size == 4 and index == 1:
+            return RuntimeError("simulovaný pád")
+
+    whisper.fail = fail
+    stats = {}
+    assert transcribe_file(audio_file, config, {}, stats=stats) is None
+    assert stats["status"] == "failed"
+    assert transcribe._STABLE_BATCH_SIZE == {}
+
+
+def test_lighter_compute_type_after_oom(whisper, config, audio_file, tmp_path):
+    reference = _reference(config, audio_file, tmp_path)
+    whisper.loads.clear()
+
+    config["use_cache"] = True
+    whisper.fail = lambda batch_size, compute_type, index: _oom() if compute_type == "float32" and index == 1 else None
+    stats = {}
+    outputs = read_outputs(transcribe_file(audio_file, config, {}, stats=stats))
+
+    assert outputs == reference
+    assert whisper.loads == ["float32", "int8"]
+    assert stats["compute_type"] == "int8"
+    assert transcribe._OOM_COMPUTE_TYPE == {MODEL_KEY: "int8"}
+    # Navázaný sekvenční přepis dostane jen zbytek audia za prvním segmentem
+    assert whisper.calls[-1]["duration"] == 18.5 - 4.0
+    # Výsledek z int8 nepatří pod klíč float32
+    assert not glob.glob(os.path.join(config["cache_dir"], "*", "*.jsonl"))
+
+
+def test_no_fallback_left_fails_file(whisper, config, audio_file):
+    whisper.fail = lambda batch_size, compute_type, index: _oom() if index == 1 else None
+    stats = {}
+    assert transcribe_file(audio_file, config, {}, stats=stats) is None
+    assert stats["status"] == "failed"
+    assert stats["oom_retries"] == 1
+    assert whisper.loads == ["float32", "int8"]
+    assert not os.listdir(config["output_dir"])
@@ -0,0 +1,107 @@
+"""Filtr smyček: krátké repliky zůstávají, smyčky se zahazují, delší smyčka se přepíše znovu."""
+
+from types import SimpleNamespace
+
+import numpy as np
+from faster_whisper.transcribe import Segment
+
+from conftest import read_outputs
+from transcribe import RepetitionFilter, transcribe_file
+
+WORDS = [f"slovo{i}" for i in range(20)]
+LOOP = "a pak jsme šli domů"
+
+
+def _segment(index: int, text: str, start: float | None = None, length: float = 4.0) -> Segment:
+    start = (index - 1) * length if start is None else start
+    return Segment(
+        id=index, seek=0, start=start, end=start + length, text=f" {text}", tokens=[1], avg_logprob=-0.2,
+        compression_ratio=1.2, no_speech_prob=0.01, words=None, temperature=0.0,
+    )
+
+
+def _looping_transcript() -> list[Segment]:
+    """Úvod, pětkrát stejná věta (4 s každá, od 4 s) a závěr."""
+    return (
+        [_segment(1, "Dobrý den všem posluchačům.")]
+        + [_segment(i, LOOP) for i in range(2, 7)]
+        + [_segment(7, "Na shledanou příště.")]
+    )
+
+
+def _texts(segments) -> list[str]:
+    return [s.text.strip() for s in segments]
+
+
+def test_short_replies_are_kept():
+    segments = [_segment(i, "Ano.") for i in range(1, 7)]
+    repetition = RepetitionFilter({})
+    assert _texts(repetition.filter(iter(segments))) == ["Ano."] * 6
+    assert repetition.dropped == 0
+
+    # S nižším prahem se i krátká replika počítá jako smyčka
+    repetition = RepetitionFilter({"repetition_min_words": 1})
+    assert _texts(repetition.filter(iter(segments))) == ["Ano."] * 2
+    assert repetition.dropped == 4
+
+
+def test_repeated_text_is_dropped_and_ids_renumbered():
+    segments = _looping_transcript()
+    repetition = RepetitionFilter({})
+    kept = list(repetition.filter(iter(segments)))
+
+    assert _texts(kept) == ["Dobrý den všem posluchačům.", LOOP, LOOP, "Na shledanou příště."]
+    assert [s.id for s in kept] == [1, 2, 3, 4]
+    assert kept[-1].start == 24.0
+    assert repetition.dropped == 3
+
+
+def test_ngram_overlap_with_window_is_dropped():
+    # Druhý segment opakuje 15 z 18 n-gramů prvního (zbytek jsou n-gramy přes hranici segmentů)
+    segments = [_segment(1, " ".join(WORDS)), _segment(2, " ".join(WORDS[2:])), _segment(3, "úplně jiná věta na konec")]
+    repetition = RepetitionFilter({})
+    assert _texts(repetition.filter(iter(segments))) == [" ".join(WORDS), "úplně jiná věta na konec"]
+
+
+def test_long_loop_is_redecoded():
+    calls = []
+
+    class Model:
+        def transcribe(self, audio, clip_timestamps, **params):
+            calls.append({"clip_timestamps": clip_timestamps, **params})
+            start, end = clip_timestamps
+            return iter([_segment(1, "opravený text bez smyčky", start=start, length=end - start)]), SimpleNamespace()
+
+    segments = _looping_transcript()
+    params = {"audio": np.zeros(16000 * 30, dtype=np.float32), "language": "cs", "condition_on_previous_text": True}
+    repetition = RepetitionFilter({"repetition_redecode_s": 10.0}, Model(), params)
+    kept = list(repetition.filter(iter(segments)))
+
+    assert _texts(kept) == ["Dobrý den všem posluchačům.", LOOP, LOOP, "opravený text bez smyčky", "Na shledanou příště."]
+    assert [s.id for s in kept] == [1, 2, 3, 4, 5]
+    # Jen okno smyčky, bez kontextu předchozího textu a s vyšší teplotou
+    (call,) = calls
+    assert call["clip_timestamps"] == [12.0, 24.0]
+    assert call["condition_on_previous_text"] is False
+    assert call["temperature"] == [0.2, 0.4, 0.6, 0.8]
+    assert call["language"] == "cs"
+    assert repetition.redecoded_s == 12.0
+
+
+def test_short_loop_is_not_redecoded():
+    class Model:
+        def transcribe(self, *args, **kwargs):
+            raise AssertionError("krátká smyčka se znovu nepřepisuje")
+
+    segments = [_segment(i, LOOP) for i in range(1, 5)]
+    repetition = RepetitionFilter({"repetition_redecode_s": 10.0}, Model(), {"audio": np.zeros(16000 * 20, dtype=np.float32)})
+    assert _texts(repetition.filter(iter(segments))) == [LOOP, LOOP]
+    assert repetition.redecoded_s == 0.0
+
+
+def test_filter_keeps_normal_transcript_unchanged(whisper, config, audio_file, tmp_path):
+    reference = read_outputs(transcribe_file(audio_file, {**config, "output_dir": str(tmp_path / "ref")}, {}))
+    stats = {}
+    outputs = read_outputs(transcribe_file(audio_file, {**config, "repetition_filter": True}, {}, stats=stats))
+    assert outputs == reference
+    assert stats["dropped_segments"] == 0
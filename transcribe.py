@@ -1,16 +1,50 @@
 import os
 import sys
+import re
 import time
 import json
-import datetime
+import glob
+import sqlite3
+import dataclasses
+import multiprocessing
 import logging
 import argparse
-import shutil
-import tempfile
+from functools import partial
 import subprocess
+import threading
+import http.client
+import socket
+import urllib.parse
+import inspect
+import numpy as np
+from collections import deque
+from itertools import chain, islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from types import SimpleNamespace
+import faster_whisper
 from faster_whisper import WhisperModel, BatchedInferencePipeline
+from faster_whisper.transcribe import Segment, Word
+from faster_whisper.vad import VadOptions, get_speech_timestamps
 from colorama import init, Fore, Style
 
+from audio import FFMPEG_DECODE_EXTS, PCM_SAMPLE_RATE, _maybe_decode_to_pcm, decode_pcm
+from budget import _CT2_DEFAULT_THREADS, RESOURCE_BUDGET
+from cache import CacheWriter, cache_lookup, transcription_cache_key
+from console import CONSOLE_LEVELS, ProgressReporter, console_enabled, echo, set_console_mode
+from exporters import (
+    EXPORTERS,
+    SegmentStore,
+    _close_sink,
+    _info_to_dict,
+    _open_sink,
+    _print_saved,
+    _segment_from_dict,
+    _segment_to_dict,
+    format_timestamp_srt,
+)
+from metrics import FileMetrics
+from slots import transcribe_on_slots
+
 # Inicializace barev
 init()
 
@@ -18,85 +52,11 @@ init()
 logging.basicConfig()
 logger = logging.getLogger("faster_whisper")
 
+# Zámek pro načítání modelů (cache sdílí více vláken, např. server.py)
+_MODEL_LOCK = threading.Lock()
 
-FFMPEG_DECODE_EXTS = {
-    ".m4a",
-    ".mp4",
-    ".mov",
-    ".mkv",
-    ".webm",
-    ".aac",
-    ".m4b",
-}
-
+DEFAULT_SERVER_PORT = 8765
 
-def _get_ffmpeg_exe() -> str | None:
-    exe = shutil.which("ffmpeg")
-    if exe:
-        return exe
-
-    # Fallback: imageio-ffmpeg provides a bundled ffmpeg binary (downloads on first use).
-    try:
-        import imageio_ffmpeg  # type: ignore
-
-        return imageio_ffmpeg.get_ffmpeg_exe()
-    except Exception:
-        return None
-
-
-def _maybe_decode_to_wav(input_path: str, output_dir: str) -> tuple[str, str | None]:
-    ext = os.path.splitext(input_path)[1].lower()
-    if ext == ".wav" or ext not in FFMPEG_DECODE_EXTS:
-        return input_path, None
-
-    ffmpeg_exe = _get_ffmpeg_exe()
-    if not ffmpeg_exe:
-        raise RuntimeError(
-            "Pro dekódování .m4a/.mp4 je potřeba ffmpeg. "
-            "Nainstalujte ffmpeg do systému, nebo doinstalujte závislost 'imageio-ffmpeg' a spusťte znovu."
-        )
-
-    os.makedirs(output_dir, exist_ok=True)
-    fd, tmp_wav = tempfile.mkstemp(prefix="local_whisper_", suffix=".wav", dir=output_dir)
-    os.close(fd)
-
-    cmd = [
-        ffmpeg_exe,
-        "-y",
-        "-nostdin",
-        "-hide_banner",
-        "-loglevel",
-        "error",
-        "-i",
-        input_path,
-        "-vn",
-        "-ac",
-        "1",
-        "-ar",
-        "16000",
-        "-c:a",
-        "pcm_s16le",
-        tmp_wav,
-    ]
-    subprocess.run(cmd, check=True)
-    return tmp_wav, tmp_wav
-
-# --- POMOCNÉ FUNKCE PRO FORMÁTOVÁNÍ ČASU ---
-def format_timestamp_srt(seconds):
-    """Převede sekundy na formát SRT (HH:MM:SS,mmm)"""
-    td = datetime.timedelta(seconds=seconds)
-    # timedelta string je např. "0:00:12.345000"
-    # Potřebujeme ho rozebrat a zformátovat
-    total_seconds = int(td.total_seconds())
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    secs = total_seconds % 60
-    millis = int(td.microseconds / 1000)
-    return f"{hours:02}:{minutes:02}:{secs:02},{millis:03}"
-
-def format_timestamp_vtt(seconds):
-    """Převede sekundy na formát VTT (HH:MM:SS.mmm)"""
-    return format_timestamp_srt(seconds).replace(",", ".")
 
 # --- NAČTENÍ KONFIGURACE ---
 DEFAULT_CONFIG_FILE = "config.json"
@@ -108,7 +68,34 @@ DEFAULT_CONFIG = {
     "use_batched_inference": False,
     "batch_size": 16,
     "word_timestamps": False,
-    "log_progress": True
+    "log_progress": True,
+    "pipeline_prefetch": 0,
+    "pcm_mmap_threshold_mb": 256,
+    "use_cache": False,
+    "cache_dir": "cache",
+    "cache_max_mb": 1024,
+    "checkpoint_interval_s": 0,
+    "chunk_workers": 0,
+    "chunk_target_s": 600,
+    "manifest_file": None,
+    "devices": None,
+    "oom_recovery": True,
+    "model_dir": None,
+    "draft_model": None,
+    "repetition_filter": False,
+    "speech_prescan": False,
+    "prescan_min_speech_s": 1.0,
+    "language_cache": False,
+    "cross_file_batching": False,
+    "cross_file_window": 0,
+    "metrics_file": None,
+    "metrics_prom_file": None,
+    "console": "full",
+    "progress_file": None,
+    "progress_interval_s": 2.0,
+    "max_threads": 0,
+    "max_concurrent_decodes": 0,
+    "max_rss_mb": 0
 }
 
 def load_config(config_file: str):
@@ -130,7 +117,7 @@ def parse_args(argv: list[str]):
         prog="local-whisper",
         description="Lokální přepis řeči na text pomocí faster-whisper (GPU/CPU).",
     )
-    parser.add_argument("files", nargs="*", help="Cesty k audio/video souborům")
+    parser.add_argument("files", nargs="*", help="Soubory, složky (rekurzivně) nebo glob vzory v uvozovkách (\"archiv/**/*.mp3\")")
     parser.add_argument(
         "--config",
         default=DEFAULT_CONFIG_FILE,
@@ -156,337 +143,2062 @@ def parse_args(argv: list[str]):
     parser.add_argument("--batched", dest="use_batched_inference", action="store_true", help="Zapnout batched")
     parser.add_argument("--no-batched", dest="use_batched_inference", action="store_false", help="Vypnout batched")
     parser.set_defaults(use_batched_inference=None)
+    parser.add_argument("--cache", dest="use_cache", action="store_true", help="Použít cache přepisů (use_cache)")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false", help="Nepoužívat cache přepisů")
+    parser.add_argument("--refresh", dest="cache_refresh", action="store_true", help="Ignorovat cache a přepsat ji novým výsledkem")
+    parser.set_defaults(use_cache=None, cache_refresh=None)
+    parser.add_argument(
+        "--remote",
+        help="Odeslat soubory běžícímu serveru (server.py), např. http://127.0.0.1:8765 nebo unix:/tmp/local-whisper.sock",
+    )
+    parser.add_argument(
+        "--chunk-workers",
+        dest="chunk_workers",
+        type=int,
+        help="Dlouhé soubory na CPU přepisovat paralelně po úsecích v N procesech (0 = vypnuto)",
+    )
+    parser.add_argument(
+        "--devices",
+        help="Rozdělit soubory mezi sloty zařízení: 'cuda:0,1,2,3', 'cuda' (všechny GPU) nebo 'cpu:4' (4 skupiny jader)",
+    )
+    parser.add_argument(
+        "--draft",
+        dest="draft_model",
+        help="Dvouprůchodový přepis: tento (malý) model přepíše vše, --model jen úseky s nízkou jistotou",
+    )
+    parser.add_argument(
+        "--repetition-filter",
+        dest="repetition_filter",
+        action="store_true",
+        default=None,
+        help="Zahazovat opakující se segmenty a smyčky na proudu, delší smyčky přepsat znovu jen v jejich okně",
+    )
+    parser.add_argument(
+        "--prescan",
+        dest="speech_prescan",
+        choices=["silero", "energy"],
+        help="Před načtením modelu změřit řeč (Silero VAD / energie) a tiché soubory přeskočit s prázdnými výstupy",
+    )
+    parser.add_argument(
+        "--input-list",
+        dest="input_list",
+        help="Soubor se vstupy (jeden na řádek; '-' = stdin) místo dlouhého příkazového řádku",
+    )
+    parser.add_argument(
+        "--manifest",
+        dest="manifest_file",
+        help="SQLite manifest dávky: přeskočí hotové soubory, neúspěšné zkusí znovu s backoffem",
+    )
+    parser.add_argument(
+        "--rescan",
+        action="store_true",
+        help="Znovu projít složky/globy, i když je manifest už zná (najde nové soubory)",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        dest="retry_failed",
+        action="store_true",
+        help="Zkusit neúspěšné soubory hned, bez ohledu na backoff a počet pokusů",
+    )
+    parser.add_argument(
+        "--metrics",
+        dest="metrics_file",
+        help="Zapisovat metriky (JSON řádek na soubor) do zadaného .jsonl",
+    )
+    parser.add_argument(
+        "--console",
+        choices=list(CONSOLE_LEVELS),
+        help="Výpis na konzoli: full (vše vč. segmentů), summary (řádek na soubor), quiet (jen chyby)",
+    )
+    parser.add_argument("-q", "--quiet", dest="console", action="store_const", const="quiet", help="Totéž co --console quiet")
+    parser.add_argument(
+        "--progress",
+        dest="progress_file",
+        help="Události průběhu jako JSON řádky do souboru ('-' = stderr)",
+    )
+    parser.add_argument("--max-threads", dest="max_threads", type=int, help="Rozpočet vláken modelu pro celý běh (0 = bez limitu)")
+    parser.add_argument("--max-decodes", dest="max_concurrent_decodes", type=int, help="Nejvýš souběžných dekódování vstupu (0 = bez limitu)")
+    parser.add_argument("--max-rss-mb", dest="max_rss_mb", type=int, help="Strop rezidentní paměti v MB (0 = bez limitu)")
+    parser.add_argument(
+        "--prefetch",
+        dest="pipeline_prefetch",
+        type=int,
+        help="Kolik dalších souborů dekódovat na pozadí během přepisu (0 = vypnuto)",
+    )
 
     return parser.parse_args(argv)
 
+def cli_overrides(args) -> dict:
+    """Vrátí hodnoty configu zadané na příkazové řádce (jen ty, které jsou zadány)."""
+    overrides = {}
+    if args.model_size:
+        overrides["model_size"] = args.model_size
+    if args.language:
+        overrides["language"] = args.language
+    if args.beam_size is not None:
+        overrides["beam_size"] = args.beam_size
+    if args.best_of is not None:
+        overrides["best_of"] = args.best_of
+    if args.patience is not None:
+        overrides["patience"] = args.patience
+    if args.hotwords:
+        overrides["hotwords"] = args.hotwords
+    if args.hallucination_silence_threshold is not None:
+        overrides["hallucination_silence_threshold"] = args.hallucination_silence_threshold
+    if args.vad_filter is not None:
+        overrides["vad_filter"] = args.vad_filter
+    if args.use_batched_inference is not None:
+        overrides["use_batched_inference"] = args.use_batched_inference
+    if args.pipeline_prefetch is not None:
+        overrides["pipeline_prefetch"] = args.pipeline_prefetch
+    if args.chunk_workers is not None:
+        overrides["chunk_workers"] = args.chunk_workers
+    if args.devices:
+        overrides["devices"] = args.devices
+    if args.draft_model:
+        overrides["draft_model"] = args.draft_model
+    if args.repetition_filter is not None:
+        overrides["repetition_filter"] = args.repetition_filter
+    if args.speech_prescan:
+        overrides["speech_prescan"] = args.speech_prescan
+    if args.manifest_file:
+        overrides["manifest_file"] = args.manifest_file
+    if args.metrics_file:
+        overrides["metrics_file"] = args.metrics_file
+    if args.console:
+        overrides["console"] = args.console
+    if args.progress_file:
+        overrides["progress_file"] = args.progress_file
+    for key in ("max_threads", "max_concurrent_decodes", "max_rss_mb"):
+        if getattr(args, key) is not None:
+            overrides[key] = getattr(args, key)
+    if args.use_cache is not None:
+        overrides["use_cache"] = args.use_cache
+    if args.cache_refresh is not None:
+        overrides["cache_refresh"] = args.cache_refresh
+    return overrides
+
+
+# --- KLIENT PRO SERVER (server.py) ---
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP spojení přes Unix socket."""
+
+    def __init__(self, socket_path: str, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def remote_request(address: str, method: str, path: str, body=None, timeout=None):
+    """Pošle JSON požadavek na server (`http://host:port` nebo `unix:/cesta.sock`)."""
+    if address.startswith("unix:"):
+        conn = _UnixHTTPConnection(address[len("unix:"):], timeout=timeout)
+    else:
+        parsed = urllib.parse.urlsplit(address if "://" in address else f"http://{address}")
+        conn = http.client.HTTPConnection(parsed.hostname or "127.0.0.1", parsed.port or DEFAULT_SERVER_PORT, timeout=timeout)
+
+    try:
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+        conn.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        data = json.loads(response.read() or b"{}")
+    finally:
+        conn.close()
+
+    if response.status >= 400:
+        raise RuntimeError(data.get("error", response.reason))
+    return data
+
+
+def submit_remote(address: str, files: list[str], config_file: str, overrides: dict) -> bool:
+    """Odešle soubory serveru, počká na výsledek a vypíše ho. Vrací True, pokud vše prošlo."""
+    body = {
+        "files": [os.path.abspath(os.path.expanduser(os.path.expandvars(f))) for f in files],
+        "config": os.path.abspath(os.path.expanduser(os.path.expandvars(config_file))),
+        "overrides": overrides,
+        "cwd": os.getcwd(),
+        "wait": True,
+    }
+    print(f"{Fore.CYAN}[REMOTE]{Style.RESET_ALL} Odesílám {len(files)} soubor(ů) na {address}")
+    result = remote_request(address, "POST", "/jobs", body)
+
+    ok = True
+    for job in result.get("jobs", []):
+        if job["status"] == "done":
+            print(f"{Fore.GREEN}[HOTOVO]{Style.RESET_ALL} {job['file']} ({job.get('elapsed', 0):.2f}s)")
+            _print_saved(job.get("outputs", []))
+        else:
+            ok = False
+            print(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} {job['file']}: {job.get('error') or job['status']}")
+    return ok
+
+
 # --- HLAVNÍ LOGIKA ---
-def transcribe_file(audio_path, config, model_cache):
+# Výsledek detekce HW pro (device, compute_type) z configu; zjišťuje se jednou za proces
+_DEVICE_CACHE: dict[tuple, tuple[str, str]] = {}
 
-    # Normalizace cesty (podpora %USERPROFILE%, ~, relativních cest)
-    audio_path = os.path.normpath(os.path.expanduser(os.path.expandvars(audio_path)))
-    
-    if not os.path.exists(audio_path):
-        print(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} Soubor '{audio_path}' nenalezen.")
-        return
 
-    # Příprava výstupní složky
-    output_dir = config.get("output_dir", "transcriptions")
-    os.makedirs(output_dir, exist_ok=True)
-    base_name = os.path.splitext(os.path.basename(audio_path))[0]
+def _cuda_available() -> bool:
+    # 1) ctranslate2 (backend faster-whisper, už je načtený, dotaz je levný)
+    try:
+        import ctranslate2
+        if hasattr(ctranslate2, "get_cuda_device_count"):
+            return ctranslate2.get_cuda_device_count() > 0
+    except Exception:
+        pass
 
-    decoded_audio_path = audio_path
-    decoded_cleanup_path: str | None = None
-    
-    # Detekce zařízení
+    # 2) Fallback: PyTorch (import trvá sekundy, proto jen když ctranslate2 neodpoví)
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except Exception:
+        return False
+
+
+def resolve_device(config) -> tuple[str, str]:
+    """Vrátí dvojici (device, compute_type) podle configu a dostupného HW."""
     device = config.get("device", "auto")
     compute_type = config.get("compute_type", "float16")
-    
-    if device == "auto":
-        cuda_available = False
+    if device != "auto":
+        return device, compute_type
+
+    resolved = _DEVICE_CACHE.get((device, compute_type))
+    if resolved is None:
+        if _cuda_available():
+            resolved = ("cuda", compute_type)
+            echo(f"{Fore.GREEN}[DEVICE]{Style.RESET_ALL} Používám NVIDIA GPU (CUDA).")
+        else:
+            resolved = ("cpu", "int8")
+            echo(f"{Fore.YELLOW}[DEVICE]{Style.RESET_ALL} Používám CPU (přepínám na int8).")
+        _DEVICE_CACHE[(device, compute_type)] = resolved
+    return resolved
+
+
+# --- REGISTR MODELŮ ---
+# Registr: <model_dir>/<název>/ (stažený CTranslate2 model) a <model_dir>/<název>-<compute_type>/
+# (předkonvertované váhy); spravuje models.py
+MODEL_REGISTRY_FILE = "registry.json"
+
+
+def model_root(config) -> str:
+    """Složka registru modelů; bez `model_dir` je to `models/` vedle skriptu (nezávisle na cwd)."""
+    root = config.get("model_dir") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+    return os.path.abspath(os.path.expanduser(os.path.expandvars(root)))
+
+
+def resolve_model(config, compute_type: str) -> dict:
+    """Argumenty pro `WhisperModel` podle registru: nejdřív předkonvertovaná varianta
+    pro `compute_type`, pak stažený model, jinak stažení z Hugging Face do registru.
+    Z registru se načítá bez dotazu na hub (`local_files_only`)."""
+    name = config["model_size"]
+    expanded = os.path.expanduser(os.path.expandvars(name))
+    if os.path.isdir(expanded):
+        return {"model_size_or_path": expanded, "local_files_only": True, "source": "path"}
+
+    root = model_root(config)
+    for path, source in ((os.path.join(root, f"{name}-{compute_type}"), "converted"), (os.path.join(root, name), "registry")):
+        if os.path.isfile(os.path.join(path, "model.bin")):
+            return {"model_size_or_path": path, "local_files_only": True, "source": source}
+    return {"model_size_or_path": name, "download_root": root, "local_files_only": False, "source": "hub"}
+
+
+def load_whisper_model(config, device: str, compute_type: str, **kwargs) -> WhisperModel:
+    """Načte `WhisperModel` přes registr a vypíše dobu načtení."""
+    model_args = resolve_model(config, compute_type)
+    source = model_args.pop("source")
+    start = time.perf_counter()
+    model = WhisperModel(device=device, compute_type=compute_type, **model_args, **kwargs)
+    echo(
+        f"{Fore.CYAN}[INIT]{Style.RESET_ALL} Model '{config['model_size']}' ({compute_type}) načten za "
+        f"{time.perf_counter() - start:.2f}s (zdroj: {source})"
+    )
+    return model
+
+
+class ModelRuntime:
+    """Načtený model a z něj odvozené objekty, sdílené mezi soubory jednoho běhu."""
+
+    def __init__(self, model, device: str, compute_type: str):
+        self.model = model
+        self.device = device
+        self.compute_type = compute_type
+        self._local = threading.local()
+
+    @property
+    def batched(self) -> BatchedInferencePipeline:
+        # Pipeline si během přepisu drží stav (last_speech_timestamp), proto jedna na vlákno
+        pipeline = getattr(self._local, "batched", None)
+        if pipeline is None:
+            pipeline = self._local.batched = BatchedInferencePipeline(model=self.model)
+        return pipeline
+
+
+def get_runtime(config, device: str, compute_type: str, model_cache: dict) -> ModelRuntime:
+    """Vrátí `ModelRuntime` z cache, případně načte model."""
+    model_key = (config.get("model_size"), device, compute_type)
+
+    runtime = model_cache.get(model_key)
+    if runtime is None:
+        with _MODEL_LOCK:
+            runtime = model_cache.get(model_key)
+            if runtime is None:
+                echo(f"{Fore.CYAN}[INIT]{Style.RESET_ALL} Načítám model '{config['model_size']}'...")
+
+                cpu_threads, num_workers = RESOURCE_BUDGET.threads(config.get("cpu_threads", 0), config.get("num_workers", 1))
+                model = load_whisper_model(
+                    config,
+                    device,
+                    compute_type,
+                    device_index=config.get("device_index", 0),
+                    cpu_threads=cpu_threads,
+                    num_workers=num_workers,
+                )
+                runtime = model_cache[model_key] = ModelRuntime(model, device, compute_type)
+                RESOURCE_BUDGET.note_model(model_key, (cpu_threads or _CT2_DEFAULT_THREADS) * num_workers)
+
+    # Konfigurace loggingu (pro cached model taky)
+    if config.get("log_progress", True) and config.get("console", "full") == "full":
+        logger.setLevel(logging.INFO)
+    else:
+        logger.setLevel(logging.WARNING)
+
+    return runtime
+
+
+def get_model(config, device: str, compute_type: str, model_cache: dict):
+    """Vrátí WhisperModel z cache, případně ho načte."""
+    return get_runtime(config, device, compute_type, model_cache).model
+
+
+def build_transcribe_params(config, audio, use_batched: bool) -> dict:
+    """Sestaví argumenty pro `transcribe()` z configu."""
+    transcribe_params = {
+        "audio": audio,
+        "beam_size": config.get("beam_size", 5),
+        "language": config.get("language"),
+        "vad_filter": config.get("vad_filter", True),
+        # Progress bar faster-whisper jen s plným výpisem
+        "log_progress": config.get("log_progress", True) and config.get("console", "full") == "full",
+        "word_timestamps": config.get("word_timestamps", False),
+        "condition_on_previous_text": config.get("condition_on_previous_text", True),
+    }
+
+    # Další podporované parametry (pokud jsou v configu), pro vyšší kvalitu / kontrolu
+    passthrough_keys = {
+        "task",
+        "best_of",
+        "patience",
+        "length_penalty",
+        "prompt_reset_on_temperature",
+        "initial_prompt",
+        "prefix",
+        "suppress_blank",
+        "suppress_tokens",
+        "without_timestamps",
+        "max_initial_timestamp",
+        "prepend_punctuations",
+        "append_punctuations",
+        "max_new_tokens",
+        "chunk_length",
+        "clip_timestamps",
+        "hallucination_silence_threshold",
+        "hotwords",
+        "language_detection_threshold",
+        "language_detection_segments",
+        "multilingual",
+    }
+    for key in passthrough_keys:
+        if key in config and config[key] is not None and key not in transcribe_params:
+            transcribe_params[key] = config[key]
+
+    # Přidat VAD parametry pouze pokud je VAD zapnutý
+    if config.get("vad_filter", True):
+        # Umožnit plné přepsání vad_parameters z configu (dict nebo VadOptions)
+        if "vad_parameters" in config and config["vad_parameters"] is not None:
+            transcribe_params["vad_parameters"] = config["vad_parameters"]
+        else:
+            transcribe_params["vad_parameters"] = dict(
+                min_silence_duration_ms=config.get("min_silence_duration_ms", 500)
+            )
+
+    # Přidat initial_prompt pokud je nastaven
+    initial_prompt = (config.get("initial_prompt") or "").strip()
+    if initial_prompt and "initial_prompt" not in transcribe_params:
+        transcribe_params["initial_prompt"] = initial_prompt
+        echo(f"{Fore.YELLOW}[PROMPT]{Style.RESET_ALL} Použit initial prompt pro zlepšení kvality")
+
+    # Přidat temperature fallback pro zvýšení spolehlivosti
+    if "temperature" in config:
+        transcribe_params["temperature"] = config["temperature"]
+
+    # Pokročilé parametry kvality
+    if "compression_ratio_threshold" in config:
+        transcribe_params["compression_ratio_threshold"] = config["compression_ratio_threshold"]
+    if "log_prob_threshold" in config:
+        transcribe_params["log_prob_threshold"] = config["log_prob_threshold"]
+    if "no_speech_threshold" in config:
+        transcribe_params["no_speech_threshold"] = config["no_speech_threshold"]
+
+    # Repetition control
+    if config.get("repetition_penalty", 1.0) != 1.0:
+        transcribe_params["repetition_penalty"] = config["repetition_penalty"]
+    if config.get("no_repeat_ngram_size", 0) > 0:
+        transcribe_params["no_repeat_ngram_size"] = config["no_repeat_ngram_size"]
+
+    # Batch size pro batched inference
+    if use_batched:
+        transcribe_params["batch_size"] = config.get("batch_size", 16)
+
+    return transcribe_params
+
+
+# --- CACHE JAZYKA ---
+# Skupina (složka vstupu nebo `language_cache_group`) -> (jazyk, pravděpodobnost)
+_LANGUAGE_CACHE: dict[str, tuple[str, float]] = {}
+
+
+def language_group(audio_path: str, config) -> str | None:
+    """Klíč skupiny se společným jazykem, nebo None (cache jazyka vypnutá / jazyk zadaný)."""
+    if not config.get("language_cache", False) or config.get("language"):
+        return None
+    group = config.get("language_cache_group") or "dir"
+    return f"dir:{os.path.dirname(os.path.abspath(audio_path))}" if group == "dir" else f"group:{group}"
+
+
+def _language_suspicious(head: list, config) -> bool:
+    """Vypadají první segmenty s převzatým jazykem špatně (nízká průměrná log-pravděpodobnost)?"""
+    if not head:
+        return False
+    threshold = float(config.get("language_recheck_logprob", -1.0))
+    return sum(s.avg_logprob for s in head) / len(head) < threshold
+
+
+# --- CHECKPOINTY DLOUHÝCH PŘEPISŮ ---
+class TranscriptionCheckpoint:
+    """Průběžné ukládání hotových segmentů do sidecar souboru (`<název>.checkpoint.jsonl`).
+
+    První řádek je hlavička s klíčem běhu (obsah vstupu + parametry), další řádky
+    obsahují dávky segmentů, audio offset (konec posledního segmentu) a text
+    předchozího segmentu pro navázání kontextu. Zápis je append-only, takže po pádu
+    se nanejvýš zahodí poslední neúplný řádek. Při každém checkpointu se flushnou
+    i průběžně zapisované výstupy (`<název>.partial.*`), takže je lze sledovat přes `tail -f`.
+    """
+
+    def __init__(self, output_dir: str, base_name: str, key: str, interval_s: float):
+        self.path = os.path.join(output_dir, f"{base_name}.checkpoint.jsonl")
+        self.key = key
+        self.interval_s = interval_s
+        self.pending = []
+        self.last_flush = time.time()
+        self.file = None
+        self.sink = None
+
+    def load(self):
+        """Vrátí (segments, offset, prompt, language) z předchozího běhu, nebo None."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return None
 
-        # 1) Preferovat PyTorch detekci (když je nainstalovaný)
         try:
-            import torch
-            cuda_available = torch.cuda.is_available()
-        except Exception:
-            cuda_available = False
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            return None
+        if header.get("key") != self.key:
+            return None
 
-        # 2) Fallback: ctranslate2 detekce (faster-whisper backend)
-        if not cuda_available:
+        # Navázané segmenty jdou i do cache, proto se všemi poli
+        segments, offset, prompt = SegmentStore(detail=True), 0.0, None
+        for line in lines[1:]:
             try:
-                import ctranslate2
-                if hasattr(ctranslate2, "get_cuda_device_count"):
-                    cuda_available = ctranslate2.get_cuda_device_count() > 0
-            except Exception:
-                cuda_available = False
-
-        if cuda_available:
-            device = "cuda"
-            print(f"{Fore.GREEN}[DEVICE]{Style.RESET_ALL} Používám NVIDIA GPU (CUDA).")
-        else:
-            device = "cpu"
-            compute_type = "int8"
-            print(f"{Fore.YELLOW}[DEVICE]{Style.RESET_ALL} Používám CPU (přepínám na int8).")
+                record = json.loads(line)
+            except ValueError:
+                break  # neúplný poslední řádek po pádu
+            segments.extend(_segment_from_dict(d) for d in record["segments"])
+            offset = record["offset"]
+            prompt = record.get("prompt")
+        if not segments:
+            return None
+        return segments, offset, prompt, header.get("language")
+
+    def start(self, language: str, resumed: list, sink=None):
+        """Otevře sidecar (při navázání ho přepíše jedním záznamem, bez případného neúplného řádku)."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"key": self.key, "language": language}) + "\n")
+            if resumed:
+                f.write(json.dumps(self._record(resumed), ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.sink = sink
+
+    def _record(self, segments: list) -> dict:
+        return {
+            "offset": segments[-1].end,
+            "prompt": segments[-1].text.strip(),
+            "segments": [_segment_to_dict(s) for s in segments],
+        }
+
+    def add(self, segment):
+        self.pending.append(segment)
+        if time.time() - self.last_flush >= self.interval_s:
+            self.flush()
+
+    def flush(self):
+        if self.pending and self.file is not None:
+            self.file.write(json.dumps(self._record(self.pending), ensure_ascii=False) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = []
+            if self.sink is not None:
+                self.sink.flush()
+        self.last_flush = time.time()
+
+    def close(self):
+        """Uloží rozpracované segmenty (např. po chybě) a zavře sidecar; ten zůstává pro resume."""
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.sink = None
+
+    def finish(self):
+        """Po úspěšném exportu smaže sidecar."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
 
+def _prepend_segments(head: list, segments):
+    """Segmenty z `head`, pak zbytek generátoru; na rozdíl od chain() jde zavřít (restart po OOM)."""
     try:
-        # Dekódování formátů jako .m4a (bez systémového ffmpeg se použije imageio-ffmpeg)
-        decoded_audio_path, decoded_cleanup_path = _maybe_decode_to_wav(audio_path, output_dir)
-        if decoded_cleanup_path:
-            print(f"{Fore.CYAN}[DECODE]{Style.RESET_ALL} Vstup '{os.path.basename(audio_path)}' → dočasný WAV pro přepis")
+        yield from head
+        yield from segments
+    finally:
+        if hasattr(segments, "close"):
+            segments.close()
 
-        model_key = (config.get("model_size"), device, compute_type)
 
-        if model_key in model_cache:
-            model = model_cache[model_key]
-        else:
-            print(f"{Fore.CYAN}[INIT]{Style.RESET_ALL} Načítám model '{config['model_size']}'...")
+def _shift_segment(segment, offset: float, id_offset: int):
+    """Posune časy segmentu (a slov) o `offset` sekund a přečísluje ho."""
+    words = [
+        dataclasses.replace(w, start=round(w.start + offset, 3), end=round(w.end + offset, 3))
+        for w in segment.words
+    ] if segment.words else segment.words
+    return dataclasses.replace(
+        segment,
+        id=segment.id + id_offset,
+        start=round(segment.start + offset, 3),
+        end=round(segment.end + offset, 3),
+        words=words,
+    )
 
-            # Konfigurace loggingu
-            if config.get("log_progress", True):
-                logger.setLevel(logging.INFO)
-            else:
-                logger.setLevel(logging.WARNING)
 
-            model = WhisperModel(
-                config['model_size'],
-                device=device,
-                compute_type=compute_type,
-                download_root=os.path.join(os.getcwd(), "models")
+# --- PARALELNÍ PŘEPIS DLOUHÝCH SOUBORŮ (CPU) ---
+# Model ve worker procesu (každý proces má vlastní instanci)
+_CHUNK_MODEL = None
+
+
+def _chunk_worker_init(config: dict, compute_type: str, cpu_threads: int, num_workers: int):
+    global _CHUNK_MODEL
+    set_console_mode(config)
+    _CHUNK_MODEL = load_whisper_model(config, "cpu", compute_type, cpu_threads=cpu_threads, num_workers=num_workers)
+
+
+def _chunk_worker_detect_language(audio: np.ndarray, params: dict):
+    language, probability, _ = _CHUNK_MODEL.detect_language(
+        audio,
+        language_detection_segments=params.get("language_detection_segments", 1),
+        language_detection_threshold=params.get("language_detection_threshold", 0.5),
+    )
+    return language, probability
+
+
+def _chunk_worker_transcribe(audio: np.ndarray, params: dict, use_batched: bool) -> "SegmentStore":
+    transcribe_func = BatchedInferencePipeline(model=_CHUNK_MODEL).transcribe if use_batched else _CHUNK_MODEL.transcribe
+    segments, _ = transcribe_func(audio=audio, **params)
+    # Sloupce místo seznamu objektů: menší pickle a paměť, než hlavní proces úsek zpracuje
+    # (všechna pole, segmenty dál jdou do cache a metrik stejně jako bez chunk_workers)
+    store = SegmentStore(detail=True)
+    store.extend(segments)
+    return store
+
+
+def split_at_silences(audio: np.ndarray, target_s: float, vad_parameters=None) -> tuple[list[tuple[int, int]], int]:
+    """Rozdělí audio na úseky o délce zhruba `target_s` řezem uprostřed tichých mezer (Silero VAD).
+
+    Vrací hranice úseků ve vzorcích a celkový počet vzorků s řečí.
+    """
+    options = VadOptions(**vad_parameters) if isinstance(vad_parameters, dict) else (vad_parameters or VadOptions())
+    speech = get_speech_timestamps(audio, options)
+    target = int(target_s * PCM_SAMPLE_RATE)
+
+    bounds = []
+    chunk_start = 0
+    for current, following in zip(speech, speech[1:]):
+        if current["end"] - chunk_start >= target:
+            cut = (current["end"] + following["start"]) // 2
+            bounds.append((chunk_start, cut))
+            chunk_start = cut
+    bounds.append((chunk_start, audio.shape[0]))
+    return bounds, sum(s["end"] - s["start"] for s in speech)
+
+
+def _chunk_pool(config, compute_type: str, model_cache: dict, workers: int) -> ProcessPoolExecutor:
+    """Vrátí (a nacachuje) pool worker procesů s načteným modelem."""
+    if RESOURCE_BUDGET.max_threads:
+        workers = min(workers, RESOURCE_BUDGET.max_threads)
+    cpu_threads = int(config.get("chunk_cpu_threads") or max(1, (os.cpu_count() or 1) // workers))
+    num_workers = int(config.get("chunk_num_workers", 1))
+    if RESOURCE_BUDGET.max_threads:
+        # Rozpočet vláken se dělí mezi procesy
+        cpu_threads, num_workers = RESOURCE_BUDGET.threads(cpu_threads, num_workers)
+        cpu_threads = max(1, min(cpu_threads, RESOURCE_BUDGET.max_threads // (workers * num_workers)))
+    pool_key = ("chunk_pool", config.get("model_size"), compute_type, workers, cpu_threads, num_workers)
+
+    with _MODEL_LOCK:
+        pool = model_cache.get(pool_key)
+        if pool is None:
+            echo(
+                f"{Fore.CYAN}[INIT]{Style.RESET_ALL} Spouštím {workers} worker procesů "
+                f"(cpu_threads={cpu_threads}, num_workers={num_workers}) s modelem '{config['model_size']}'..."
+            )
+            # spawn: CTranslate2 vlákna a fork se nesnáší
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_chunk_worker_init,
+                initargs=(config, compute_type, cpu_threads, num_workers),
             )
-            model_cache[model_key] = model
+            model_cache[pool_key] = pool
+            RESOURCE_BUDGET.note_model(pool_key, workers * cpu_threads * num_workers)
+    return pool
+
+
+def transcribe_chunked(audio: np.ndarray, config, compute_type: str, model_cache: dict, use_batched: bool, **params):
+    """Přepis jednoho dlouhého souboru paralelně po úsecích v procesech.
+
+    Úseky se řežou v tichu, každý přepíše jiný worker a segmenty se poskládají
+    zpět v pořadí s globálními časy a souvislým číslováním. Vrací (generátor, info)
+    jako `WhisperModel.transcribe`.
+    """
+    workers = int(config.get("chunk_workers", 0))
+    pool = _chunk_pool(config, compute_type, model_cache, workers)
+    bounds, speech_samples = split_at_silences(audio, float(config.get("chunk_target_s", 600)), params.get("vad_parameters"))
+    echo(f"{Fore.MAGENTA}[CHUNKS]{Style.RESET_ALL} {len(bounds)} úseků po ~{float(config.get('chunk_target_s', 600)):.0f}s na {workers} procesech")
+
+    # Jazyk se určí jednou (z prvního úseku), aby všechny úseky mluvily stejně
+    language, language_probability = params.get("language"), 1.0
+    if language is None:
+        start, end = bounds[0]
+        language, language_probability = pool.submit(_chunk_worker_detect_language, audio[start:end], params).result()
+    params = {**params, "language": language, "log_progress": False}
+
+    futures = [
+        (start / PCM_SAMPLE_RATE, pool.submit(_chunk_worker_transcribe, audio[start:end], params, use_batched))
+        for start, end in bounds
+    ]
+    duration = audio.shape[0] / PCM_SAMPLE_RATE
+    info = SimpleNamespace(
+        language=language,
+        language_probability=language_probability,
+        duration=duration,
+        duration_after_vad=speech_samples / PCM_SAMPLE_RATE if params.get("vad_filter", True) else duration,
+    )
+
+    def segments():
+        count = 0
+        try:
+            for offset, future in futures:
+                chunk_segments = future.result()
+                for segment in chunk_segments:
+                    count += 1
+                    yield _shift_segment(segment, offset, count - segment.id)
+        finally:
+            for _, future in futures:
+                future.cancel()
+
+    return segments(), info
+
+
+class _BatchJob:
+    """Úseky jednoho souboru čekající na sdílené dávky; výsledky se skládají zpět v pořadí."""
+
+    def __init__(self, batcher, features, tokenizer, chunks_metadata, options):
+        self.batcher = batcher
+        self.features = features
+        self.tokenizer = tokenizer
+        self.chunks_metadata = chunks_metadata
+        self.options = options
+        self.results = [None] * len(features)
+        self.remaining = len(features)
+        self.error = None
+        # Stav heuristiky slovních časů (pipeline.last_speech_timestamp) patří jen tomuto souboru
+        self.last_speech_timestamp = 0.0
+
+    @property
+    def key(self) -> tuple:
+        # Do jedné dávky smí jen úseky se stejným promptem (jazyk, úloha, initial_prompt);
+        # se slovními časy jen úseky jednoho souboru, forward() vede last_speech_timestamp přes celou dávku
+        return (
+            self.tokenizer.language_code,
+            self.tokenizer.task,
+            self.options.initial_prompt,
+            self if self.options.word_timestamps else None,
+        )
+
+    @property
+    def done(self) -> bool:
+        return self.remaining == 0 or self.error is not None
+
+    def segments(self):
+        """Počká na všechny úseky souboru a vydá segmenty jako `_batched_segments_generator`."""
+        self.batcher.wait(self)
+        if self.error is not None:
+            raise self.error
+
+        seg_idx = 0
+        for result in self.results:
+            for segment in result:
+                seg_idx += 1
+                yield Segment(
+                    seek=segment["seek"],
+                    id=seg_idx,
+                    text=segment["text"],
+                    start=round(segment["start"], 3),
+                    end=round(segment["end"], 3),
+                    words=None if not self.options.word_timestamps else [Word(**word) for word in segment["words"]],
+                    tokens=segment["tokens"],
+                    avg_logprob=segment["avg_logprob"],
+                    no_speech_prob=segment["no_speech_prob"],
+                    compression_ratio=segment["compression_ratio"],
+                    temperature=self.options.temperatures[0],
+                )
+
+
+# Neveřejné části BatchedInferencePipeline, na které CrossFileBatcher navazuje, a verze
+# faster-whisper, se kterými je to ověřené; jinde se sdílené dávky vypnou
+_CROSS_FILE_FW_VERSIONS = ("1.2.",)
+_CROSS_FILE_FW_HOOKS = {
+    "_batched_segments_generator": ["self", "features", "tokenizer", "chunks_metadata", "batch_size", "options", "log_progress"],
+    "forward": ["self", "features", "tokenizer", "chunks_metadata", "options"],
+}
+
+
+def cross_file_unsupported() -> str | None:
+    """Proč sdílené dávky s nainstalovaným faster-whisper nepoběží (None = v pořádku)."""
+    version = getattr(faster_whisper, "__version__", "?")
+    base = _DeferredPipeline.__bases__[0]
+    if not version.startswith(_CROSS_FILE_FW_VERSIONS):
+        return f"faster-whisper {version} není ověřená verze ({', '.join(v + 'x' for v in _CROSS_FILE_FW_VERSIONS)})"
+    for name, params in _CROSS_FILE_FW_HOOKS.items():
+        method = getattr(base, name, None)
+        if method is None or list(inspect.signature(method).parameters) != params:
+            return f"faster-whisper {version} má jiné BatchedInferencePipeline.{name}"
+    if not hasattr(base(None), "last_speech_timestamp"):
+        return f"faster-whisper {version} nemá BatchedInferencePipeline.last_speech_timestamp"
+    return None
+
+
+class _DeferredPipeline(BatchedInferencePipeline):
+    """`BatchedInferencePipeline`, jehož `transcribe()` udělá VAD, příznaky a detekci jazyka,
+    ale samotnou inferenci jen zařadí do sdílených dávek `CrossFileBatcher`.
+
+    Přepisuje neveřejné `_batched_segments_generator` a volá `forward`; podporované
+    verze hlídá `cross_file_unsupported()`.
+    """
+
+    def __init__(self, model, batcher):
+        super().__init__(model=model)
+        self.batcher = batcher
+
+    def _batched_segments_generator(self, features, tokenizer, chunks_metadata, batch_size, options, log_progress):
+        return self.batcher.add(features, tokenizer, chunks_metadata, options).segments()
+
+
+class CrossFileBatcher:
+    """Skládá VAD úseky z více souborů do společných dávek o velikosti `batch_size`.
+
+    Každý soubor běží ve vlastním vlákně přes `transcribe_file`; jeho úseky se zařadí
+    do fronty a vlákno čeká na výsledky. Plná dávka se spustí hned, neúplná až ve
+    chvíli, kdy všechna živá vlákna čekají (další úseky už nepřibudou).
+    """
+
+    def __init__(self, runtime: ModelRuntime, batch_size: int):
+        self.runtime = runtime
+        self.batch_size = max(1, batch_size)
+        self.pipeline = _DeferredPipeline(runtime.model, self)
+        self.groups: dict[tuple, deque] = {}
+        self.changed = threading.Condition()
+        self.live = 0
+        self.waiting = 0
+        self.closed = False
+        self.batches = 0
+        self.chunks = 0
+        self._thread = threading.Thread(target=self._run, name="cross-file-batcher", daemon=True)
+        self._thread.start()
+
+    def enter(self):
+        with self.changed:
+            self.live += 1
+
+    def exit(self):
+        with self.changed:
+            self.live -= 1
+            self.changed.notify_all()
+
+    def add(self, features, tokenizer, chunks_metadata, options) -> _BatchJob:
+        job = _BatchJob(self, features, tokenizer, chunks_metadata, options)
+        with self.changed:
+            self.groups.setdefault(job.key, deque()).extend((job, i) for i in range(len(features)))
+            self.changed.notify_all()
+        return job
+
+    def wait(self, job: _BatchJob):
+        # Vlákno čekající na dávku nebrání backpressure paměti (jinak by dekódování dalšího
+        # souboru čekalo na dávku a dávka na jeho úseky)
+        with RESOURCE_BUDGET.waiting(), self.changed:
+            self.waiting += 1
+            self.changed.notify_all()
+            try:
+                while not job.done:
+                    self.changed.wait()
+            finally:
+                self.waiting -= 1
+
+    def close(self):
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+        self._thread.join()
+
+    def _next_batch(self):
+        """Vybere další dávku (volá se pod zámkem); None = konec."""
+        while True:
+            for items in self.groups.values():
+                # Úseky souborů, které už selhaly, se přeskočí
+                while items and items[0][0].error is not None:
+                    items.popleft()
+            pending = [items for items in self.groups.values() if items]
+
+            full = next((items for items in pending if len(items) >= self.batch_size), None)
+            if full is None and pending and self.waiting >= self.live:
+                # Všichni čekají, další úseky už nepřibudou: pustit i neúplnou dávku
+                full = pending[0]
+            if full is not None:
+                return [full.popleft() for _ in range(min(self.batch_size, len(full)))]
+            if self.closed:
+                return None
+            self.changed.wait()
 
-        # Konfigurace loggingu (pro cached model taky)
-        if config.get("log_progress", True):
-            logger.setLevel(logging.INFO)
+    def _run(self):
+        while True:
+            with self.changed:
+                batch = self._next_batch()
+            if batch is None:
+                return
+
+            first_job = batch[0][0]
+            error = None
+            try:
+                # Sdílená pipeline: stav slovních časů se před dávkou nastaví z jejího souboru a zase uloží
+                self.pipeline.last_speech_timestamp = first_job.last_speech_timestamp
+                results = self.pipeline.forward(
+                    np.stack([job.features[i] for job, i in batch]),
+                    first_job.tokenizer,
+                    [job.chunks_metadata[i] for job, i in batch],
+                    first_job.options,
+                )
+                first_job.last_speech_timestamp = self.pipeline.last_speech_timestamp
+            except Exception as e:
+                results, error = [None] * len(batch), e
+
+            with self.changed:
+                self.batches += 1
+                self.chunks += len(batch)
+                for (job, i), result in zip(batch, results):
+                    if error is not None:
+                        job.error = error
+                    else:
+                        job.results[i] = result
+                        job.remaining -= 1
+                self.changed.notify_all()
+
+
+# --- DVOUPRŮCHODOVÝ PŘEPIS (NÁVRH + ZPŘESNĚNÍ) ---
+# Parametry přepisu velkým modelem, které se do zpřesnění úseků nepřenáší
+_REFINE_SKIP_PARAMS = ("audio", "batch_size", "vad_filter", "vad_parameters", "clip_timestamps", "log_progress", "initial_prompt")
+
+
+def _draft_key(config) -> tuple:
+    """Část klíče cache pro dvouprůchodový režim (prázdná, když je vypnutý)."""
+    if not config.get("draft_model"):
+        return ()
+    return (
+        "draft",
+        config["draft_model"],
+        config.get("draft_beam_size", 1),
+        config.get("refine_logprob_threshold", -0.7),
+        config.get("refine_compression_ratio", 2.2),
+        config.get("refine_no_speech_prob", 0.6),
+        config.get("refine_padding_s", 0.5),
+    )
+
+
+def _refine_reasons(segment, config) -> list[str]:
+    """Proč segment z návrhu nestačí (prázdný seznam = ponechat)."""
+    reasons = []
+    if segment.avg_logprob < float(config.get("refine_logprob_threshold", -0.7)):
+        reasons.append("avg_logprob")
+    if segment.compression_ratio > float(config.get("refine_compression_ratio", 2.2)):
+        reasons.append("compression_ratio")
+    if segment.no_speech_prob > float(config.get("refine_no_speech_prob", 0.6)):
+        reasons.append("no_speech_prob")
+    return reasons
+
+
+def refine_spans(draft: list, duration: float, config) -> list[dict]:
+    """Sloučí po sobě jdoucí nejisté segmenty návrhu do úseků pro velký model.
+
+    Úsek se rozšíří o `refine_padding_s`, nejvýš ale k sousedním jistým segmentům,
+    aby velký model zachytil i slova, která návrh na hranici useknul.
+    """
+    padding = float(config.get("refine_padding_s", 0.5))
+    spans = []
+    for index, segment in enumerate(draft):
+        reasons = _refine_reasons(segment, config)
+        if not reasons:
+            continue
+        if spans and spans[-1]["last"] == index - 1:
+            spans[-1]["last"] = index
+            spans[-1]["reasons"] = sorted(set(spans[-1]["reasons"]) | set(reasons))
         else:
-            logger.setLevel(logging.WARNING)
+            spans.append({"first": index, "last": index, "reasons": reasons})
 
-        print(f"{Fore.CYAN}[START]{Style.RESET_ALL} Začínám přepis: {audio_path}")
-        start_time = time.time()
+    for span in spans:
+        first, last = draft[span["first"]], draft[span["last"]]
+        before = draft[span["first"] - 1].end if span["first"] > 0 else 0.0
+        after = draft[span["last"] + 1].start if span["last"] + 1 < len(draft) else duration
+        span["start"] = round(max(before, first.start - padding), 3)
+        span["end"] = round(min(after, last.end + padding), 3)
+    return spans
+
+
+def transcribe_two_pass(audio, config, draft: ModelRuntime, runtime: ModelRuntime, use_batched: bool, **params):
+    """Dvouprůchodový přepis: malý model (`draft_model`) přepíše celý soubor, velký
+    znovu jen úseky s nízkou jistotou (`clip_timestamps`) a segmenty se spojí.
+
+    Návrh proběhne hned celý (úseky musí být známé před hlavičkou výstupů),
+    zpřesnění běží líně v generátoru. Vrací (generátor, info) s `refined_spans`.
+    """
+    audio = decode_pcm(audio)
+
+    # Návrh: greedy bez teplotního fallbacku, nejisté segmenty stejně dostane velký model
+    draft_params = {k: v for k, v in params.items() if k not in ("best_of", "patience")}
+    draft_params.update(beam_size=int(config.get("draft_beam_size", 1)), temperature=0.0)
+    draft_func = draft.batched.transcribe if use_batched else draft.model.transcribe
+    draft_start = time.perf_counter()
+    draft_segments, info = draft_func(audio=audio, **draft_params)
+    draft_segments = list(draft_segments)
+
+    spans = refine_spans(draft_segments, info.duration, config)
+    refined_s = sum(span["end"] - span["start"] for span in spans)
+    echo(
+        f"{Fore.MAGENTA}[DRAFT]{Style.RESET_ALL} Návrh '{config['draft_model']}': {len(draft_segments)} segmentů "
+        f"za {time.perf_counter() - draft_start:.2f}s, velký model přepíše {len(spans)} úseků "
+        f"({refined_s:.1f}s z {info.duration:.1f}s)"
+    )
+    info = SimpleNamespace(**{
+        **_info_to_dict(info),
+        "refined_spans": [
+            {
+                "start": span["start"],
+                "end": span["end"],
+                "reasons": span["reasons"],
+                "draft_text": " ".join(s.text.strip() for s in draft_segments[span["first"]:span["last"] + 1]),
+            }
+            for span in spans
+        ],
+    })
+
+    refine_params = {k: v for k, v in params.items() if k not in _REFINE_SKIP_PARAMS}
+    refine_params.update(language=info.language, vad_filter=False, log_progress=False)
+    condition = refine_params.get("condition_on_previous_text", True)
+
+    def segments():
+        count = 0
+        index = 0
+        for span in spans + [None]:
+            stop = span["first"] if span is not None else len(draft_segments)
+            for segment in draft_segments[index:stop]:
+                count += 1
+                yield dataclasses.replace(segment, id=count)
+            if span is None:
+                break
+
+            # Kontext pro velký model: poslední jistý segment před úsekem
+            prompt = params.get("initial_prompt")
+            if condition and span["first"] > 0:
+                prompt = draft_segments[span["first"] - 1].text.strip()
+            refined, _ = runtime.model.transcribe(
+                audio, clip_timestamps=[span["start"], span["end"]], initial_prompt=prompt, **refine_params
+            )
+            for segment in refined:
+                count += 1
+                yield dataclasses.replace(segment, id=count)
+            index = span["last"] + 1
+
+    return segments(), info
+
+
+# --- FILTR OPAKOVÁNÍ A SMYČEK ---
+_WORD_RE = re.compile(r"\w+")
+_HASH_BASE = 1_000_003
+_HASH_MOD = (1 << 61) - 1
+
+
+def _repetition_key(config) -> tuple:
+    """Část klíče cache pro filtr opakování (prázdná, když je vypnutý)."""
+    if not config.get("repetition_filter"):
+        return ()
+    return (
+        "repetition",
+        config.get("repetition_ngram", 4),
+        config.get("repetition_window", 300),
+        config.get("repetition_overlap", 0.8),
+        config.get("repetition_max_repeats", 2),
+        config.get("repetition_redecode_s", 10.0),
+        config.get("repetition_min_words", 3),
+    )
+
+
+class RepetitionFilter:
+    """Streamový filtr smyček nad generátorem segmentů.
+
+    Posledních `repetition_window` slov se drží jako rolling hash n-gramů s počty,
+    takže test i posun okna stojí O(1) na slovo. Segment se zahodí, když jeho
+    n-gramy už z většiny (`repetition_overlap`) v okně jsou, nebo když stejný text
+    přijde víc než `repetition_max_repeats`× po sobě. Segmenty kratší než
+    `repetition_min_words` slov se nezahazují nikdy (opakované „Ano.“, počítání),
+    do okna ale vstupují. Zahozený úsek delší než
+    `repetition_redecode_s` se přepíše znovu (jen to okno, bez kontextu předchozího
+    textu a s vyšší teplotou); zahozené segmenty do okna nevstupují.
+    """
+
+    def __init__(self, config, model=None, params=None):
+        self.n = max(1, int(config.get("repetition_ngram", 4)))
+        self.window = int(config.get("repetition_window", 300))
+        self.overlap = float(config.get("repetition_overlap", 0.8))
+        self.max_repeats = int(config.get("repetition_max_repeats", 2))
+        self.min_words = int(config.get("repetition_min_words", 3))
+        self.redecode_s = float(config.get("repetition_redecode_s", 10.0) or 0)
+        self.temperature = config.get("repetition_redecode_temperature", [0.2, 0.4, 0.6, 0.8])
+        self.model = model
+        self.params = params
+        self.grams = deque()  # hashe n-gramů v okně, nejstarší vlevo
+        self.counts = {}  # hash n-gramu → počet v okně
+        self.recent = deque()  # hashe posledních n slov (rolling hash)
+        self.rolling = 0
+        self.power = pow(_HASH_BASE, self.n - 1, _HASH_MOD)
+        self.last_text = None
+        self.text_run = 0
+        self.dropped = 0
+        self.redecoded_s = 0.0
+        self._audio = None
+
+    def _scan(self, words: list[int]):
+        """n-gramy segmentu navazující na okno; stav okna se nemění."""
+        recent, rolling, grams = deque(self.recent), self.rolling, []
+        for word in words:
+            if len(recent) == self.n:
+                rolling = (rolling - recent.popleft() * self.power) % _HASH_MOD
+            rolling = (rolling * _HASH_BASE + word) % _HASH_MOD
+            recent.append(word)
+            if len(recent) == self.n:
+                grams.append(rolling)
+        return grams, recent, rolling
+
+    def check(self, segment) -> bool:
+        """True = segment ponechat (a započítat do okna)."""
+        text = " ".join(_WORD_RE.findall(segment.text.lower()))
+        if not text:
+            return True
+        words = [hash(word) for word in text.split()]
+        grams, recent, rolling = self._scan(words)
+
+        text_run = self.text_run + 1 if text == self.last_text else 1
+        # Krátké repliky („Ano.“, počítání) se opakují i v běžné řeči, za smyčku se nepovažují
+        if len(words) >= self.min_words:
+            if self.max_repeats and text_run > self.max_repeats:
+                return False
+            if len(words) >= self.n and grams:
+                seen = set()
+                repeated = 0
+                for gram in grams:
+                    repeated += gram in self.counts or gram in seen
+                    seen.add(gram)
+                if repeated >= self.overlap * len(grams):
+                    return False
+
+        self.last_text, self.text_run = text, text_run
+        self.recent, self.rolling = recent, rolling
+        for gram in grams:
+            self.grams.append(gram)
+            self.counts[gram] = self.counts.get(gram, 0) + 1
+            if len(self.grams) > self.window:
+                old = self.grams.popleft()
+                if self.counts[old] == 1:
+                    del self.counts[old]
+                else:
+                    self.counts[old] -= 1
+        return True
+
+    def _redecode(self, start: float, end: float):
+        """Znovu přepíše jen okno [start, end] a vrátí segmenty, které filtrem projdou."""
+        audio = self.params["audio"]
+        if not isinstance(audio, np.ndarray):
+            if self._audio is None or self._audio[0] != audio:
+                self._audio = (audio, decode_pcm(audio))
+            audio = self._audio[1]
+        params = {k: v for k, v in self.params.items() if k not in _REFINE_SKIP_PARAMS}
+        params.update(
+            vad_filter=False,
+            log_progress=False,
+            condition_on_previous_text=False,
+            temperature=self.temperature,
+        )
+        echo(
+            f"{Fore.YELLOW}[OPAKOVÁNÍ]{Style.RESET_ALL} Smyčka {format_timestamp_srt(start)} → "
+            f"{format_timestamp_srt(end)}, přepisuji jen toto okno"
+        )
+        self.redecoded_s += end - start
+        segments, _ = self.model.transcribe(audio, clip_timestamps=[start, end], **params)
+        return [segment for segment in segments if self.check(segment)]
+
+    def filter(self, segments):
+        """Obalí generátor segmentů; segmenty přečísluje od 1 (jako model)."""
+        count = 0
+        dropped_span = None
+        try:
+            for segment in chain(segments, [None]):
+                if segment is not None and not self.check(segment):
+                    self.dropped += 1
+                    dropped_span = (dropped_span[0] if dropped_span else segment.start, segment.end)
+                    continue
+
+                if dropped_span is not None:
+                    start, end = dropped_span
+                    dropped_span = None
+                    if self.model is not None and self.redecode_s and end - start >= self.redecode_s:
+                        for redecoded in self._redecode(start, end):
+                            count += 1
+                            yield dataclasses.replace(redecoded, id=count)
+                if segment is None:
+                    break
+                count += 1
+                yield dataclasses.replace(segment, id=count) if segment.id != count else segment
+        finally:
+            if hasattr(segments, "close"):
+                segments.close()
+
+
+# --- PŘEDBĚŽNÁ KONTROLA ŘEČI ---
+
+def detect_speech_seconds(audio: np.ndarray, config) -> float:
+    """Kolik sekund řeči audio obsahuje: Silero VAD (`speech_prescan: "silero"`) nebo energie rámců (`"energy"`)."""
+    if config.get("speech_prescan") == "energy":
+        # 30ms rámce, řeč = RMS nad prahem v dBFS
+        frame = int(0.03 * PCM_SAMPLE_RATE)
+        count = audio.shape[0] // frame
+        if count == 0:
+            return 0.0
+        frames = np.asarray(audio[: count * frame], dtype=np.float32).reshape(count, frame)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        threshold = 10 ** (float(config.get("prescan_energy_db", -45)) / 20)
+        return float(np.count_nonzero(rms > threshold)) * frame / PCM_SAMPLE_RATE
+
+    vad_parameters = config.get("vad_parameters")
+    options = VadOptions(**vad_parameters) if isinstance(vad_parameters, dict) else VadOptions()
+    speech = get_speech_timestamps(audio, options)
+    return sum(s["end"] - s["start"] for s in speech) / PCM_SAMPLE_RATE
 
+
+# --- ZOTAVENÍ Z NEDOSTATKU PAMĚTI ---
+# Největší batch_size, který pro (model, device, compute_type) prošel po OOM; další soubory začnou rovnou s ním
+_STABLE_BATCH_SIZE: dict[tuple, int] = {}
+# Úspornější compute_type, na který se po OOM přešlo: (model, device, původní compute_type) -> nový
+_OOM_COMPUTE_TYPE: dict[tuple, str] = {}
+# Úspornější varianty pro GPU (CPU spadne rovnou na int8)
+_LIGHTER_COMPUTE_TYPE = {
+    "float32": "float16",
+    "float16": "int8_float16",
+    "bfloat16": "int8_bfloat16",
+    "int8_float32": "int8",
+    "int8_float16": "int8",
+    "int8_bfloat16": "int8",
+}
+
+
+def _is_oom(e: BaseException) -> bool:
+    if isinstance(e, MemoryError):
+        return True
+    message = str(e).lower()
+    return any(m in message for m in ("out of memory", "bad_alloc", "failed to allocate", "cudaerrormemoryallocation"))
+
+
+def _oom_fallback(device: str, compute_type: str, batch_size: int | None, initial_batch_size: int | None):
+    """Lehčí nastavení po OOM: nejdřív poloviční batch_size, pak úspornější compute_type.
+
+    Vrací (compute_type, batch_size), nebo None, když už není kam ustoupit.
+    """
+    if batch_size and batch_size > 1:
+        return compute_type, batch_size // 2
+    if device == "cpu":
+        lighter = "int8" if compute_type != "int8" else None
+    else:
+        lighter = _LIGHTER_COMPUTE_TYPE.get(compute_type)
+    if lighter is None:
+        return None
+    # Lehčí model uvolní paměť, batch_size se hledá znovu od původní hodnoty
+    return lighter, initial_batch_size
+
+
+def transcribe_file(audio_path, config, model_cache, prepared=None, writer=None, batcher=None, stats=None):
+    """Přepíše jeden soubor.
+
+    Segmenty se zapisují do výstupů průběžně, jak je generuje model.
+
+    Args:
+        audio_path: Cesta ke vstupnímu souboru.
+        config: Efektivní konfigurace.
+        model_cache: Sdílená cache modelů mezi soubory.
+        prepared: Volitelný `Future` s výsledkem `_prepare_input` (předem dekódovaný vstup).
+        writer: Volitelný executor pro exporty; pak funkce vrací `Future` se seznamem cest.
+        batcher: Volitelný `CrossFileBatcher`; batched inference pak sdílí dávky s dalšími soubory.
+        stats: Volitelný dict, do kterého se na konci zapíší metriky souboru (`FileMetrics.data`:
+            `status` včetně `silent`/`cached`, `speech_ratio`, časy, ...).
+
+    Returns:
+        Seznam uložených výstupů (nebo `Future` s ním při `writer`), při chybě None.
+    """
+
+    # Normalizace cesty (podpora %USERPROFILE%, ~, relativních cest)
+    audio_path = os.path.normpath(os.path.expanduser(os.path.expandvars(audio_path)))
+    
+    if not os.path.exists(audio_path):
+        echo(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} Soubor '{audio_path}' nenalezen.", level="error")
+        return
+
+    # Příprava výstupní složky
+    output_dir = config.get("output_dir", "transcriptions")
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Detekce zařízení (po dřívějším OOM rovnou úspornější compute_type)
+    device, config_compute_type = resolve_device(config)
+    compute_type = _OOM_COMPUTE_TYPE.get((config.get("model_size"), device, config_compute_type), config_compute_type)
+    checkpoint = None
+    sink = None
+    info = None
+    metrics = FileMetrics(audio_path, config)
+    metrics.data.update(device=device, compute_type=compute_type)
+    progress = ProgressReporter(audio_path, config)
+    show_segments = console_enabled("segment")
+    status = "failed"
+    RESOURCE_BUDGET.begin_file()
+
+    try:
         # Rozhodnutí mezi batched a sequential inference
         use_batched = config.get("use_batched_inference", False)
-        
+
+        # Sestavení parametrů pro transcribe (audio se doplní po dekódování)
+        transcribe_params = build_transcribe_params(config, None, use_batched)
+        language_source = "config" if transcribe_params.get("language") else "detected"
+
+        # Klíč běhu: obsah vstupu + efektivní parametry (cache i checkpointy)
+        checkpoint_interval = float(config.get("checkpoint_interval_s", 0) or 0)
+        run_key = None
+        if config.get("use_cache", False) or checkpoint_interval > 0:
+            run_key = transcription_cache_key(
+                audio_path,
+                (config.get("model_size"), device, compute_type) + _draft_key(config) + _repetition_key(config),
+                transcribe_params,
+            )
+
+        # batch_size ověřený po OOM (mimo klíč cache, výsledek na něm nezávisí)
+        stable_batch = _STABLE_BATCH_SIZE.get((config.get("model_size"), device, compute_type))
+        if use_batched and stable_batch and stable_batch < transcribe_params["batch_size"]:
+            echo(f"{Fore.YELLOW}[OOM]{Style.RESET_ALL} Používám batch_size={stable_batch} ověřený po nedostatku paměti")
+            transcribe_params["batch_size"] = stable_batch
         if use_batched:
-            print(f"{Fore.MAGENTA}[MODE]{Style.RESET_ALL} Používám BatchedInferencePipeline (4-8x rychlejší)")
-            batched_model = BatchedInferencePipeline(model=model)
-            transcribe_func = batched_model.transcribe
+            budget_batch = RESOURCE_BUDGET.reduce_batch(transcribe_params["batch_size"])
+            if budget_batch < transcribe_params["batch_size"]:
+                echo(
+                    f"{Fore.YELLOW}[BUDGET]{Style.RESET_ALL} Nad stropem paměti ({RESOURCE_BUDGET.max_rss_mb:.0f} MB), "
+                    f"batch_size={budget_batch}"
+                )
+                # Jen pro tento soubor: _STABLE_BATCH_SIZE drží hodnoty ověřené skutečným OOM
+                transcribe_params["batch_size"] = budget_batch
+
+        # Cache: stejný obsah + stejné parametry => stejné segmenty, model není potřeba
+        cache_key = run_key if config.get("use_cache", False) else None
+        if cache_key is not None:
+            cached = None if config.get("cache_refresh") else cache_lookup(config, cache_key)
+            if cached is not None:
+                if prepared is not None:
+                    prepared.cancel()
+                info, cached_segments = cached
+                metrics.data["language_source"] = getattr(info, "language_source", None)
+                sink = _open_sink(audio_path, config, writer)
+                sink.begin(info)
+                count = 0
+                for segment in cached_segments:
+                    sink.write(segment)
+                    metrics.segment(segment)
+                    count += 1
+                echo(f"{Fore.GREEN}[CACHE]{Style.RESET_ALL} '{os.path.basename(audio_path)}': {count} segmentů z cache, přepis se nespouští")
+                echo(f"{Fore.GREEN}[CACHE]{Style.RESET_ALL} {os.path.basename(audio_path)}: {count} segmentů", level="summary")
+                result = _close_sink(sink, writer)
+                sink = None
+                metrics.data["cache_hit"] = True
+                status = "cached"
+                return result
+
+        # Dekódování formátů jako .m4a (bez systémového ffmpeg se použije imageio-ffmpeg)
+        # S `prepared` se měří jen čekání na dekódování z pozadí (to, co zdržuje inferenci)
+        decode_start = time.perf_counter()
+        if prepared is not None:
+            with RESOURCE_BUDGET.waiting():
+                audio = prepared.result()
         else:
-            print(f"{Fore.MAGENTA}[MODE]{Style.RESET_ALL} Používám standardní režim")
-            transcribe_func = model.transcribe
-
-        # Sestavení parametrů pro transcribe
-        transcribe_params = {
-            "audio": decoded_audio_path,
-            "beam_size": config.get("beam_size", 5),
-            "language": config.get("language"),
-            "vad_filter": config.get("vad_filter", True),
-            "log_progress": config.get("log_progress", True),
-            "word_timestamps": config.get("word_timestamps", False),
-            "condition_on_previous_text": config.get("condition_on_previous_text", True),
-        }
+            audio = _maybe_decode_to_pcm(audio_path, config)
+        if isinstance(audio, np.ndarray):
+            storage = "memmap" if isinstance(audio, np.memmap) else "paměť"
+            echo(
+                f"{Fore.CYAN}[DECODE]{Style.RESET_ALL} Vstup '{os.path.basename(audio_path)}' → "
+                f"PCM {audio.shape[0] / PCM_SAMPLE_RATE:.1f}s ({storage})"
+            )
+        # Ostatní formáty by dekódoval faster-whisper uvnitř transcribe() mimo rozpočet; tady jednou pro všechny fáze
+        audio = decode_pcm(audio)
+        metrics.add_time("decode", time.perf_counter() - decode_start)
 
-        # Další podporované parametry (pokud jsou v configu), pro vyšší kvalitu / kontrolu
-        passthrough_keys = {
-            "task",
-            "best_of",
-            "patience",
-            "length_penalty",
-            "prompt_reset_on_temperature",
-            "initial_prompt",
-            "prefix",
-            "suppress_blank",
-            "suppress_tokens",
-            "without_timestamps",
-            "max_initial_timestamp",
-            "prepend_punctuations",
-            "append_punctuations",
-            "max_new_tokens",
-            "chunk_length",
-            "clip_timestamps",
-            "hallucination_silence_threshold",
-            "hotwords",
-            "language_detection_threshold",
-            "language_detection_segments",
-            "multilingual",
-        }
-        for key in passthrough_keys:
-            if key in config and config[key] is not None and key not in transcribe_params:
-                transcribe_params[key] = config[key]
-        
-        # Přidat VAD parametry pouze pokud je VAD zapnutý
-        if config.get("vad_filter", True):
-            # Umožnit plné přepsání vad_parameters z configu (dict nebo VadOptions)
-            if "vad_parameters" in config and config["vad_parameters"] is not None:
-                transcribe_params["vad_parameters"] = config["vad_parameters"]
-            else:
-                transcribe_params["vad_parameters"] = dict(
-                    min_silence_duration_ms=config.get("min_silence_duration_ms", 500)
+        # Tiché nahrávky (hluché ticho, prázdná hlasová schránka): prázdné výstupy bez načtení modelu
+        if config.get("speech_prescan"):
+            audio_duration = audio.shape[0] / PCM_SAMPLE_RATE
+            speech_s = detect_speech_seconds(audio, config)
+            speech_ratio = speech_s / audio_duration if audio_duration else 0.0
+            metrics.data["speech_ratio"] = round(speech_ratio, 4)
+            echo(
+                f"{Fore.CYAN}[PRESCAN]{Style.RESET_ALL} Řeč {speech_s:.1f}s z {audio_duration:.1f}s "
+                f"({speech_ratio:.0%}, {config['speech_prescan']})"
+            )
+            if speech_s < float(config.get("prescan_min_speech_s", 1.0)):
+                info = SimpleNamespace(
+                    language=transcribe_params.get("language"),
+                    language_probability=0.0,
+                    language_source=None,
+                    duration=audio_duration,
+                    duration_after_vad=speech_s,
                 )
-        
-        # Přidat initial_prompt pokud je nastaven
-        initial_prompt = (config.get("initial_prompt") or "").strip()
-        if initial_prompt and "initial_prompt" not in transcribe_params:
-            transcribe_params["initial_prompt"] = initial_prompt
-            print(f"{Fore.YELLOW}[PROMPT]{Style.RESET_ALL} Použit initial prompt pro zlepšení kvality")
-        
-        # Přidat temperature fallback pro zvýšení spolehlivosti
-        if "temperature" in config:
-            transcribe_params["temperature"] = config["temperature"]
-        
-        # Pokročilé parametry kvality
-        if "compression_ratio_threshold" in config:
-            transcribe_params["compression_ratio_threshold"] = config["compression_ratio_threshold"]
-        if "log_prob_threshold" in config:
-            transcribe_params["log_prob_threshold"] = config["log_prob_threshold"]
-        if "no_speech_threshold" in config:
-            transcribe_params["no_speech_threshold"] = config["no_speech_threshold"]
-        
-        # Repetition control
-        if config.get("repetition_penalty", 1.0) != 1.0:
-            transcribe_params["repetition_penalty"] = config["repetition_penalty"]
-        if config.get("no_repeat_ngram_size", 0) > 0:
-            transcribe_params["no_repeat_ngram_size"] = config["no_repeat_ngram_size"]
-        
-        # Batch size pro batched inference
-        if use_batched:
-            transcribe_params["batch_size"] = config.get("batch_size", 16)
+                sink = _open_sink(audio_path, config, writer)
+                sink.begin(info)
+                result = _close_sink(sink, writer)
+                sink = None
+                echo(f"{Fore.GREEN}[TICHO]{Style.RESET_ALL} '{os.path.basename(audio_path)}': bez řeči, zapsány prázdné výstupy")
+                echo(f"{Fore.GREEN}[TICHO]{Style.RESET_ALL} {os.path.basename(audio_path)}: bez řeči", level="summary")
+                status = "silent"
+                return result
+
+        # Dlouhé soubory na CPU: paralelně po úsecích ve více procesech
+        chunk_workers = int(config.get("chunk_workers", 0) or 0) if device == "cpu" else 0
+        if chunk_workers > 1:
+            if audio.shape[0] / PCM_SAMPLE_RATE < 2 * float(config.get("chunk_target_s", 600)):
+                chunk_workers = 0  # krátký soubor, rozdělení se nevyplatí
+
+        # Dvouprůchodový režim: malý model na celý soubor, velký jen na nejisté úseky
+        draft_model = config.get("draft_model")
+        two_pass = bool(draft_model) and draft_model != config.get("model_size") and not chunk_workers > 1 and batcher is None
+
+        if not chunk_workers > 1:
+            metrics.data["model_cache_hit"] = (config.get("model_size"), device, compute_type) in model_cache
+            load_start = time.perf_counter()
+            runtime = get_runtime(config, device, compute_type, model_cache)
+            if two_pass:
+                draft = get_runtime({**config, "model_size": draft_model}, device, compute_type, model_cache)
+            metrics.add_time("model_load", time.perf_counter() - load_start)
 
-        # Samotný přepis
-        segments_generator, info = transcribe_func(**transcribe_params)
+        echo(f"{Fore.CYAN}[START]{Style.RESET_ALL} Začínám přepis: {audio_path}")
+        start_time = time.time()
 
-        print(f"{Fore.MAGENTA}[INFO]{Style.RESET_ALL} Jazyk: {info.language.upper()} ({info.language_probability:.0%})")
-        if hasattr(info, 'duration_after_vad'):
-            print(f"{Fore.MAGENTA}[INFO]{Style.RESET_ALL} Délka zvuku: {info.duration:.2f}s (po VAD: {info.duration_after_vad:.2f}s)")
+        if chunk_workers > 1:
+            echo(f"{Fore.MAGENTA}[MODE]{Style.RESET_ALL} Paralelní přepis po úsecích ({chunk_workers} procesů)")
+            transcribe_func = partial(
+                transcribe_chunked,
+                config=config,
+                compute_type=compute_type,
+                model_cache=model_cache,
+                use_batched=use_batched,
+            )
+        elif two_pass:
+            echo(f"{Fore.MAGENTA}[MODE]{Style.RESET_ALL} Dvouprůchodový přepis: návrh '{draft_model}', nejisté úseky '{config['model_size']}'")
+            transcribe_func = partial(transcribe_two_pass, config=config, draft=draft, runtime=runtime, use_batched=use_batched)
+        elif use_batched and batcher is not None:
+            echo(f"{Fore.MAGENTA}[MODE]{Style.RESET_ALL} Sdílené dávky napříč soubory (batch_size={batcher.batch_size})")
+            transcribe_func = batcher.pipeline.transcribe
+        elif use_batched:
+            echo(f"{Fore.MAGENTA}[MODE]{Style.RESET_ALL} Používám BatchedInferencePipeline (4-8x rychlejší)")
+            transcribe_func = runtime.batched.transcribe
         else:
-            print(f"{Fore.MAGENTA}[INFO]{Style.RESET_ALL} Délka zvuku: {info.duration:.2f}s")
-        print(f"{Fore.MAGENTA}--------------------------------------------------{Style.RESET_ALL}")
-
-        # Kolekce segmentů pro uložení
-        segments = []
-        
-        # Iterace přes generátor (tady probíhá inference)
-        for i, segment in enumerate(segments_generator, start=1):
-            line = f"[{format_timestamp_srt(segment.start)} --> {format_timestamp_srt(segment.end)}] {segment.text.strip()}"
-            print(f"{Fore.BLUE}#{i}{Style.RESET_ALL} {line}")
-            
-            # Pokud máme word timestamps, ukážeme je
-            if config.get("word_timestamps", False) and hasattr(segment, 'words') and segment.words:
-                for word in segment.words[:3]:  # Ukázka prvních 3 slov
-                    print(f"    {Fore.CYAN}└─ {word.word} [{word.start:.2f}s]{Style.RESET_ALL}")
-                if len(segment.words) > 3:
-                    print(f"    {Fore.CYAN}└─ ... (+{len(segment.words)-3} slov){Style.RESET_ALL}")
-            
-            segments.append(segment)
+            echo(f"{Fore.MAGENTA}[MODE]{Style.RESET_ALL} Používám standardní režim")
+            transcribe_func = runtime.model.transcribe
+
+        # Navázání na checkpoint z přerušeného běhu
+        resumed = []
+        time_shift = 0.0
+        if checkpoint_interval > 0:
+            base_name = os.path.splitext(os.path.basename(audio_path))[0]
+            checkpoint = TranscriptionCheckpoint(output_dir, base_name, run_key, checkpoint_interval)
+            resume = checkpoint.load()
+            if resume is not None:
+                resumed, offset, prompt, language = resume
+                echo(f"{Fore.YELLOW}[RESUME]{Style.RESET_ALL} Navazuji od {format_timestamp_srt(offset)} ({len(resumed)} segmentů z checkpointu)")
+                if language and not transcribe_params.get("language"):
+                    transcribe_params["language"] = language
+                    language_source = "checkpoint"
+                if prompt and transcribe_params.get("condition_on_previous_text", True):
+                    transcribe_params["initial_prompt"] = prompt
+                if not use_batched and not chunk_workers > 1 and not two_pass and not transcribe_params.get("vad_filter"):
+                    # Sekvenční režim bez VAD: faster-whisper začne od offsetu a vrací globální časy
+                    transcribe_params["clip_timestamps"] = f"{offset:.3f}"
+                else:
+                    # clip_timestamps by vypnul VAD, proto se audio ořízne a časy se posunou zpět
+                    full_duration = audio.shape[0] / PCM_SAMPLE_RATE
+                    audio = audio[int(offset * PCM_SAMPLE_RATE):]
+                    time_shift = offset
+
+        transcribe_params["audio"] = audio
+
+        # Jazyk ze skupiny (složka / language_cache_group): další soubory přeskočí detekci
+        group = language_group(audio_path, config) if language_source == "detected" else None
+        if group is not None and group in _LANGUAGE_CACHE:
+            transcribe_params["language"] = _LANGUAGE_CACHE[group][0]
+            language_source = "cache"
+
+        # Samotný přepis; nedostatek paměti při startu i během iterace vede na lehčí nastavení
+        # a nový start (ještě bez výstupů), nebo navázání za posledním hotovým segmentem
+        metrics.start_inference()
+        segments_generator = None
+        cache_writer = None
+        repetition = None
+        i = id_offset = len(resumed)
+        last_segment = resumed[-1] if resumed else None
+        while True:
+            try:
+                if sink is None:
+                    segments_generator, info = transcribe_func(**transcribe_params)
+
+                    if language_source == "cache":
+                        # Převzatý jazyk se ověří na prvních segmentech; když nesedí, detekuje se znovu
+                        head = list(islice(segments_generator, int(config.get("language_check_segments", 2))))
+                        if _language_suspicious(head, config):
+                            echo(
+                                f"{Fore.YELLOW}[LANG]{Style.RESET_ALL} Jazyk '{transcribe_params['language']}' ze skupiny "
+                                "nesedí (nízká jistota segmentů), detekuji znovu"
+                            )
+                            segments_generator.close()
+                            segments_generator = None
+                            transcribe_params["language"] = None
+                            language_source = "detected"
+                            segments_generator, info = transcribe_func(**transcribe_params)
+                        else:
+                            segments_generator = _prepend_segments(head, segments_generator)
+
+                    if language_source == "detected" and group is not None:
+                        if info.language_probability >= float(config.get("language_cache_min_probability", 0.8)):
+                            _LANGUAGE_CACHE[group] = (info.language, info.language_probability)
+
+                    info = SimpleNamespace(**{**_info_to_dict(info), "language_source": language_source})
+                    if time_shift:
+                        info.duration = full_duration
+                        info.duration_after_vad += time_shift
+                        for span in getattr(info, "refined_spans", None) or []:
+                            span["start"], span["end"] = round(span["start"] + time_shift, 3), round(span["end"] + time_shift, 3)
+                    metrics.data["language_source"] = language_source
+                    if two_pass:
+                        metrics.data["refined_s"] = round(sum(span["end"] - span["start"] for span in info.refined_spans), 3)
+
+                    source_note = " – převzato ze skupiny" if language_source == "cache" else ""
+                    echo(f"{Fore.MAGENTA}[INFO]{Style.RESET_ALL} Jazyk: {info.language.upper()} ({info.language_probability:.0%}){source_note}")
+                    if hasattr(info, 'duration_after_vad'):
+                        echo(f"{Fore.MAGENTA}[INFO]{Style.RESET_ALL} Délka zvuku: {info.duration:.2f}s (po VAD: {info.duration_after_vad:.2f}s)")
+                    else:
+                        echo(f"{Fore.MAGENTA}[INFO]{Style.RESET_ALL} Délka zvuku: {info.duration:.2f}s")
+                    echo(f"{Fore.MAGENTA}--------------------------------------------------{Style.RESET_ALL}")
+
+                    # Výstupy se zapisují průběžně (cache jako další příjemce, checkpoint se smaže po dokončení)
+                    cache_writer = CacheWriter(config, cache_key) if cache_key is not None else None
+                    sink = _open_sink(
+                        audio_path,
+                        config,
+                        writer,
+                        extra=[cache_writer] if cache_writer is not None else [],
+                        on_close=[checkpoint.finish] if checkpoint is not None else [],
+                    )
+                    sink.begin(info)
+                    for segment in resumed:
+                        sink.write(segment)
+                    progress.start(info.duration, resumed[-1].end if resumed else time_shift)
+                    if checkpoint is not None:
+                        checkpoint.start(info.language, resumed, sink)
+                    resumed = None  # segmenty z checkpointu už jsou ve výstupech
+
+                    # Smyčky a opakování se filtrují už na proudu segmentů (přepis okna místo celého souboru)
+                    if config.get("repetition_filter"):
+                        repetition = RepetitionFilter(config, None if chunk_workers > 1 else runtime.model, transcribe_params)
+                        segments_generator = repetition.filter(segments_generator)
+
+                # Iterace přes generátor (tady probíhá inference)
+                for segment in segments_generator:
+                    i += 1
+                    if id_offset or time_shift:
+                        segment = _shift_segment(segment, time_shift, id_offset)
+
+                    # Výpis segmentů jen v plném režimu konzole (headless běh je přeskočí úplně)
+                    if show_segments:
+                        line = f"[{format_timestamp_srt(segment.start)} --> {format_timestamp_srt(segment.end)}] {segment.text.strip()}"
+                        echo(f"{Fore.BLUE}#{i}{Style.RESET_ALL} {line}", level="segment")
+
+                        # Pokud máme word timestamps, ukážeme je
+                        if config.get("word_timestamps", False) and hasattr(segment, 'words') and segment.words:
+                            for word in segment.words[:3]:  # Ukázka prvních 3 slov
+                                echo(f"    {Fore.CYAN}└─ {word.word} [{word.start:.2f}s]{Style.RESET_ALL}", level="segment")
+                            if len(segment.words) > 3:
+                                echo(f"    {Fore.CYAN}└─ ... (+{len(segment.words)-3} slov){Style.RESET_ALL}", level="segment")
+
+                    sink.write(segment)
+                    metrics.segment(segment)
+                    progress.update(segment.end, i)
+                    last_segment = segment
+                    if checkpoint is not None:
+                        checkpoint.add(segment)
+                break
+            except Exception as e:
+                if not (config.get("oom_recovery", True) and _is_oom(e)) or batcher is not None or chunk_workers > 1:
+                    raise
+                fallback = _oom_fallback(device, compute_type, transcribe_params.get("batch_size"), config.get("batch_size", 16) if use_batched else None)
+                if fallback is None:
+                    raise
+                new_compute_type, new_batch_size = fallback
+                started = sink is not None
+                offset = last_segment.end if started and last_segment is not None else time_shift
+                echo(
+                    f"{Fore.YELLOW}[OOM]{Style.RESET_ALL} Nedostatek paměti u {format_timestamp_srt(offset)}: "
+                    + (f"compute_type {compute_type} → {new_compute_type}, " if new_compute_type != compute_type else "")
+                    + (f"batch_size {transcribe_params['batch_size']} → {new_batch_size}, " if use_batched else "")
+                    + ("navazuji za posledním segmentem" if started else "spouštím přepis znovu")
+                )
+                if segments_generator is not None:
+                    segments_generator.close()
+                    segments_generator = None
+                metrics.data["oom_retries"] += 1
+
+                model_size = config.get("model_size")
+                if new_compute_type != compute_type:
+                    _OOM_COMPUTE_TYPE[(model_size, device, config_compute_type)] = new_compute_type
+                    with _MODEL_LOCK:
+                        model_cache.pop((model_size, device, compute_type), None)  # uvolnit paměť těžšího modelu
+                    compute_type = new_compute_type
+                    metrics.data["compute_type"] = compute_type
+                    runtime = get_runtime(config, device, compute_type, model_cache)
+                    if two_pass:
+                        transcribe_func = partial(transcribe_two_pass, config=config, draft=draft, runtime=runtime, use_batched=use_batched)
+                    else:
+                        transcribe_func = runtime.batched.transcribe if use_batched else runtime.model.transcribe
+                    # Výsledek z lehčího compute_type nepatří pod klíč původního nastavení
+                    cache_key = None
+                    if cache_writer is not None:
+                        cache_writer.discard()
+                if use_batched:
+                    # Do _STABLE_BATCH_SIZE se zapíše až po dokončeném běhu s touto hodnotou
+                    transcribe_params["batch_size"] = new_batch_size
+                if not started:
+                    continue
+
+                if two_pass:
+                    # refined_spans jsou už v hlavičkách výstupů; zbytek souboru přepíše velký model celý
+                    transcribe_func = runtime.batched.transcribe if use_batched else runtime.model.transcribe
+                    two_pass = False
+                    refined_s = sum(min(span["end"], offset) - span["start"] for span in info.refined_spans if span["start"] < offset)
+                    metrics.data["refined_s"] = round(refined_s + max(0.0, info.duration - offset), 3)
+                    echo(f"{Fore.YELLOW}[OOM]{Style.RESET_ALL} Zbytek souboru od {format_timestamp_srt(offset)} přepíše '{config['model_size']}' bez návrhu")
+
+                # Stejně jako u checkpointu: oříznuté audio, známý jazyk a kontext posledního segmentu
+                audio = decode_pcm(transcribe_params["audio"])
+                transcribe_params.pop("clip_timestamps", None)
+                transcribe_params["audio"] = audio[int((offset - time_shift) * PCM_SAMPLE_RATE):]
+                transcribe_params["language"] = info.language
+                if last_segment is not None and transcribe_params.get("condition_on_previous_text", True):
+                    transcribe_params["initial_prompt"] = last_segment.text.strip()
+                time_shift, id_offset = offset, i
+                segments_generator, _ = transcribe_func(**transcribe_params)
+                if repetition is not None:
+                    repetition.model = runtime.model
+                    segments_generator = repetition.filter(segments_generator)
+
+        if metrics.data["oom_retries"] and use_batched:
+            # batch_size ověřený dokončeným přepisem; další soubory začnou rovnou s ním
+            _STABLE_BATCH_SIZE[(config.get("model_size"), device, compute_type)] = transcribe_params["batch_size"]
+
+        if repetition is not None:
+            metrics.data.update(dropped_segments=repetition.dropped, redecoded_s=round(repetition.redecoded_s, 3))
+            if repetition.dropped:
+                echo(
+                    f"{Fore.YELLOW}[OPAKOVÁNÍ]{Style.RESET_ALL} Zahozeno {repetition.dropped} opakujících se segmentů"
+                    + (f", znovu přepsáno {repetition.redecoded_s:.1f}s" if repetition.redecoded_s else "")
+                )
 
         duration = time.time() - start_time
-        print(f"{Fore.MAGENTA}--------------------------------------------------{Style.RESET_ALL}")
-        print(f"{Fore.GREEN}[HOTOVO]{Style.RESET_ALL} Čas zpracování: {duration:.2f}s")
+        echo(f"{Fore.MAGENTA}--------------------------------------------------{Style.RESET_ALL}")
+        echo(f"{Fore.GREEN}[HOTOVO]{Style.RESET_ALL} Čas zpracování: {duration:.2f}s")
+        echo(
+            f"{Fore.GREEN}[HOTOVO]{Style.RESET_ALL} {os.path.basename(audio_path)}: {i} segmentů, "
+            f"{info.duration:.1f}s audia, {(info.language or '?').upper()}, {duration:.2f}s",
+            level="summary",
+        )
 
         # --- EXPORTY ---
-        formats = config.get("output_formats", ["txt"])
-        
-        # 1. TXT Export
-        if "txt" in formats:
-            path = os.path.join(output_dir, f"{base_name}.txt")
-            with open(path, "w", encoding="utf-8") as f:
-                for s in segments:
-                    f.write(f"[{format_timestamp_srt(s.start)}] {s.text.strip()}\n")
-            print(f" - Uloženo: {path}")
-
-        # 2. SRT Export (Titulky)
-        if "srt" in formats:
-            path = os.path.join(output_dir, f"{base_name}.srt")
-            with open(path, "w", encoding="utf-8") as f:
-                for i, s in enumerate(segments, start=1):
-                    f.write(f"{i}\n")
-                    f.write(f"{format_timestamp_srt(s.start)} --> {format_timestamp_srt(s.end)}\n")
-                    f.write(f"{s.text.strip()}\n\n")
-            print(f" - Uloženo: {path}")
-
-        # 3. VTT Export (Web Titulky)
-        if "vtt" in formats:
-            path = os.path.join(output_dir, f"{base_name}.vtt")
-            with open(path, "w", encoding="utf-8") as f:
-                f.write("WEBVTT\n\n")
-                for s in segments:
-                    f.write(f"{format_timestamp_vtt(s.start)} --> {format_timestamp_vtt(s.end)}\n")
-                    f.write(f"{s.text.strip()}\n\n")
-            print(f" - Uloženo: {path}")
-
-        # 4. JSON Export (Metadata)
-        if "json" in formats:
-            path = os.path.join(output_dir, f"{base_name}.json")
-            data = {
-                "source": audio_path,
-                "language": info.language,
-                "duration": info.duration,
-                "segments": []
-            }
-            
-            for s in segments:
-                segment_data = {
-                    "id": s.id,
-                    "start": s.start,
-                    "end": s.end,
-                    "text": s.text.strip()
-                }
-                
-                # Přidat word timestamps pokud jsou dostupné
-                if config.get("word_timestamps", False) and hasattr(s, 'words') and s.words:
-                    segment_data["words"] = [
-                        {
-                            "word": w.word,
-                            "start": w.start,
-                            "end": w.end,
-                            "probability": w.probability
-                        } for w in s.words
-                    ]
-                
-                data["segments"].append(segment_data)
-            
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            print(f" - Uloženo: {path}")
+        if checkpoint is not None:
+            checkpoint.close()
+        result = _close_sink(sink, writer)
+        sink = None
+        status = "done"
+        return result
 
     except subprocess.CalledProcessError as e:
-        print(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} Nepodařilo se dekódovat audio přes ffmpeg: {e}")
-        print(
+        echo(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} Nepodařilo se dekódovat audio přes ffmpeg: {e}", level="error")
+        if e.stderr:
+            echo(str(e.stderr).strip(), level="error")
+        echo(
             f"{Fore.YELLOW}[TIP]{Style.RESET_ALL} Zkuste nainstalovat ffmpeg (winget install Gyan.FFmpeg) "
-            "nebo použít MP3/WAV vstup."
+            "nebo použít MP3/WAV vstup.",
+            level="error",
         )
     except Exception as e:
-        print(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} {e}")
+        echo(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} {e}", level="error")
         if "cudnn" in str(e).lower() or "cublas" in str(e).lower():
-            print(f"{Fore.YELLOW}[TIP]{Style.RESET_ALL} Chybí NVIDIA knihovny (cuDNN/cuBLAS). Viz README.md sekce 'Zprovoznění na NVIDIA GPU'.")
+            echo(f"{Fore.YELLOW}[TIP]{Style.RESET_ALL} Chybí NVIDIA knihovny (cuDNN/cuBLAS). Viz README.md sekce 'Zprovoznění na NVIDIA GPU'.", level="error")
         elif "out of memory" in str(e).lower():
-            print(f"{Fore.YELLOW}[TIP]{Style.RESET_ALL} Nedostatek GPU paměti. Zkuste menší model nebo batch_size v config.json.")
+            echo(f"{Fore.YELLOW}[TIP]{Style.RESET_ALL} Nedostatek GPU paměti. Zkuste menší model nebo batch_size v config.json.", level="error")
         import traceback
         traceback.print_exc()
 
     finally:
-        if decoded_cleanup_path and os.path.exists(decoded_cleanup_path):
+        # Po chybě nebo Ctrl+C: neúplné výstupy zavřít (s checkpointem zůstávají pro tail/resume);
+        # checkpoint první, jeho poslední flush ještě zapisuje do otevřených výstupů
+        if checkpoint is not None:
+            checkpoint.close()
+        if sink is not None:
+            sink.abort(keep_outputs=checkpoint is not None)
+        metrics.finish(status, info)
+        if stats is not None:
+            stats.update(metrics.data)
+        progress.finish(status, metrics.data["segments"])
+        RESOURCE_BUDGET.end_file()
+
+
+# --- VSTUPY A MANIFEST ---
+# Přípony, které se berou při procházení složek (explicitně zadané soubory se berou vždy)
+INPUT_EXTS = FFMPEG_DECODE_EXTS | {".wav", ".mp3", ".flac", ".ogg", ".opus", ".wma", ".aif", ".aiff"}
+
+
+def _is_glob(spec: str) -> bool:
+    return any(ch in spec for ch in "*?[")
+
+
+def expand_input(spec: str, config) -> list[str]:
+    """Rozbalí jeden vstup: soubor, složku (rekurzivně) nebo glob (`**` = libovolná hloubka)."""
+    spec = os.path.expanduser(spec)
+    exts = {e.lower() for e in config.get("input_extensions") or INPUT_EXTS}
+
+    if _is_glob(spec):
+        return sorted(p for p in glob.iglob(spec, recursive=True) if os.path.isfile(p))
+    if os.path.isdir(spec):
+        found = []
+        for root, dirs, names in os.walk(spec):
+            dirs.sort()
+            found.extend(os.path.join(root, n) for n in sorted(names) if os.path.splitext(n)[1].lower() in exts)
+        return found
+    return [spec]
+
+
+def read_input_list(path: str) -> list[str]:
+    """Seznam vstupů ze souboru (jeden na řádek, `#` = komentář); `-` = stdin."""
+    f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    with f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def expected_outputs(audio_path: str, config) -> list[str]:
+    output_dir = config.get("output_dir", "transcriptions")
+    base_name = os.path.splitext(os.path.basename(audio_path))[0]
+    formats = config.get("output_formats", ["txt"])
+    return [os.path.join(output_dir, f"{base_name}.{ext}") for ext in EXPORTERS if ext in formats]
+
+
+def outputs_up_to_date(audio_path: str, config) -> bool:
+    """Existují všechny výstupy a jsou novější než vstup?"""
+    try:
+        source_mtime = os.stat(audio_path).st_mtime
+        return all(os.stat(p).st_mtime >= source_mtime for p in expected_outputs(audio_path, config))
+    except OSError:
+        return False
+
+
+class JobManifest:
+    """Perzistentní manifest dávky (SQLite): stav, velikost/mtime, pokusy a výstupy každého souboru.
+
+    Po pádu se nový běh rozjede z manifestu: složky prohledané dříve se znovu
+    neprocházejí (pokud není `rescan`), hotové soubory se přeskočí a neúspěšné
+    se zkusí znovu až po uplynutí backoffu.
+    """
+
+    def __init__(self, path: str, config):
+        self.path = path
+        self.max_attempts = int(config.get("retry_max_attempts", 3))
+        self.backoff = float(config.get("retry_backoff_s", 60))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_retry REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                outputs TEXT,
+                speech_ratio REAL,
+                updated REAL
+            );
+            CREATE TABLE IF NOT EXISTS scans (root TEXT PRIMARY KEY, finished REAL);
+            CREATE TABLE IF NOT EXISTS scan_files (root TEXT NOT NULL, path TEXT NOT NULL, PRIMARY KEY (root, path));
+            """
+        )
+        try:
+            self.db.execute("ALTER TABLE files ADD COLUMN speech_ratio REAL")  # manifest ze starší verze
+        except sqlite3.OperationalError:
+            pass
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def collect(self, specs: list[str], config, rescan: bool = False) -> list[str]:
+        """Vrátí absolutní cesty pro vstupy; složky/globy s dokončeným skenem bere z manifestu."""
+        paths = []
+        for spec in specs:
+            is_tree = _is_glob(spec) or os.path.isdir(os.path.expanduser(spec))
+            # Klíčem skenu je absolutní vzor, aby restart z jiné složky našel stejný záznam
+            root = os.path.abspath(os.path.expanduser(spec))
+            if is_tree and not rescan and self.db.execute("SELECT 1 FROM scans WHERE root = ?", (root,)).fetchone():
+                rows = self.db.execute("SELECT path FROM scan_files WHERE root = ? ORDER BY path", (root,))
+                paths.extend(row[0] for row in rows)
+                continue
+
+            found = [os.path.abspath(p) for p in expand_input(spec, config)]
+            with self.db:
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO files (path, updated) VALUES (?, ?)", [(p, time.time()) for p in found]
+                )
+                if is_tree:
+                    self.db.execute("DELETE FROM scan_files WHERE root = ?", (root,))
+                    self.db.executemany("INSERT INTO scan_files VALUES (?, ?)", [(root, p) for p in found])
+                    self.db.execute("INSERT OR REPLACE INTO scans VALUES (?, ?)", (root, time.time()))
+            paths.extend(found)
+        return paths
+
+    def select(self, paths: list[str], config, retry_failed: bool = False) -> list[str]:
+        """Vybere soubory k přepisu: nové, změněné, nedokončené a neúspěšné po backoffu."""
+        now = time.time()
+        todo, skipped, waiting = [], 0, 0
+        for path in paths:
             try:
-                os.remove(decoded_cleanup_path)
-            except Exception:
-                pass
+                st = os.stat(path)
+            except OSError:
+                todo.append(path)  # transcribe_file nahlásí chybějící soubor
+                continue
+            row = self.db.execute(
+                "SELECT size, mtime, status, attempts, next_retry FROM files WHERE path = ?", (path,)
+            ).fetchone()
+            unchanged = row is not None and row[0] == st.st_size and row[1] == st.st_mtime
+
+            if unchanged and row[2] in ("done", "silent") and all(os.path.exists(p) for p in expected_outputs(path, config)):
+                skipped += 1
+            elif (row is None or row[2] == "pending") and outputs_up_to_date(path, config):
+                # Hotové z dřívějška (třeba bez manifestu): jen zapsat. Soubor, který manifest už
+                # zkoušel, takhle ne – po pádu uprostřed přepisu mají částečné výstupy čerstvý čas.
+                self._update(path, st, "done", outputs=expected_outputs(path, config))
+                skipped += 1
+            elif unchanged and row[2] in ("failed", "running") and not retry_failed and (row[3] >= self.max_attempts or row[4] > now):
+                waiting += 1
+            else:
+                todo.append(path)
+
+        echo(
+            f"{Fore.CYAN}[MANIFEST]{Style.RESET_ALL} {len(paths)} souborů: {len(todo)} k přepisu, "
+            f"{skipped} hotových přeskočeno, {waiting} neúspěšných čeká na další pokus ({self.path})",
+            level="result",
+        )
+        return todo
+
+    def _update(self, path: str, st, status: str, outputs=None, error=None, attempts=None, next_retry=0.0):
+        with self.db:
+            self.db.execute(
+                """
+                INSERT INTO files (path, size, mtime, status, attempts, next_retry, last_error, outputs, updated)
+                VALUES (?, ?, ?, ?, COALESCE(?, 0), ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    size = excluded.size, mtime = excluded.mtime, status = excluded.status,
+                    attempts = COALESCE(?, attempts), next_retry = excluded.next_retry,
+                    last_error = excluded.last_error, outputs = excluded.outputs, updated = excluded.updated
+                """,
+                (
+                    path, st.st_size if st else None, st.st_mtime if st else None, status,
+                    attempts, next_retry, error, json.dumps(outputs) if outputs is not None else None, time.time(),
+                    attempts,
+                ),
+            )
+
+    def start(self, path: str):
+        """Označí soubor jako rozpracovaný a započte pokus (volá `transcribe_batch` před přepisem).
+
+        Když proces spadne, zůstane soubor ve stavu `running` a další běh ho přepíše znovu.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        row = self.db.execute("SELECT attempts, size, mtime FROM files WHERE path = ?", (path,)).fetchone()
+        same_input = row is not None and (row[1], row[2]) == (st.st_size, st.st_mtime)
+        self._update(path, st, "running", attempts=(row[0] if row and same_input else 0) + 1)
+
+    def record(self, path: str, outputs, stats=None):
+        """Zapíše výsledek souboru (volá `transcribe_batch` po každém souboru, `stats` z `transcribe_file`)."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        if outputs is not None:
+            silent = bool(stats) and stats.get("status") == "silent"
+            self._update(path, st, "silent" if silent else "done", outputs=outputs, attempts=0)
+            if silent:
+                with self.db:
+                    self.db.execute("UPDATE files SET speech_ratio = ? WHERE path = ?", (stats["speech_ratio"], path))
+            return
+
+        row = self.db.execute("SELECT attempts, size, mtime, status FROM files WHERE path = ?", (path,)).fetchone()
+        same_input = row is not None and st is not None and (row[1], row[2]) == (st.st_size, st.st_mtime)
+        # Pokus už započetl `start`; bez něj (soubor se vůbec nespustil) ho započítat tady
+        attempts = (row[0] if row and same_input else 0) + (0 if row and same_input and row[3] == "running" else 1)
+        delay = min(self.backoff * 2 ** (attempts - 1), 24 * 3600)
+        self._update(path, st, "failed", error="Přepis selhal (viz log)", attempts=attempts, next_retry=time.time() + delay)
+
+
+def _collect_export(audio_file: str, future) -> list[str] | None:
+    """Počká na export z writer vlákna a vypíše uložené soubory."""
+    label = os.path.basename(audio_file)
+    try:
+        paths = future.result()
+    except Exception as e:
+        echo(f"{Fore.RED}[CHYBA]{Style.RESET_ALL} Export '{label}' selhal: {e}", level="error")
+        return None
+    echo(f"{Fore.GREEN}[EXPORT]{Style.RESET_ALL} {label}")
+    _print_saved(paths)
+    return paths
+
+
+def _prepare_input(audio_path: str, config) -> np.ndarray:
+    """Celé dekódování vstupu pro prefetch (ffmpeg kontejnery i formáty, které umí faster-whisper)."""
+    return decode_pcm(_maybe_decode_to_pcm(audio_path, config))
+
+
+def transcribe_batch(files: list[str], config, model_cache: dict, on_result=None, on_start=None):
+    """Přepíše více souborů.
+
+    Při `pipeline_prefetch > 0` se dalších N vstupů dekóduje na pozadí, zatímco
+    běží inference aktuálního souboru, a exporty zapisuje samostatné writer vlákno.
+    V paměti je tak nejvýš N+1 dekódovaných vstupů a dva přepisy (jeden se
+    zapisuje, druhý se právě přepisuje).
+
+    `on_start(soubor)` se volá těsně před přepisem a `on_result(soubor, výstupy | None, metriky)`
+    po dokončení každého souboru (manifest); metriky jsou `stats` z `transcribe_file`.
+    """
+    on_result = on_result or (lambda audio_file, outputs, stats: None)
+    on_start = on_start or (lambda audio_file: None)
+
+    if config.get("devices") and len(files) > 1:
+        transcribe_on_slots(files, config, on_result, on_start)
+        return
+
+    if config.get("cross_file_batching") and config.get("use_batched_inference") and len(files) > 1:
+        reason = cross_file_unsupported()
+        if reason is None:
+            transcribe_cross_file(files, config, model_cache, on_result, on_start)
+            return
+        echo(f"{Fore.YELLOW}[PIPELINE]{Style.RESET_ALL} Sdílené dávky vypnuty: {reason}")
+
+    prefetch = int(config.get("pipeline_prefetch", 0) or 0)
+    if prefetch <= 0 or len(files) < 2:
+        for audio_file in files:
+            on_start(audio_file)
+            stats = {}
+            outputs = transcribe_file(audio_file, config=config, model_cache=model_cache, stats=stats)
+            on_result(audio_file, outputs, stats)
+            echo()  # Prázdný řádek mezi soubory
+        return
+
+    echo(f"{Fore.MAGENTA}[PIPELINE]{Style.RESET_ALL} Předdekódování {prefetch} souborů dopředu, exporty na pozadí")
+
+    pending = deque()
+    remaining = iter(files)
+
+    def submit_next():
+        audio_file = next(remaining, None)
+        if audio_file is None:
+            return
+        path = os.path.normpath(os.path.expanduser(os.path.expandvars(audio_file)))
+        future = decode_pool.submit(_prepare_input, path, config) if os.path.exists(path) else None
+        pending.append((audio_file, future))
+
+    last_export = None
+    with ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix="decode") as decode_pool, \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="export") as writer:
+        try:
+            for _ in range(prefetch):
+                submit_next()
+
+            while pending:
+                audio_file, future = pending.popleft()
+                submit_next()
+
+                on_start(audio_file)
+                stats = {}
+                export = transcribe_file(audio_file, config=config, model_cache=model_cache, prepared=future, writer=writer, stats=stats)
+
+                # Nejvýš jeden export ve frontě: na předchozí počkáme až po inferenci dalšího souboru
+                if last_export is not None:
+                    on_result(last_export[0], _collect_export(*last_export[:2]), last_export[2])
+                last_export = (audio_file, export, stats) if export is not None else None
+                if export is None:
+                    on_result(audio_file, None, stats)
+                echo()  # Prázdný řádek mezi soubory
+
+            if last_export is not None:
+                on_result(last_export[0], _collect_export(*last_export[:2]), last_export[2])
+        finally:
+            # Zrušit dekódování, které se už nepřepíše (např. Ctrl+C)
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+
+
+def transcribe_cross_file(files: list[str], config, model_cache: dict, on_result=None, on_start=None):
+    """Přepíše mnoho krátkých souborů se sdílenými dávkami.
+
+    Až `cross_file_window` souborů (default 2× batch_size) se připravuje souběžně
+    (dekódování, VAD, detekce jazyka) a jejich úseky plní společné dávky, takže
+    propustnost roste s `batch_size`, ne s počtem souborů.
+    """
+    device, compute_type = resolve_device(config)
+    runtime = get_runtime(config, device, compute_type, model_cache)
+    batcher = CrossFileBatcher(runtime, int(config.get("batch_size", 16)))
+    window = int(config.get("cross_file_window", 0) or 0) or 2 * batcher.batch_size
+    echo(f"{Fore.MAGENTA}[PIPELINE]{Style.RESET_ALL} Sdílené dávky napříč soubory: {window} souborů souběžně, batch_size={batcher.batch_size}")
+
+    def run(audio_file):
+        batcher.enter()
+        stats = {}
+        try:
+            return transcribe_file(audio_file, config=config, model_cache=model_cache, batcher=batcher, stats=stats), stats
+        finally:
+            batcher.exit()
+            echo()  # Prázdný řádek mezi soubory
+
+    start_time = time.time()
+    if on_start is not None:
+        # Manifest (SQLite) patří hlavnímu vláknu: rozpracované jsou všechny soubory dávky
+        for audio_file in files:
+            on_start(audio_file)
+    try:
+        with ThreadPoolExecutor(max_workers=min(window, len(files)), thread_name_prefix="file") as pool:
+            results = []
+            for audio_file, (outputs, stats) in zip(files, pool.map(run, files)):
+                results.append(outputs)
+                if on_result is not None:
+                    on_result(audio_file, outputs, stats)
+    finally:
+        batcher.close()
+
+    fill = batcher.chunks / (batcher.batches * batcher.batch_size) if batcher.batches else 0.0
+    echo(
+        f"{Fore.GREEN}[HOTOVO]{Style.RESET_ALL} {sum(r is not None for r in results)}/{len(files)} souborů "
+        f"za {time.time() - start_time:.2f}s, {batcher.batches} dávek (zaplnění {fill:.0%})",
+        level="result",
+    )
+
 
 if __name__ == "__main__":
     args = parse_args(sys.argv[1:])
 
-    if not args.files:
+    if not args.files and not args.input_list:
         print(f"{Fore.CYAN}Local Whisper Transcriber v0.1.0-beta{Style.RESET_ALL}")
         print(f"Použití: uv run transcribe.py [--config config.json] <cesta_k_souboru> [<další_soubor> ...]")
         print(f"\nPříklady:")
         print(f"  uv run transcribe.py audio.mp3")
         print(f"  uv run transcribe.py --config config.hq.json audio.mp3")
         print(f"  uv run transcribe.py audio1.mp3 audio2.wav video.mp4")
+        print(f"  uv run transcribe.py --manifest batch.sqlite archiv/")
         print(f"\nNastavení upravte v souboru config.json")
     else:
+        specs = list(args.files)
+        if args.input_list:
+            specs += read_input_list(args.input_list)
+
+        if args.remote:
+            # Tenký klient: model drží běžící server.py
+            files = [path for spec in specs for path in expand_input(spec, DEFAULT_CONFIG)]
+            sys.exit(0 if submit_remote(args.remote, files, args.config, cli_overrides(args)) else 1)
+
         config = load_config(args.config)
 
         # CLI overrides (jen pokud jsou zadány)
-        if args.model_size:
-            config["model_size"] = args.model_size
-        if args.language:
-            config["language"] = args.language
-        if args.beam_size is not None:
-            config["beam_size"] = args.beam_size
-        if args.best_of is not None:
-            config["best_of"] = args.best_of
-        if args.patience is not None:
-            config["patience"] = args.patience
-        if args.hotwords:
-            config["hotwords"] = args.hotwords
-        if args.hallucination_silence_threshold is not None:
-            config["hallucination_silence_threshold"] = args.hallucination_silence_threshold
-        if args.vad_filter is not None:
-            config["vad_filter"] = args.vad_filter
-        if args.use_batched_inference is not None:
-            config["use_batched_inference"] = args.use_batched_inference
+        config.update(cli_overrides(args))
+        set_console_mode(config)
+        RESOURCE_BUDGET.configure(config)
 
         model_cache = {}
-        # Podpora více souborů najednou
-        for audio_file in args.files:
-            transcribe_file(audio_file, config=config, model_cache=model_cache)
-            print()  # Prázdný řádek mezi soubory
+        if config.get("manifest_file"):
+            # Dávka s manifestem: hotové přeskočit, neúspěšné zkusit po backoffu
+            manifest = JobManifest(config["manifest_file"], config)
+            try:
+                files = manifest.collect(specs, config, rescan=args.rescan)
+                files = manifest.select(files, config, retry_failed=args.retry_failed)
+                transcribe_batch(files, config=config, model_cache=model_cache, on_result=manifest.record, on_start=manifest.start)
+            finally:
+                manifest.close()
+        else:
+            files = [path for spec in specs for path in expand_input(spec, config)]
+            # Podpora více souborů najednou
+            transcribe_batch(files, config=config, model_cache=model_cache)
+        RESOURCE_BUDGET.report()